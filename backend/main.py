@@ -2,13 +2,21 @@
 LeadQ Chatbot API - Main Entry Point
 FastAPI application for the LeadQ AI Assistant (Veda).
 """
+import asyncio
 import os
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from src.core.cache import get_backend
+from src.core.circuit import breaker_snapshots, CLOSED
+from src.core.config import settings
+from src.core.profiling import start_loop_monitor
+from src.modules.veda_chatbot.context import load_tokenizer
+from src.modules.veda_chatbot.outbox import outbox
 from src.modules.veda_chatbot.router import router as chatbot_router
+from src.modules.veda_chatbot.retention import retention_loop
 
 # Load environment variables
 load_dotenv(dotenv_path=".env")
@@ -37,6 +45,19 @@ if os.path.exists("documents"):
 app.include_router(chatbot_router, prefix="/api/v1")
 
 
+@app.on_event("startup")
+async def start_background_jobs():
+    # Periodic archive/prune of idle chat sessions (disabled unless RETENTION_INTERVAL_HOURS > 0)
+    if settings.RETENTION_INTERVAL_HOURS > 0:
+        app.state.retention_task = asyncio.create_task(retention_loop(settings.RETENTION_INTERVAL_HOURS))
+    # Event-loop lag sampling and stall stacks for /api/v1/admin/traces (disabled when LOOP_MONITOR_INTERVAL_MS is 0)
+    start_loop_monitor()
+    # Resends tickets/feedback queued while Supabase was slow or down, including leftovers from a previous run
+    outbox.start()
+    # Context token counting needs tiktoken's encoding, which may be downloaded on first load
+    app.state.tokenizer_task = asyncio.create_task(asyncio.to_thread(load_tokenizer))
+
+
 @app.get("/")
 async def root():
     return {"message": "LeadQ Chatbot API is running", "version": "2.0.0", "assistant": "Veda"}
@@ -47,6 +68,21 @@ async def health_check():
     return {"status": "healthy", "service": "leadq-chatbot"}
 
 
+@app.get("/health/deep")
+async def deep_health_check():
+    """Dependency view: circuit breaker states plus rolling error rate / latency per dependency."""
+    breakers = breaker_snapshots()
+    degraded = [name for name, snap in breakers.items() if snap["state"] != CLOSED]
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "service": "leadq-chatbot",
+        "degraded": degraded,
+        "configured": {"openai": bool(settings.OPENAI_API_KEY), "supabase": bool(settings.SUPABASE_URL and settings.SUPABASE_KEY), "cache": get_backend().name},
+        "dependencies": breakers,
+        "outbox": outbox.status(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=5002, reload=True)
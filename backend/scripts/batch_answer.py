@@ -0,0 +1,211 @@
+"""
+Offline batch question answering (help-center seeding, answer regression checks).
+
+Reads a JSONL file of questions ({"id": ..., "question": ...}; `id` defaults to the
+line number) and runs the same embed -> retrieve -> generate pipeline as /chat:
+  - questions are embedded in batches (one embeddings request per --embed-batch)
+  - identical questions (after normalization) share one embedding + retrieval pass
+  - retrieval and generation run concurrently, capped by --concurrency
+Results are appended to the output JSONL as each item finishes, with per-item
+latency and token usage. Re-running skips ids already answered successfully, so
+an interrupted run resumes where it stopped (failed items are retried; readers
+should keep the last line per id). --profile answers with a named pipeline profile
+(see veda_chatbot/profiles.py), so experiment arms can be compared offline on the
+same question set.
+
+Run from the backend directory:
+    python -m scripts.batch_answer questions.jsonl answers.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from src.modules.veda_chatbot.context import format_context, select_context
+from src.modules.veda_chatbot.frames import encode_frame
+from src.modules.veda_chatbot.profiles import DEFAULT_PROFILE, PipelineProfile, profiles
+from src.modules.veda_chatbot.prompts import PROMPT_VERSION, build_messages, usage_meta
+from src.modules.veda_chatbot.service import EMBEDDING_MODEL, REC_MARKER, ChatService, recommender
+from src.modules.veda_chatbot.smalltalk import normalize_message
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            question = item.get("question") or item.get("message")
+            if not question:
+                print(f"Skipping line {line_no}: no question")
+                continue
+            items.append({"id": str(item.get("id", line_no)), "question": question})
+    return items
+
+
+def completed_ids(path: str) -> set:
+    """Ids whose last recorded result in an existing output file succeeded."""
+    status = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from an interrupted run
+                status[row.get("id")] = row.get("status")
+    return {item_id for item_id, state in status.items() if state == "ok"}
+
+
+class BatchAnswerer:
+    def __init__(self, client, out_file, concurrency: int, embed_batch: int, profile: PipelineProfile, source: Optional[str] = None):
+        self.client = client
+        self.profile = profile
+        self.source = source
+        self.out_file = out_file
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.embed_batch = embed_batch
+        self.retrievals: Dict[str, asyncio.Future] = {}  # normalized question -> (chunks, context report, timings)
+        self.stats = {"ok": 0, "error": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    async def _embed_and_retrieve(self, questions: List[str], futures: List[asyncio.Future]):
+        """One embeddings request for the batch, then one concurrent retrieval per question."""
+        start = time.perf_counter()
+        try:
+            response = await self.client.embeddings.create(input=questions, model=EMBEDDING_MODEL, **ChatService.embedding_options())
+            data = list(response.data)
+        except Exception as e:
+            for fut in futures:
+                fut.set_exception(e)
+            return
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        async def _retrieve(embedding, fut):
+            # Always settle the future: every duplicate of this question awaits it
+            try:
+                t0 = time.perf_counter()
+                async with self.semaphore:
+                    try:
+                        candidates = await asyncio.to_thread(ChatService.match_documents, embedding, self.profile.match_threshold, self.profile.rag_candidates, self.source)
+                    except Exception as e:
+                        print(f"RAG Error: {e}")
+                        candidates = []
+                chunks, report = await asyncio.to_thread(select_context, candidates, self.profile.match_count, token_budget=self.profile.context_tokens)
+                fut.set_result((chunks, report, {"embed_batch_ms": round(embed_ms, 1), "retrieve_ms": round((time.perf_counter() - t0) * 1000, 1)}))
+            except Exception as e:
+                fut.set_exception(e)
+
+        for fut in futures[len(data):]:
+            fut.set_exception(RuntimeError(f"Embeddings response had {len(data)} vectors for {len(questions)} questions"))
+        await asyncio.gather(*(_retrieve(item.embedding, fut) for item, fut in zip(data, futures)))
+
+    async def _answer(self, item: Dict[str, Any], retrieval: asyncio.Future):
+        start = time.perf_counter()
+        row = {"id": item["id"], "question": item["question"]}
+        try:
+            chunks, report, timings = await retrieval
+            timings = dict(timings)  # Shared by every duplicate of this question
+            context_text = format_context(chunks)
+            async with self.semaphore:
+                t0 = time.perf_counter()
+                response = await self.client.chat.completions.create(
+                    model=self.profile.chat_model,
+                    messages=build_messages(item["question"], context_text),
+                    temperature=self.profile.temperature,
+                    max_tokens=self.profile.max_tokens,
+                    top_p=self.profile.top_p
+                )
+                timings["generate_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            raw = response.choices[0].message.content or ""
+            usage = usage_meta(response.usage)
+            row.update({
+                "status": "ok",
+                "answer": raw.split(REC_MARKER, 1)[0].strip(),
+                "recommendations": recommender.recommend(item["question"], context_text, chunks),
+                "source": "rag-openai" if context_text else "llm-openai-fallback",
+                "chunks": [c.get("id") for c in chunks],
+                "context": report,
+                "latency_ms": {**timings, "total_ms": round((time.perf_counter() - start) * 1000, 1)},
+                "usage": usage,
+                "prompt_version": PROMPT_VERSION,
+                "profile": self.profile.name,
+            })
+            self.stats["ok"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                self.stats[key] += usage.get(key, 0)
+        except Exception as e:
+            row.update({"status": "error", "error": str(e), "latency_ms": {"total_ms": round((time.perf_counter() - start) * 1000, 1)}})
+            self.stats["error"] += 1
+        # Single-threaded loop: each line is written whole, in completion order
+        self.out_file.write(encode_frame(row).decode("utf-8"))
+        self.out_file.flush()
+
+    async def run(self, items: List[Dict[str, Any]]):
+        loop = asyncio.get_running_loop()
+        pending_keys, pending_futures, tasks = [], [], []
+        for item in items:
+            key = normalize_message(item["question"])
+            if key not in self.retrievals:
+                self.retrievals[key] = loop.create_future()
+                pending_keys.append(item["question"])
+                pending_futures.append(self.retrievals[key])
+                if len(pending_keys) >= self.embed_batch:
+                    tasks.append(asyncio.create_task(self._embed_and_retrieve(pending_keys, pending_futures)))
+                    pending_keys, pending_futures = [], []
+            tasks.append(asyncio.create_task(self._answer(item, self.retrievals[key])))
+        if pending_keys:
+            tasks.append(asyncio.create_task(self._embed_and_retrieve(pending_keys, pending_futures)))
+        await asyncio.gather(*tasks)
+
+
+async def main_async(args):
+    items = load_questions(args.input)
+    done = completed_ids(args.output) if not args.restart else set()
+    todo = [item for item in items if item["id"] not in done]
+    if args.limit:
+        todo = todo[:args.limit]
+    print(f"{len(items)} questions, {len(done)} already answered, {len(todo)} to run (concurrency {args.concurrency})")
+    if not todo:
+        return
+
+    client = ChatService.get_openai_client()
+    if client is None:
+        raise SystemExit("OPENAI_API_KEY not set.")
+    profiles.refresh(force=True)
+    if args.profile not in profiles.profiles:
+        raise SystemExit(f"Unknown profile '{args.profile}' (available: {', '.join(profiles.profiles)}).")
+    profile = profiles.profiles[args.profile]
+    if args.temperature is not None:
+        profile = profile.model_copy(update={"temperature": args.temperature})
+
+    start = time.perf_counter()
+    with open(args.output, "w" if args.restart else "a", encoding="utf-8") as out_file:
+        answerer = BatchAnswerer(client, out_file, args.concurrency, args.embed_batch, profile, args.source)
+        await answerer.run(todo)
+    elapsed = time.perf_counter() - start
+
+    stats = answerer.stats
+    print(f"Done in {elapsed:.1f}s ({len(todo) / elapsed:.1f} q/s): {stats['ok']} ok, {stats['error']} errors, "
+          f"{len(answerer.retrievals)} unique retrievals")
+    print(f"Tokens: prompt {stats['prompt_tokens']} (cached {stats['cached_tokens']}), completion {stats['completion_tokens']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in bulk")
+    parser.add_argument("input", help="JSONL with {id, question} per line")
+    parser.add_argument("output", help="JSONL results (appended; used to resume)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max in-flight retrieval/generation calls")
+    parser.add_argument("--embed-batch", type=int, default=64, help="Questions per embeddings request")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="Pipeline profile (PIPELINE_PROFILES_PATH) to answer with")
+    parser.add_argument("--temperature", type=float, default=None, help="Override the profile's temperature")
+    parser.add_argument("--source", default=None, help="Only retrieve chunks whose metadata source matches")
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N pending questions")
+    parser.add_argument("--restart", action="store_true", help="Ignore and overwrite an existing output file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for NDJSON frame encoding.
+Run from the backend directory:  python -m scripts.bench_frames
+"""
+import asyncio
+import time
+
+from src.modules.veda_chatbot.frames import (
+    ENCODER_BACKEND,
+    brotli,
+    coalesce_frames,
+    encode_frame,
+    encode_frame_stdlib,
+    encode_stream,
+)
+
+N_FRAMES = 200_000
+DELTA = "LeadQ captures contacts, "
+
+
+def make_frames(n: int):
+    frames = [{"type": "status", "chunk": "thinking"}]
+    frames += [{"type": "content", "chunk": DELTA} for _ in range(n)]
+    frames.append({"type": "recommendations", "data": ["What features does LeadQ offer?", "Tell me about pricing"]})
+    frames.append({"type": "meta", "sessionId": "00000000-0000-0000-0000-000000000000"})
+    return frames
+
+
+async def _aiter(frames):
+    for frame in frames:
+        yield frame
+
+
+def bench_encoder(name, encoder, frames):
+    start = time.perf_counter()
+    total = 0
+    for frame in frames:
+        total += len(encoder(frame))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {len(frames) / elapsed:>12,.0f} frames/s  {total / 1024:>9,.0f} KiB")
+
+
+async def bench_stream(name, frames, encoding=None, **coalesce):
+    start = time.perf_counter()
+    out_frames = 0
+    out_bytes = 0
+    if coalesce:
+        async for frame in coalesce_frames(_aiter(frames), **coalesce):
+            out_frames += 1
+            out_bytes += len(encode_frame(frame))
+    else:
+        async for data in encode_stream(_aiter(frames), encoding):
+            out_frames += 1
+            out_bytes += len(data)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {len(frames) / elapsed:>12,.0f} frames/s  {out_bytes / 1024:>9,.0f} KiB  ({out_frames:,} writes)")
+
+
+def main():
+    frames = make_frames(N_FRAMES)
+    print(f"Encoder backend: {ENCODER_BACKEND}  ({len(frames):,} frames)\n")
+
+    bench_encoder("json.dumps (baseline)", encode_frame_stdlib, frames)
+    bench_encoder(f"encode_frame ({ENCODER_BACKEND})", encode_frame, frames)
+
+    print()
+    asyncio.run(bench_stream("no coalescing", frames, window_ms=0, max_bytes=0))
+    asyncio.run(bench_stream("coalesce 512 B", frames, window_ms=0, max_bytes=512))
+    asyncio.run(bench_stream("coalesce 30 ms", frames, window_ms=30, max_bytes=0))
+    asyncio.run(bench_stream("stream identity", frames))
+    asyncio.run(bench_stream("stream gzip", frames, encoding="gzip"))
+    if brotli is not None:
+        asyncio.run(bench_stream("stream br", frames, encoding="br"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark for the checkerboard cleanup in process_chatbot_icon.py on a 4K synthetic image.
+Compares the original per-round full-image dilation and per-label cluster loop with the
+vectorized engine (rembg itself is not part of the measurement).
+
+Run from the backend directory:  python scripts/bench_icon_cleanup.py
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import ndimage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "modules" / "veda_chatbot" / "scripts"))
+from process_chatbot_icon import channel_stats, fill_checker, drop_checker_clusters
+
+WIDTH, HEIGHT = 3840, 2160
+
+
+def synthetic_checker(seed: int = 7):
+    """Gray checkerboard with a cyan 'robot', tinted checker halo and leftover checker specks."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:HEIGHT, 0:WIDTH]
+    tile = 24
+    gray = np.where(((yy // tile) + (xx // tile)) % 2 == 0, 200, 150).astype(np.uint8)
+    image = np.dstack([gray, gray, gray])
+
+    cy, cx = HEIGHT // 2, WIDTH // 2
+    dist = np.hypot((yy - cy) / 700.0, (xx - cx) / 500.0)
+    robot = dist < 1.0
+    halo = (dist >= 1.0) & (dist < 1.08)
+    image[robot] = (30, 200, 230)
+    image[halo] = (gray[halo] * 0.8).astype(np.uint8)[:, None] + np.array([0, 30, 40], dtype=np.uint8)
+
+    # Stand-in for rembg output: robot and some checker specks survive as opaque
+    alpha = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    alpha[robot | halo] = 255
+    for _ in range(400):
+        y, x = rng.integers(0, HEIGHT - 8), rng.integers(0, WIDTH - 8)
+        size = rng.integers(2, 7)
+        alpha[y:y + size, x:x + size] = 255
+    return image, np.dstack([image, alpha])
+
+
+def legacy_fill(orig):
+    orig_data = orig.astype(np.float32)
+    r, g, b = orig_data[:, :, 0], orig_data[:, :, 1], orig_data[:, :, 2]
+    chroma = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+    brightness = (r + g + b) / 3.0
+    pure_checker = (chroma < 25) & (brightness > 40) & (brightness < 210)
+    filled = pure_checker.copy()
+    for _ in range(8):
+        near = ndimage.binary_dilation(filled, iterations=3)
+        tinted = near & ~filled & (chroma < 80) & (brightness > 40) & (brightness < 210)
+        if tinted.sum() == 0:
+            break
+        filled |= tinted
+    return filled
+
+
+def legacy_clusters(result, orig):
+    orig_data = orig.astype(np.float32)
+    r_o, g_o, b_o = orig_data[:, :, 0], orig_data[:, :, 1], orig_data[:, :, 2]
+    chroma_o = np.maximum(np.maximum(r_o, g_o), b_o) - np.minimum(np.minimum(r_o, g_o), b_o)
+    bright_o = (r_o + g_o + b_o) / 3.0
+    opaque = result[:, :, 3] > 128
+    remaining_checker = opaque & (chroma_o < 30) & (bright_o > 40) & (bright_o < 190)
+    labeled, num = ndimage.label(remaining_checker)
+    for i in range(1, num + 1):
+        region = labeled == i
+        if region.sum() >= 10:
+            result[region, 3] = 0
+    return num
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    image, rembg_like = synthetic_checker()
+    print(f"Synthetic image: {WIDTH}x{HEIGHT}")
+
+    legacy_mask, t_legacy_fill = timed(legacy_fill, image)
+    legacy_result = rembg_like.copy()
+    num_labels, t_legacy_clusters = timed(legacy_clusters, legacy_result, image)
+
+    (chroma, brightness), t_stats = timed(channel_stats, image)
+    new_mask, t_fill = timed(fill_checker, chroma, brightness)
+    new_result = rembg_like.copy()
+    _, t_clusters = timed(drop_checker_clusters, new_result, chroma, brightness)
+
+    assert np.array_equal(legacy_mask, new_mask), "fill mask mismatch"
+    assert np.array_equal(legacy_result, new_result), "cluster cleanup mismatch"
+
+    print(f"  step 1 fill     legacy {t_legacy_fill:7.2f}s   vectorized {t_fill + t_stats:7.2f}s (stats {t_stats:.2f}s)")
+    print(f"  step 3 clusters legacy {t_legacy_clusters:7.2f}s   vectorized {t_clusters:7.2f}s ({num_labels} labels)")
+    total_legacy = t_legacy_fill + t_legacy_clusters
+    total_new = t_stats + t_fill + t_clusters
+    print(f"  total           legacy {total_legacy:7.2f}s   vectorized {total_new:7.2f}s  (x{total_legacy / total_new:.1f})")
+    print("  outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for tuned rembg inference (rembg_tuned.TunedSession) against rembg's default session.
+
+Samples frames from a clip (or uses one image), runs them through
+rembg.new_session(--reference-model) one frame per call as the reference, then
+through each TunedSession configuration: models x intra-op threads x batch sizes,
+fp32 and, with --int8, the int8 model calibrated on the same clip. Reports
+frames per second (after a warm-up call) and the mask agreement with the
+reference: IoU of the alpha masks thresholded at 128, and the mean absolute alpha
+difference.
+
+Run from the backend directory:
+    python scripts/bench_rembg.py mascot.webm --width 320 --frames 32 --models u2net u2netp --int8
+    python scripts/bench_rembg.py mascot.webm --threads 2 4 8 --batches 1 4 8 --no-spin
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mascot_media import CALIBRATION_FRAMES, sample_frames
+from rembg_tuned import TunedSession, available_cores
+
+
+def mask_iou(a: np.ndarray, b: np.ndarray) -> float:
+    a, b = a >= 128, b >= 128
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def agreement(reference, masks):
+    iou = np.mean([mask_iou(r, m) for r, m in zip(reference, masks)])
+    diff = np.mean([np.abs(r.astype(np.int16) - m.astype(np.int16)).mean() for r, m in zip(reference, masks)])
+    return iou, diff
+
+
+def bench_reference(model, frames):
+    from rembg import new_session, remove
+    session = new_session(model)
+    remove(frames[0], session=session)  # Warm-up: first call allocates and plans
+    start = time.perf_counter()
+    masks = [np.asarray(remove(frame, session=session))[:, :, 3] for frame in frames]
+    return masks, len(frames) / (time.perf_counter() - start)
+
+
+def bench_tuned(session, frames):
+    session.predict_batch(frames[:session.batch_size])  # Warm-up at the batch shape being measured
+    start = time.perf_counter()
+    masks = session.predict_batch(frames)
+    return masks, len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rembg default vs tuned ONNX Runtime sessions")
+    parser.add_argument("input", help="Video or image to take frames from")
+    parser.add_argument("--frames", type=int, default=32, help="Frames sampled from the clip")
+    parser.add_argument("--width", type=int, default=320, help="Resize frames to this width first")
+    parser.add_argument("--reference-model", default="u2net", help="Model of the default rembg session (reference masks)")
+    parser.add_argument("--models", nargs="+", default=["u2net", "u2netp"])
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="Intra-op thread counts (default: all cores and half)")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--int8", action="store_true", help="Also benchmark int8-quantized models")
+    parser.add_argument("--no-spin", action="store_true", help="Disable ORT spin-waiting")
+    args = parser.parse_args()
+
+    frames = sample_frames(args.input, args.frames, args.width)
+    calibration = frames[::max(1, len(frames) // CALIBRATION_FRAMES)][:CALIBRATION_FRAMES]
+    cores = available_cores()
+    thread_counts = args.threads or sorted({cores, max(1, cores // 2)}, reverse=True)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, {cores} cores available")
+
+    reference, ref_fps = bench_reference(args.reference_model, frames)
+    print(f"  {'rembg default ' + args.reference_model:<40} {ref_fps:7.2f} fps   (reference)")
+
+    for model in args.models:
+        for int8 in ([False, True] if args.int8 else [False]):
+            for threads in thread_counts:
+                for batch in args.batches:
+                    session = TunedSession(model, threads=threads, spin=not args.no_spin, batch_size=batch,
+                                           quantize=int8, calibration_images=calibration)
+                    masks, fps = bench_tuned(session, frames)
+                    iou, diff = agreement(reference, masks)
+                    label = f"{model}{' int8' if int8 else ''} threads={threads} batch={session.batch_size}"
+                    print(f"  {label:<40} {fps:7.2f} fps   x{fps / ref_fps:4.1f}   IoU {iou:.4f}   |d alpha| {diff:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
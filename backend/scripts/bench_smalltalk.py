@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for the small-talk classifier.
+Compares the previous per-pattern greeting / thank-you matching with the merged regex
+on a realistic mix of messages (phrasing is covered by tests/test_smalltalk.py).
+Run from the backend directory:  python -m scripts.bench_smalltalk
+"""
+import re
+import time
+
+from src.modules.veda_chatbot.smalltalk import classify_small_talk, normalize_message
+
+N_ROUNDS = 20_000
+
+# Previous implementation (service.py before the merged classifier)
+LEGACY_GREETING = [re.compile(p, re.IGNORECASE) for p in [
+    r"^\s*(hi|hello|hey|hiya|howdy|hola|namaste)\s*[!.?\U0001f44b]*\s*$",
+    r"^\s*(good\s*(morning|afternoon|evening|day|night))\s*[!.?]*\s*$",
+    r"^\s*(what'?s\s*up|sup|yo|greetings)\s*[!.?]*\s*$",
+    r"^\s*(hi\s+there|hello\s+there|hey\s+there)\s*[!.?\U0001f44b]*\s*$",
+]]
+LEGACY_THANKS = [re.compile(p, re.IGNORECASE) for p in [
+    r"^\s*(thanks|thank\s*you|thankyou|ty|thx|thank\s*u|thanks\s*a\s*lot|thank\s*you\s*so\s*much)\s*[!.?]*\s*$",
+]]
+
+
+def legacy_classify(message: str):
+    message.lower().strip()  # chat_generator's separate normalization, also done per request
+    clean = message.strip()
+    if any(p.match(clean) for p in LEGACY_THANKS):
+        return "thanks"
+    if any(p.match(clean) for p in LEGACY_GREETING):
+        return "greeting"
+    return None
+
+
+def classify(message: str):
+    return classify_small_talk(normalize_message(message))
+
+
+WORKLOAD = (
+    [
+        "hi", "Hello!", "hey", "hola", "hi \U0001f44b", "good morning", "Good Night!", "whats up?", "hi there",
+        "thanks", "Thank you", "thx", "thanks a lot", "thank you so much!",
+    ]
+    + [
+        "hi, what does LeadQ cost?", "How much is the professional plan?", "thanks but how do I export contacts?",
+        "Tell me about VocalQ", "hello world api example", "ok so how does enrichment work", "yoga",
+    ] * 4
+    + ["Can you explain how the Chrome extension captures leads from LinkedIn profiles?"] * 8
+)
+
+
+def bench(fn, label):
+    start = time.perf_counter()
+    for _ in range(N_ROUNDS):
+        for message in WORKLOAD:
+            fn(message)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (N_ROUNDS * len(WORKLOAD)) * 1e9
+    print(f"  {label:<8} {elapsed:6.2f}s  {per_call:7.0f} ns/message")
+    return elapsed
+
+
+def main():
+    print(f"Classifying {len(WORKLOAD)} messages x {N_ROUNDS} rounds")
+    legacy = bench(legacy_classify, "legacy")
+    merged = bench(classify, "merged")
+    print(f"  speedup  x{legacy / merged:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Exercises core/cache.py against both backends: the in-process store and the Redis
+backend pointed at a local fake RESP server (started here, in-process), or at a
+real server with --url. Covers TTL expiry, namespacing, serialization round trips,
+atomic counters, lock ownership, cross-"worker" single-flight and degradation
+when the server goes away.
+
+Run from the backend directory:
+    python -m scripts.check_cache
+    python -m scripts.check_cache --url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import time
+
+from src.core.cache import Cache, MemoryBackend, RedisBackend, _INCR_SCRIPT, _RELEASE_SCRIPT, dumps, loads
+
+
+class FakeRespServer:
+    """Just enough of the Redis protocol for the cache backend: GET/SET/DEL/EVAL/PING/SELECT."""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at)
+        self.server = None
+        self.port = None
+        self.clients = set()
+
+    def _get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def _execute(self, args):
+        cmd = args[0].upper()
+        if cmd in (b"PING", b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        if cmd == b"GET":
+            return self._bulk(self._get(args[1]))
+        if cmd == b"DEL":
+            return b":%d\r\n" % (self.data.pop(args[1], None) is not None)
+        if cmd == b"SET":
+            key, value, opts = args[1], args[2], [a.upper() for a in args[3:]]
+            if b"NX" in opts and self._get(key) is not None:
+                return b"$-1\r\n"
+            ttl = int(args[3 + opts.index(b"PX") + 1]) / 1000 if b"PX" in opts else None
+            self.data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return b"+OK\r\n"
+        if cmd == b"EVAL":
+            script, key, arg = args[1].decode(), args[3], args[4]
+            if script == _INCR_SCRIPT:
+                value = int(self._get(key) or b"0") + 1
+                expires = self.data[key][1] if value > 1 else (time.monotonic() + int(arg) / 1000 if int(arg) > 0 else None)
+                self.data[key] = (str(value).encode(), expires)
+                return b":%d\r\n" % value
+            if script == _RELEASE_SCRIPT:
+                if self._get(key) == arg:
+                    del self.data[key]
+                    return b":1\r\n"
+                return b":0\r\n"
+        return b"-ERR unknown command\r\n"
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def _handle(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    size = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self.clients):  # Drop open connections too, like a crashed server
+            writer.close()
+        await self.server.wait_closed()
+
+
+async def check_backend(label: str, make_backend):
+    # Two facades over separate backend instances behave like two workers sharing a server
+    worker_a, worker_b = Cache("check", make_backend()), Cache("check", make_backend())
+    other_ns = Cache("other", worker_a.backend)
+
+    await worker_a.set("profile", {"plan": "Team", "seats": 5, "tags": ["a", "b"]}, ttl=0.2)
+    assert await worker_b.get("profile") == {"plan": "Team", "seats": 5, "tags": ["a", "b"]}
+    assert await other_ns.get("profile") is None, "namespaces must not collide"
+    await asyncio.sleep(0.3)
+    assert await worker_b.get("profile") is None, "TTL not applied"
+
+    counts = await asyncio.gather(*(worker.incr("rate:u1", ttl=1) for worker in (worker_a, worker_b) * 10))
+    assert sorted(counts) == list(range(1, 21)), counts
+    assert await worker_b.get("rate:u1") == 20, "counter read back through get()"
+
+    async with worker_a.lock("job", ttl=5) as held:
+        assert held.acquired
+        async with worker_b.lock("job", ttl=5, wait=0.1) as contender:
+            assert not contender.acquired, "lock acquired twice"
+    async with worker_b.lock("job", ttl=5, wait=0.1) as after:
+        assert after.acquired, "lock not released"
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return b"\x00\x01vector"
+
+    results = await asyncio.gather(*(worker.get_or_set("emb:q1", compute, ttl=5) for worker in (worker_a, worker_b) * 5))
+    assert all(r == b"\x00\x01vector" for r in results) and len(calls) == 1, f"{len(calls)} computations"
+    print(f"  {label:<8} ttl, namespaces, counters, locks, single-flight ({len(results)} callers -> {len(calls)} call): ok")
+
+
+async def main_async(url):
+    big = {"chunks": ["LeadQ pricing " * 50] * 10}
+    assert loads(dumps(big)) == big and len(dumps(big)) < len(str(big)) // 4, "compression"
+    assert loads(dumps(b"raw")) == b"raw"
+    assert loads(b"12") == 12 and loads(b"100") == 100 and loads(b"-3") == -3, "incr values"
+
+    shared = MemoryBackend()
+    await check_backend("memory", lambda: shared)
+
+    fake = None
+    if url is None:
+        fake = FakeRespServer()
+        await fake.start()
+        url = f"redis://127.0.0.1:{fake.port}/0"
+    await check_backend("redis", lambda: RedisBackend(url))
+
+    if fake is not None:
+        cache = Cache("check", RedisBackend(url, timeout=0.2))
+        await cache.set("k", 1)
+        await fake.stop()
+        start = time.perf_counter()
+        value = await cache.get("k", "miss")
+        assert value == "miss", value
+        print(f"  server down: get degraded to a miss in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache backend checks")
+    parser.add_argument("--url", default=None, help="Real Redis-protocol server (default: in-process fake)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.url))
+    print("Cache checks passed.")
+
+
+if __name__ == "__main__":
+    main()
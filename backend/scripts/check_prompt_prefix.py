@@ -0,0 +1,38 @@
+"""
+Checks that the prompt prefix sent to OpenAI is byte-stable across requests.
+Builds the message list for varied queries, contexts and histories and verifies
+the leading system message never changes (a prerequisite for prompt caching).
+Run from the backend directory:  python -m scripts.check_prompt_prefix
+"""
+from src.modules.veda_chatbot.prompts import PROMPT_VERSION, SYSTEM_PROMPT, build_messages
+
+CASES = [
+    ("How much does LeadQ cost?", "Starter ($29/mo) ...", None),
+    ("Does it work with HubSpot?", "", None),
+    ("And the Team plan?", "Team ($199/mo) ...", [
+        {"role": "user", "content": "How much does LeadQ cost?"},
+        {"role": "assistant", "content": "LeadQ offers four plans..."},
+    ]),
+    ("What is VocalQ?", "VocalQ is an AI voice agent ...", [{"role": "user", "content": f"q{i}"} for i in range(10)]),
+]
+
+
+def main():
+    prefixes = set()
+    for message, context, history in CASES:
+        messages = build_messages(message, context, history)
+        prefixes.add(messages[0]["content"].encode("utf-8"))
+        assert messages[-1] == {"role": "user", "content": message}, "user message must come last"
+        assert context in messages[-2]["content"], "context must directly precede the user message"
+    assert prefixes == {SYSTEM_PROMPT.encode("utf-8")}, "system prefix varies between requests"
+
+    # Within a session, each turn's payload must extend the previous turn's prefix
+    turn1 = build_messages("How much does LeadQ cost?", "ctx A")
+    turn2 = build_messages("And the Team plan?", "ctx B", [turn1[-1], {"role": "assistant", "content": "answer"}])
+    assert turn2[0] == turn1[0]
+
+    print(f"Prompt prefix stable across {len(CASES)} requests: {len(SYSTEM_PROMPT.encode('utf-8'))} bytes, version {PROMPT_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
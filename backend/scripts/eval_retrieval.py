@@ -0,0 +1,295 @@
+"""
+Offline retrieval-quality and cost benchmark for the RAG pipeline.
+
+Rebuilds the corpus the way ingest.py does (documents/ + KNOWLEDGE_BASE topics),
+embeds it, and replays the fixture questions against an in-memory version of
+`match_documents` for every retriever configuration in the grid.
+
+Reports per configuration:
+  recall@k   share of expected evidence snippets present in the retrieved chunks
+  MRR        reciprocal rank of the first chunk containing any expected snippet
+  ctx tok    mean prompt tokens of the retrieved context per query
+  search ms  mean / p95 retrieval latency (query embedding reported separately)
+
+With --dims / --quantization it also compares compact indexes: embeddings truncated
+to fewer dimensions (text-embedding-3 is Matryoshka-trained, so this matches the API's
+`dimensions` parameter) and int8 or binary codes, searched approximately and then
+rescored at full precision over the top --rescore candidates. Extra columns:
+  B/vec      index bytes per vector
+  overlap    share of the 1536-dim float32 results returned for the same query
+
+With --select the grid is run twice: plain top-k, and over-fetching --candidates
+followed by the /chat context-selection stage (dedup, MMR, token budget; see
+veda_chatbot/context.py), so recall can be weighed against the context tokens saved.
+
+    python scripts/eval_retrieval.py --embeddings stub
+    python scripts/eval_retrieval.py --embeddings openai --chunk-sizes 400 800 --thresholds 0.6 0.72
+    python scripts/eval_retrieval.py --embeddings openai --cache emb.json --chunk-sizes 800 --dims 1536 512 256 --quantization none int8 binary
+    python scripts/eval_retrieval.py --embeddings openai --cache emb.json --select --candidates 12
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from ingest import DOCS_DIR, chunk_text, read_document
+
+FIXTURE_PATH = Path(__file__).resolve().parent / "fixtures" / "retrieval_eval.json"
+EMBED_DIM = 1536
+EMBED_MODEL = "text-embedding-3-small"
+
+# Stub cosine scores are much lower than text-embedding-3-small's, so each backend has its own default grid
+DEFAULT_THRESHOLDS = {"stub": [0.0, 0.1, 0.2], "openai": [0.6, 0.72, 0.8]}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# --- Embeddings ---
+
+def stub_embed(texts):
+    """Deterministic hashed bag-of-words (unigrams + bigrams), L2-normalised."""
+    out = np.zeros((len(texts), EMBED_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _TOKEN_RE.findall(text.lower())
+        for feature in words + [f"{a}_{b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            idx = int.from_bytes(digest[:4], "little") % EMBED_DIM
+            out[row, idx] += 1.0 if digest[4] & 1 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-9)
+
+
+class OpenAIEmbedder:
+    """text-embedding-3-small with an optional on-disk cache keyed by text hash."""
+
+    def __init__(self, cache_path=None, dimensions=None):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.dimensions = dimensions
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def _key(self, text):
+        return hashlib.sha1(f"{EMBED_MODEL}:{self.dimensions}:{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, texts):
+        missing = [t for t in dict.fromkeys(texts) if self._key(t) not in self.cache]
+        for start in range(0, len(missing), 96):
+            batch = missing[start:start + 96]
+            kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+            response = self.client.embeddings.create(input=[t.replace("\n", " ") for t in batch], model=EMBED_MODEL, **kwargs)
+            for text, item in zip(batch, response.data):
+                self.cache[self._key(text)] = item.embedding
+        if missing and self.cache_path:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+        vectors = np.array([self.cache[self._key(t)] for t in texts], dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+# --- Corpus ---
+
+def load_corpus(chunk_tokens: int, include_kb: bool = True):
+    """Chunks as ingest.py would store them, plus one chunk per KNOWLEDGE_BASE topic."""
+    chunks = []
+    for file_path in sorted(glob.glob(os.path.join(DOCS_DIR, "*.*"))):
+        try:
+            content = read_document(file_path)
+        except Exception as e:
+            print(f"Skipping {file_path}: {e}")
+            continue
+        for i, chunk in enumerate(chunk_text(content, max_tokens=chunk_tokens)):
+            chunks.append({"content": chunk, "metadata": {"source": os.path.basename(file_path), "chunk_index": i}})
+
+    if include_kb:
+        from src.modules.veda_chatbot.service import KNOWLEDGE_BASE
+        for topic, data in KNOWLEDGE_BASE.items():
+            chunks.append({"content": data["answer"], "metadata": {"source": f"kb:{topic}", "chunk_index": 0}})
+    return chunks
+
+
+def count_tokens(text: str) -> int:
+    """Same count as /chat's context budget (cl100k, or an estimate when tiktoken can't load)."""
+    from src.modules.veda_chatbot.context import count_tokens as chat_count_tokens
+    return chat_count_tokens(text)
+
+
+# --- Retrieval ---
+
+def match_documents(matrix, query_vec, threshold, count):
+    """In-memory equivalent of the SQL function: cosine > threshold, best `count`."""
+    similarity = matrix @ query_vec
+    candidates = np.flatnonzero(similarity > threshold)
+    if candidates.size == 0:
+        return []
+    order = candidates[np.argsort(-similarity[candidates], kind="stable")][:count]
+    return order.tolist()
+
+
+def truncate(vectors, dims):
+    """First `dims` components, re-normalised (what `dimensions=dims` returns)."""
+    cut = vectors[:, :dims]
+    return cut / np.maximum(np.linalg.norm(cut, axis=1, keepdims=True), 1e-9)
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class CompactIndex:
+    """Truncated and optionally quantized copy of the corpus matrix.
+
+    int8: symmetric per-dimension scale. binary: sign bits compared by Hamming
+    distance (pgvector's binary_quantize + <~>). Quantized searches take the best
+    `rescore` candidates by approximate score and re-rank them with the float32
+    vectors, like match_documents_quantized.
+    """
+
+    def __init__(self, matrix, dims, quantization="none"):
+        self.dims = dims
+        self.quantization = quantization
+        self.full = truncate(matrix, dims)
+        if quantization == "int8":
+            self.scale = np.maximum(np.abs(self.full).max(axis=0), 1e-9) / 127.0
+            self.codes = np.round(self.full / self.scale).astype(np.int8)
+            self.bytes_per_vector = dims
+        elif quantization == "binary":
+            self.codes = np.packbits(self.full > 0, axis=1)
+            self.bytes_per_vector = self.codes.shape[1]
+        else:
+            self.bytes_per_vector = dims * 4
+
+    def _approx_scores(self, query_vec):
+        if self.quantization == "int8":
+            return self.codes.astype(np.float32) @ (query_vec * self.scale)
+        query_bits = np.packbits(query_vec > 0)
+        return -_POPCOUNT[np.bitwise_xor(self.codes, query_bits)].sum(axis=1).astype(np.float32)
+
+    def search(self, query_vec, threshold, count, rescore):
+        query_vec = truncate(query_vec[None, :], self.dims)[0]
+        if self.quantization == "none":
+            return match_documents(self.full, query_vec, threshold, count)
+        approx = self._approx_scores(query_vec)
+        keep = min(max(rescore, count), approx.size)
+        candidates = np.argpartition(-approx, keep - 1)[:keep]
+        similarity = self.full[candidates] @ query_vec
+        order = np.argsort(-similarity, kind="stable")
+        return [int(candidates[i]) for i in order if similarity[i] > threshold][:count]
+
+
+def select_hits(index, chunks, query_vec, threshold, count, rescore, candidates):
+    """Over-fetch `candidates`, then apply the same context selection as /chat."""
+    from src.modules.veda_chatbot.context import select_context
+    hits = index.search(query_vec, threshold, max(candidates, count), rescore)
+    similarity = index.full[hits] @ truncate(query_vec[None, :], index.dims)[0] if hits else []
+    pool = [{"id": h, "content": chunks[h]["content"], "similarity": float(sim)} for h, sim in zip(hits, similarity)]
+    selected, _ = select_context(pool, count)
+    return [c["id"] for c in selected]
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def evaluate(fixtures, chunks, search, query_vecs, threshold, count, reference=None):
+    """`search(qvec, threshold, count)` -> chunk indexes; `reference` holds baseline hits per query."""
+    texts = [_normalise(c["content"]) for c in chunks]
+    recalls, rranks, ctx_tokens, latencies, overlaps, all_hits = [], [], [], [], [], []
+    for pos, (item, qvec) in enumerate(zip(fixtures, query_vecs)):
+        start = time.perf_counter()
+        hits = search(qvec, threshold, count)
+        latencies.append((time.perf_counter() - start) * 1000)
+        all_hits.append(hits)
+        if reference is not None and reference[pos]:
+            overlaps.append(len(set(hits) & set(reference[pos])) / len(reference[pos]))
+
+        expected = [_normalise(e) for e in item["expected"]]
+        covered = {e for e in expected for h in hits if e in texts[h]}
+        recalls.append(len(covered) / len(expected))
+
+        rank = next((pos + 1 for pos, h in enumerate(hits) if any(e in texts[h] for e in expected)), None)
+        rranks.append(1.0 / rank if rank else 0.0)
+        ctx_tokens.append(sum(chunks[h]["tokens"] for h in hits))
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(rranks)),
+        "ctx_tokens": float(np.mean(ctx_tokens)),
+        "search_ms": float(np.mean(latencies)),
+        "search_p95_ms": float(np.percentile(latencies, 95)),
+        "overlap": float(np.mean(overlaps)) if overlaps else 1.0,
+    }, all_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality / cost benchmark")
+    parser.add_argument("--embeddings", choices=["stub", "openai"], default="stub")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[200, 400, 800])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=None)
+    parser.add_argument("--counts", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--dims", type=int, nargs="+", default=[EMBED_DIM], help="Truncated embedding sizes to compare")
+    parser.add_argument("--quantization", nargs="+", choices=["none", "int8", "binary"], default=["none"])
+    parser.add_argument("--rescore", type=int, default=40, help="Full-precision rescoring candidates for quantized indexes")
+    parser.add_argument("--select", action="store_true", help="Also evaluate over-fetch + context selection")
+    parser.add_argument("--candidates", type=int, default=12, help="Chunks over-fetched for --select")
+    parser.add_argument("--fixtures", default=str(FIXTURE_PATH))
+    parser.add_argument("--cache", default=None, help="JSON cache for OpenAI embeddings")
+    parser.add_argument("--no-kb", action="store_true", help="Exclude KNOWLEDGE_BASE topics from the corpus")
+    parser.add_argument("--json", dest="json_out", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    thresholds = args.thresholds or DEFAULT_THRESHOLDS[args.embeddings]
+    embed = stub_embed if args.embeddings == "stub" else OpenAIEmbedder(args.cache)
+
+    start = time.perf_counter()
+    query_vecs = embed([item["question"] for item in fixtures])
+    embed_ms = (time.perf_counter() - start) * 1000 / len(fixtures)
+
+    results = []
+    for chunk_tokens in args.chunk_sizes:
+        chunks = load_corpus(chunk_tokens, include_kb=not args.no_kb)
+        for chunk in chunks:
+            chunk["tokens"] = count_tokens(chunk["content"])
+        matrix = embed([c["content"] for c in chunks])
+        baseline = CompactIndex(matrix, EMBED_DIM)
+        for threshold, count in product(thresholds, args.counts):
+            _, reference = evaluate(fixtures, chunks, lambda q, t, k: baseline.search(q, t, k, args.rescore), query_vecs, threshold, count)
+            for dims, quantization, select in product(args.dims, args.quantization, [False, True] if args.select else [False]):
+                index = CompactIndex(matrix, dims, quantization)
+                if select:
+                    search = lambda q, t, k: select_hits(index, chunks, q, t, k, args.rescore, args.candidates)
+                else:
+                    search = lambda q, t, k: index.search(q, t, k, args.rescore)
+                metrics, _ = evaluate(fixtures, chunks, search, query_vecs, threshold, count, reference)
+                metrics.update({"chunk_tokens": chunk_tokens, "threshold": threshold, "match_count": count, "chunks": len(chunks),
+                                "dims": dims, "quantization": quantization, "bytes_per_vector": index.bytes_per_vector, "select": select})
+                results.append(metrics)
+
+    print(f"{len(fixtures)} questions | embeddings={args.embeddings} | query embed {embed_ms:.2f} ms/query\n")
+    print(f"{'chunk':>6} {'thresh':>7} {'k':>3} {'chunks':>7} {'dims':>5} {'quant':>6} {'B/vec':>6} {'select':>6} "
+          f"{'recall@k':>9} {'MRR':>6} {'overlap':>8} {'ctx tok':>8} {'search ms':>10} {'p95 ms':>7}")
+    for r in results:
+        print(f"{r['chunk_tokens']:>6} {r['threshold']:>7.2f} {r['match_count']:>3} {r['chunks']:>7} "
+              f"{r['dims']:>5} {r['quantization']:>6} {r['bytes_per_vector']:>6} {('mmr' if r['select'] else '-'):>6} "
+              f"{r['recall']:>9.3f} {r['mrr']:>6.3f} {r['overlap']:>8.3f} {r['ctx_tokens']:>8.0f} {r['search_ms']:>10.3f} {r['search_p95_ms']:>7.3f}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"embeddings": args.embeddings, "query_embed_ms": embed_ms, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,17 +12,26 @@ load_dotenv(dotenv_path="../.env.local")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Must match the serving path (settings.EMBEDDING_DIMENSIONS) and the vector(N) column
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("Error: SUPABASE_URL or SUPABASE_KEY not set.")
-    exit(1)
+supabase: Client = None
+openai_client: OpenAI = None
 
-if not OPENAI_API_KEY:
-    print("Error: OPENAI_API_KEY not set.")
-    exit(1)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+def init_clients():
+    """Create the Supabase/OpenAI clients (kept out of import so chunking can be reused offline)."""
+    global supabase, openai_client
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("Error: SUPABASE_URL or SUPABASE_KEY not set.")
+        exit(1)
+
+    if not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY not set.")
+        exit(1)
+
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 # Robust pathing: Get directory of this script, then go up one level to 'documents'
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -30,7 +39,8 @@ DOCS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../documents"))
 
 def get_embedding(text: str, model="text-embedding-3-small"):
     text = text.replace("\n", " ")
-    return openai_client.embeddings.create(input=[text], model=model).data[0].embedding
+    kwargs = {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS < 1536 else {}
+    return openai_client.embeddings.create(input=[text], model=model, **kwargs).data[0].embedding
 
 def chunk_text(text: str, max_tokens=800):
     tokenizer = tiktoken.get_encoding("cl100k_base")
@@ -43,6 +53,16 @@ def chunk_text(text: str, max_tokens=800):
         chunks.append(chunk_text)
     return chunks
 
+def read_document(file_path: str) -> str:
+    """Plain text of a .docx or text/markdown file."""
+    if file_path.lower().endswith(".docx"):
+        import docx
+        doc = docx.Document(file_path)
+        return "\n".join([para.text for para in doc.paragraphs])
+    # Assume text/md
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
 def ingest_files():
     print(f"Scanning {DOCS_DIR}...")
     files = glob.glob(os.path.join(DOCS_DIR, "*.*"))
@@ -56,19 +76,11 @@ def ingest_files():
         print(f"Processing {filename}...")
         
         try:
-            content = ""
-            if filename.lower().endswith(".docx"):
-                try:
-                    import docx
-                    doc = docx.Document(file_path)
-                    content = "\n".join([para.text for para in doc.paragraphs])
-                except ImportError:
-                    print("  -> Error: python-docx not installed. Skipping .docx file.")
-                    continue
-            else:
-                # Assume text/md
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+            try:
+                content = read_document(file_path)
+            except ImportError:
+                print("  -> Error: python-docx not installed. Skipping .docx file.")
+                continue
             
             if not content.strip():
                 print(f"  -> Warning: Empty content in {filename}. Skipping.")
@@ -95,4 +107,5 @@ def ingest_files():
             print(f"  -> Error processing {filename}: {e}")
 
 if __name__ == "__main__":
+    init_clients()
     ingest_files()
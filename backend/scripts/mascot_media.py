@@ -0,0 +1,445 @@
+"""
+Mascot media CLI - one entry point for the chatbot mascot background-removal tools.
+
+    python scripts/mascot_media.py video INPUT OUTPUT [--width 256] [--frames-dir DIR] [--temporal]
+    python scripts/mascot_media.py image INPUT OUTPUT [--cleanup checker|hsv|none]
+    python scripts/mascot_media.py frame INPUT OUTPUT --index 30 [--remove-bg] [--cleanup hsv]
+    python scripts/mascot_media.py renditions INPUT OUT_DIR [--widths 128 256 512]
+
+All subcommands share one cached rembg/ONNX session per model (--model),
+read single frames by seeking instead of decoding from the start, and
+`video --frames-dir` resumes by skipping frames already written there.
+
+`--backend tuned` swaps rembg's default session for rembg_tuned.TunedSession:
+explicit ONNX Runtime threads (--threads, --inter-threads, --no-spin), graph
+optimizations, --batch frames per inference call in `video`, and --int8 for a
+quantized model calibrated on frames of INPUT. Compare the two with
+scripts/bench_rembg.py.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Sibling helpers: importable whether run as a file or with python -m scripts.mascot_media
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rembg_tuned import OPTIMIZATION_LEVELS, TunedSession, cutout
+from temporal_mask import TemporalMasker
+
+# Icon cleanup lives next to the chatbot module's asset scripts
+ICON_SCRIPTS_DIR = Path(__file__).resolve().parents[1] / "src" / "modules" / "veda_chatbot" / "scripts"
+
+MODELS = ["u2net", "u2netp", "u2net_human_seg", "isnet-general-use", "silueta"]
+
+# Conservative settings that keep the whole character (see frontend/scripts/remove_bg_video.py)
+ALPHA_MATTING_KWARGS = dict(
+    alpha_matting=True,
+    alpha_matting_foreground_threshold=270,
+    alpha_matting_background_threshold=5,
+    alpha_matting_erode_size=3,
+)
+
+
+CALIBRATION_FRAMES = 16
+
+
+class InferenceOptions(NamedTuple):
+    backend: str = "rembg"
+    threads: Optional[int] = None
+    inter_threads: int = 1
+    optimization: str = "all"
+    spin: bool = True
+    batch: int = 1
+    int8: bool = False
+    calibration_source: Optional[str] = None  # Image or video whose frames calibrate the int8 model
+    width: Optional[int] = None
+
+
+DEFAULT_INFERENCE = InferenceOptions()
+
+
+def inference_options(args) -> InferenceOptions:
+    return InferenceOptions(args.backend, args.threads, args.inter_threads, args.optimization, not args.no_spin,
+                            args.batch, args.int8, args.input, args.width)
+
+
+# --- Shared helpers ---
+
+@lru_cache(maxsize=None)
+def get_session(model: str = "u2net", options: InferenceOptions = DEFAULT_INFERENCE):
+    """Create the ONNX session once per model and inference options and reuse it."""
+    print(f"[{time.strftime('%X')}] Loading rembg model '{model}' ({options.backend} backend)...")
+    if options.backend == "tuned":
+        calibration = sample_frames(options.calibration_source, CALIBRATION_FRAMES, options.width) if options.int8 else []
+        return TunedSession(model, options.threads, options.inter_threads, options.optimization, options.spin,
+                            options.batch, options.int8, calibration)
+    from rembg import new_session
+    return new_session(model)
+
+
+def remove_background(image_rgb: np.ndarray, model: str = "u2net", alpha_matting: bool = False,
+                      options: InferenceOptions = DEFAULT_INFERENCE) -> np.ndarray:
+    """RGB array -> RGBA array using the cached session."""
+    from rembg import remove
+    kwargs = ALPHA_MATTING_KWARGS if alpha_matting else {}
+    return np.asarray(remove(image_rgb, session=get_session(model, options), **kwargs))
+
+
+def remove_background_batch(images_rgb: List[np.ndarray], model: str, options: InferenceOptions) -> List[np.ndarray]:
+    """Several frames per inference call on the tuned backend; one rembg call per frame otherwise."""
+    session = get_session(model, options)
+    if not isinstance(session, TunedSession):
+        return [remove_background(image, model, options=options) for image in images_rgb]
+    return [cutout(image, alpha) for image, alpha in zip(images_rgb, session.predict_batch(images_rgb))]
+
+
+def resize_to_width(image: np.ndarray, width: Optional[int]) -> np.ndarray:
+    if not width or image.shape[1] == width:
+        return image
+    height = int(round(image.shape[0] * width / image.shape[1]))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def open_video(path: str) -> cv2.VideoCapture:
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    return cap
+
+
+def read_frame(path: str, index: int) -> np.ndarray:
+    """Seek straight to one frame instead of decoding everything before it."""
+    cap = open_video(path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok:
+        raise ValueError(f"Could not read frame {index} from {path}")
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def sample_frames(path: str, count: int, width: Optional[int] = None) -> List[np.ndarray]:
+    """`count` evenly spaced RGB frames of a video (or the image itself), resized like the frames processed."""
+    if os.path.splitext(path)[1].lower() in (".png", ".jpg", ".jpeg", ".webp", ".bmp"):
+        return [resize_to_width(np.asarray(Image.open(path).convert("RGB")), width)]
+    cap = open_video(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    indices = sorted({int(i) for i in np.linspace(0, max(total - 1, 0), num=min(count, max(total, 1)))})
+    return [resize_to_width(read_frame(path, i), width) for i in indices]
+
+
+def cleanup_hsv(rgba: np.ndarray) -> np.ndarray:
+    """Make low-saturation, mid-brightness checkerboard pixels transparent (extract_clean_mascot)."""
+    hsv = cv2.cvtColor(np.ascontiguousarray(rgba[:, :, :3]), cv2.COLOR_RGB2HSV)
+    sat = hsv[:, :, 1]
+    val = hsv[:, :, 2]
+    checker_gray = (sat < 30) & (val > 50) & (val < 250)
+    subject_mask = (sat > 40) | (val > 252) | (val < 10)
+
+    result = rgba.copy()
+    alpha = result[:, :, 3]
+    alpha[checker_gray & ~subject_mask] = 0
+    kernel = np.ones((2, 2), np.uint8)
+    alpha = cv2.dilate(cv2.erode(alpha, kernel, iterations=1), kernel, iterations=1)
+    result[:, :, 3] = alpha
+    return result
+
+
+def cleanup_checker(image_rgb: np.ndarray, model: str = "u2net", options: InferenceOptions = DEFAULT_INFERENCE) -> np.ndarray:
+    """Green-screen checkerboard cleanup from process_chatbot_icon (runs rembg itself)."""
+    sys.path.insert(0, str(ICON_SCRIPTS_DIR))
+    from process_chatbot_icon import clean_checker
+    return clean_checker(image_rgb, session=get_session(model, options))
+
+
+def save_rgba(rgba: np.ndarray, output_path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    Image.fromarray(rgba, "RGBA").save(output_path, optimize=True)
+    print(f"Saved {output_path} ({rgba.shape[1]}x{rgba.shape[0]})")
+
+
+def isolate(image_rgb: np.ndarray, args) -> np.ndarray:
+    options = inference_options(args)
+    if args.cleanup == "checker":
+        return cleanup_checker(image_rgb, args.model, options)
+    rgba = remove_background(image_rgb, args.model, args.alpha_matting, options)
+    if args.cleanup == "hsv":
+        rgba = cleanup_hsv(rgba)
+    return rgba
+
+
+# --- Subcommands ---
+
+def cmd_image(args):
+    image = np.asarray(Image.open(args.input).convert("RGB"))
+    save_rgba(isolate(resize_to_width(image, args.width), args), args.output)
+
+
+def cmd_frame(args):
+    frame = resize_to_width(read_frame(args.input, args.index), args.width)
+    if args.remove_bg:
+        save_rgba(isolate(frame, args), args.output)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        Image.fromarray(frame).save(args.output)
+        print(f"Saved frame {args.index} to {args.output}")
+
+
+def _encode(frames_dir: Path, fps: float, output_path: str):
+    cmd = [
+        "ffmpeg", "-y",
+        "-framerate", str(fps),
+        "-i", str(frames_dir / "frame_%06d.png"),
+        "-c:v", "libvpx-vp9",
+        "-pix_fmt", "yuva420p",
+        "-b:v", "3M",
+        "-auto-alt-ref", "0",
+        "-an",
+        output_path,
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    print(f"✓ Output saved to: {output_path}")
+
+
+def cmd_video(args):
+    cap = open_video(args.input)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    temp_dir = None
+    if args.frames_dir:
+        frames_dir = Path(args.frames_dir)
+        frames_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        temp_dir = Path(tempfile.mkdtemp())
+        frames_dir = temp_dir
+
+    def frame_path(i: int) -> Path:
+        return frames_dir / f"frame_{i:06d}.png"
+
+    def save_frame(rgba: np.ndarray, path: Path):
+        # Written under a temporary name and renamed, so a killed run never leaves a
+        # truncated frame_*.png that resume would take as done
+        partial = path.with_name(path.name + ".part")
+        Image.fromarray(rgba, "RGBA").save(partial, format="PNG")
+        os.replace(partial, path)
+
+    # Resume: seek past the leading run of frames that are already done
+    start_idx = 0
+    while start_idx < frame_count and frame_path(start_idx).exists():
+        start_idx += 1
+    if start_idx:
+        print(f"Resuming at frame {start_idx}/{frame_count} ({frames_dir})")
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_idx)
+
+    options = inference_options(args)
+    masker = None
+    if args.temporal:
+        masker = TemporalMasker(lambda rgb: remove_background(rgb, args.model, args.alpha_matting, options)[:, :, 3], smoothing=0.3)
+    # Batching needs every frame to be inferred (no temporal reuse) and no per-frame matting
+    batch_size = options.batch if options.backend == "tuned" and not masker and not args.alpha_matting else 1
+    batch = []  # (output path, RGB frame)
+
+    def flush():
+        rgbas = remove_background_batch([rgb for _, rgb in batch], args.model, options) if batch_size > 1 else \
+            [remove_background(rgb, args.model, args.alpha_matting, options) for _, rgb in batch]
+        for (out_path, _), rgba in zip(batch, rgbas):
+            save_frame(rgba, out_path)
+        batch.clear()
+
+    started = time.perf_counter()
+    processed = 0
+    idx = start_idx
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            out = frame_path(idx)
+            # Gaps after the resume point are filled; finished frames are skipped
+            if not out.exists():
+                rgb = resize_to_width(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), args.width)
+                if masker:
+                    save_frame(np.dstack([rgb, masker.process(rgb)]), out)
+                else:
+                    batch.append((out, rgb))
+                    if len(batch) >= batch_size:
+                        flush()
+                processed += 1
+            idx += 1
+            if idx % 50 == 0:
+                print(f"[{time.strftime('%X')}] Frame {idx}/{frame_count}")
+        flush()
+    finally:
+        cap.release()
+
+    elapsed = time.perf_counter() - started
+    print(f"Processed {processed} new frames in {elapsed:.1f}s")
+    if masker:
+        print(masker.report(elapsed))
+
+    if shutil.which("ffmpeg"):
+        _encode(frames_dir, fps, args.output)
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+    else:
+        print(f"FFmpeg not found; frames left in {frames_dir}")
+
+
+# --- Renditions ---
+
+RENDITION_WIDTHS = [128, 256, 512]
+BASE_BITRATE_KBPS = 3000   # What the full-size 1024px asset was encoded with
+BASE_WIDTH = 1024
+MIN_BITRATE_KBPS = 150
+
+
+def _bitrate_for(width: int) -> int:
+    """Scale the VP9 bitrate with pixel area, with a floor for tiny renditions."""
+    return max(MIN_BITRATE_KBPS, int(BASE_BITRATE_KBPS * (width / BASE_WIDTH) ** 2))
+
+
+def _decoder_args(input_path: str):
+    # The native VP9 decoder drops alpha; libvpx keeps it
+    return ["-c:v", "libvpx-vp9"] if input_path.lower().endswith(".webm") else []
+
+
+def rendition_jobs(input_path: str, out_dir: Path, widths, poster_time: float, anim_width: int, anim_fps: int):
+    """(file name, MIME type, width, ffmpeg command) for every rendition."""
+    stem = Path(input_path).stem
+    src = _decoder_args(input_path) + ["-i", input_path]
+    jobs = []
+    for width in widths:
+        name = f"{stem}-{width}w.webm"
+        cmd = ["ffmpeg", "-y", *src, "-vf", f"scale={width}:-2:flags=lanczos",
+               "-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-b:v", f"{_bitrate_for(width)}k",
+               "-auto-alt-ref", "0", "-an", "-row-mt", "1", str(out_dir / name)]
+        jobs.append((name, "video/webm", width, cmd))
+
+    poster_width = max(widths)
+    poster = ["ffmpeg", "-y", *_decoder_args(input_path), "-ss", str(poster_time), "-i", input_path,
+              "-frames:v", "1", "-vf", f"scale={poster_width}:-2:flags=lanczos"]
+    jobs.append((f"{stem}-poster.png", "image/png", poster_width,
+                 poster + [str(out_dir / f"{stem}-poster.png")]))
+    jobs.append((f"{stem}-poster.webp", "image/webp", poster_width,
+                 poster + ["-c:v", "libwebp", "-quality", "85", str(out_dir / f"{stem}-poster.webp")]))
+
+    anim_filter = f"fps={anim_fps},scale={anim_width}:-2:flags=lanczos"
+    jobs.append((f"{stem}-{anim_width}w.webp", "image/webp", anim_width,
+                 ["ffmpeg", "-y", *src, "-vf", anim_filter, "-c:v", "libwebp_anim", "-loop", "0",
+                  "-quality", "70", "-an", str(out_dir / f"{stem}-{anim_width}w.webp")]))
+    jobs.append((f"{stem}-{anim_width}w.apng", "image/apng", anim_width,
+                 ["ffmpeg", "-y", *src, "-vf", anim_filter, "-plays", "0", "-f", "apng",
+                  "-an", str(out_dir / f"{stem}-{anim_width}w.apng")]))
+    return jobs
+
+
+def cmd_renditions(args):
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("renditions requires FFmpeg on PATH")
+    out_dir = Path(args.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = rendition_jobs(args.input, out_dir, sorted(args.widths), args.poster_time, args.anim_width, args.anim_fps)
+
+    def _run(job):
+        name, _, _, cmd = job
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"✗ {name}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'ffmpeg failed'}")
+            return None
+        print(f"✓ {name} ({time.perf_counter() - start:.1f}s)")
+        return job
+
+    # Encodes are independent, so run them side by side
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs or os.cpu_count() or 2) as pool:
+        finished = [job for job in pool.map(_run, jobs) if job]
+
+    renditions = []
+    for name, mime, width, _ in finished:
+        renditions.append({
+            "file": name,
+            "type": mime,
+            "width": width,
+            "animated": "poster" not in name,
+            "bytes": (out_dir / name).stat().st_size,
+        })
+    renditions.sort(key=lambda r: (r["type"], r["width"], r["bytes"]))
+
+    manifest = {
+        "source": os.path.basename(args.input),
+        "source_bytes": os.path.getsize(args.input),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "renditions": renditions,
+    }
+    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{len(renditions)}/{len(jobs)} renditions in {time.perf_counter() - started:.1f}s -> {out_dir / 'manifest.json'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Chatbot mascot media tools")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("input")
+    common.add_argument("output")
+    common.add_argument("--model", default="u2net", choices=MODELS, help="rembg model (default: u2net)")
+    common.add_argument("--width", type=int, default=None, help="Resize to this width before processing")
+    common.add_argument("--alpha-matting", action="store_true", help="Use the conservative alpha-matting settings")
+    common.add_argument("--backend", choices=["rembg", "tuned"], default="rembg",
+                        help="rembg's default ONNX session, or rembg_tuned.TunedSession with the options below")
+    common.add_argument("--threads", type=int, default=None, help="tuned: intra-op threads (default: available cores)")
+    common.add_argument("--inter-threads", type=int, default=1, help="tuned: inter-op threads")
+    common.add_argument("--optimization", choices=OPTIMIZATION_LEVELS, default="all", help="tuned: graph optimization level")
+    common.add_argument("--no-spin", action="store_true", help="tuned: don't spin-wait (when other processes share the CPU)")
+    common.add_argument("--batch", type=int, default=4, help="tuned: frames per inference call in `video`")
+    common.add_argument("--int8", action="store_true", help="tuned: int8-quantized model, calibrated on frames of INPUT")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    video = sub.add_parser("video", parents=[common], help="Remove background from every frame and encode VP9 with alpha")
+    video.add_argument("--frames-dir", help="Keep per-frame PNGs here and resume from them on re-runs")
+    video.add_argument("--temporal", action="store_true", help="Reuse masks across near-identical frames")
+    video.set_defaults(func=cmd_video)
+
+    image = sub.add_parser("image", parents=[common], help="Isolate the mascot in a still image")
+    image.add_argument("--cleanup", choices=["none", "hsv", "checker"], default="none")
+    image.set_defaults(func=cmd_image)
+
+    frame = sub.add_parser("frame", parents=[common], help="Extract one frame (optionally isolated)")
+    frame.add_argument("--index", type=int, default=0)
+    frame.add_argument("--remove-bg", action="store_true")
+    frame.add_argument("--cleanup", choices=["none", "hsv", "checker"], default="none")
+    frame.set_defaults(func=cmd_frame)
+
+    renditions = sub.add_parser("renditions", help="Encode width/format renditions of a transparent clip plus a manifest")
+    renditions.add_argument("input", help="Transparent source video (e.g. chatbot-icon-transparent.webm)")
+    renditions.add_argument("output", help="Output directory")
+    renditions.add_argument("--widths", type=int, nargs="+", default=RENDITION_WIDTHS)
+    renditions.add_argument("--poster-time", type=float, default=0.0, help="Timestamp (s) of the poster frame")
+    renditions.add_argument("--anim-width", type=int, default=128, help="Width of the animated WebP/APNG fallbacks")
+    renditions.add_argument("--anim-fps", type=int, default=15)
+    renditions.add_argument("--jobs", type=int, default=None, help="Parallel encodes (default: CPU count)")
+    renditions.set_defaults(func=cmd_renditions)
+
+    return parser
+
+
+if __name__ == "__main__":
+    cli_args = build_parser().parse_args()
+    cli_args.func(cli_args)
@@ -1,14 +1,20 @@
 import os
+import sys
 import rembg
 import imageio
 import numpy as np
 import time
 import warnings
 
+# Sibling helper: importable whether run as a file or with python -m scripts.<name>
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from temporal_mask import TemporalMasker, rembg_alpha
+
 warnings.filterwarnings("ignore")
 
 INPUT_PATH = "src/assets/chatbot-icon.webm"
 OUTPUT_PATH = "src/assets/chatbot-icon-transparent.webm"
+TEMPORAL = "--temporal" in sys.argv  # Reuse masks across near-identical frames
 
 def process_video():
     print(f"[{time.strftime('%X')}] Script started.")
@@ -37,6 +43,9 @@ def process_video():
         # imageio-ffmpeg usually handles 'transparent' logic if input is RGBA.
         writer = imageio.get_writer(OUTPUT_PATH, fps=fps, codec='libvpx-vp9', pixelformat='yuva420p')
 
+        masker = TemporalMasker(rembg_alpha(session), smoothing=0.3) if TEMPORAL else None
+        started = time.perf_counter()
+
         count = 0
         for frame in reader:
             count += 1
@@ -45,7 +54,11 @@ def process_video():
             
             # frame is numpy array (H, W, 3) or (H, W, 4)
             # rembg output is (H, W, 4)
-            output = rembg.remove(frame, session=session)
+            if masker:
+                rgb = frame[:, :, :3]
+                output = np.dstack([rgb, masker.process(rgb)])
+            else:
+                output = rembg.remove(frame, session=session)
             
             writer.append_data(output)
             
@@ -54,6 +67,8 @@ def process_video():
                 print(f"[{time.strftime('%X')}] Processed {count} frames...")
 
         writer.close()
+        if masker:
+            print(masker.report(time.perf_counter() - started))
         print(f"[{time.strftime('%X')}] Done. Saved to {OUTPUT_PATH}")
 
     except Exception as e:
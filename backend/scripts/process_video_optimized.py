@@ -1,4 +1,5 @@
 import os
+import sys
 import rembg
 import imageio
 import numpy as np
@@ -6,10 +7,15 @@ import time
 import warnings
 from PIL import Image
 
+# Sibling helper: importable whether run as a file or with python -m scripts.<name>
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from temporal_mask import TemporalMasker, rembg_alpha
+
 warnings.filterwarnings("ignore")
 
 INPUT_PATH = "src/assets/chatbot-icon.webm"
 OUTPUT_PATH = "src/assets/chatbot-icon-transparent.webm"
+TEMPORAL = "--temporal" in sys.argv  # Reuse masks across near-identical frames
 TARGET_WIDTH = 256 # Optimization: Resize to meaningful size
 
 def process_video():
@@ -35,6 +41,9 @@ def process_video():
         
         writer = imageio.get_writer(OUTPUT_PATH, fps=fps, codec='libvpx-vp9', pixelformat='yuva420p')
 
+        masker = TemporalMasker(rembg_alpha(session), smoothing=0.3) if TEMPORAL else None
+        started = time.perf_counter()
+
         count = 0
         for frame in reader:
             count += 1
@@ -51,7 +60,10 @@ def process_video():
             frame_resized = np.array(img_resized)
             
             # Remove background from resized frame (much faster!)
-            output = rembg.remove(frame_resized, session=session)
+            if masker:
+                output = np.dstack([frame_resized, masker.process(frame_resized)])
+            else:
+                output = rembg.remove(frame_resized, session=session)
             
             writer.append_data(output)
             
@@ -59,6 +71,8 @@ def process_video():
             # At 256px, it should take ~0.1s per frame -> ~2.5 mins total.
 
         writer.close()
+        if masker:
+            print(masker.report(time.perf_counter() - started))
         print(f"[{time.strftime('%X')}] Done. Saved to {OUTPUT_PATH}")
 
     except Exception as e:
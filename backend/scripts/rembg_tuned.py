@@ -0,0 +1,238 @@
+"""
+Tuned CPU inference for rembg models.
+
+rembg.new_session() builds its ONNX Runtime session with default options. Thread
+counts then depend on ORT's own guess, which on shared build boxes either leaves
+cores idle or oversubscribes them when several workers run side by side. Each
+session also runs one image per call. TunedSession loads the same model files
+with explicit settings:
+  - intra-op / inter-op thread counts, graph optimization level and spin-waiting
+    (turn spinning off when several processes share the CPU)
+  - a copy of the model with a dynamic batch axis, so several resized frames run
+    in one call (predict_batch)
+  - optionally an int8 copy (static QDQ quantization, per-channel weights),
+    calibrated on frames of the clip being processed and keyed by a hash of them
+It implements rembg's session interface (predict), so rembg.remove(...,
+session=TunedSession(...)), alpha matting and TemporalMasker work unchanged.
+Pre/post-processing mirror rembg's U2net/IS-Net sessions, so masks match up to
+numerical noise and quantization error (see scripts/bench_rembg.py).
+
+Needs rembg (model download), onnxruntime and, to build the batch/int8 copies, onnx.
+"""
+import hashlib
+import os
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Per-model input normalization and size, as in rembg.sessions (mean, std, square input size)
+PREPROCESS = {
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "u2netp": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "u2net_human_seg": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "silueta": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), 1024),
+}
+OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+
+def available_cores() -> int:
+    """CPUs this process may run on (respects container CPU sets, unlike os.cpu_count())."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def session_options(threads: Optional[int] = None, inter_threads: int = 1, optimization: str = "all", spin: bool = True):
+    if ort is None:
+        raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads or available_cores()
+    opts.inter_op_num_threads = inter_threads
+    # Parallel execution only pays off with inter-op threads to run independent branches on
+    opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL if inter_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[optimization]
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "1" if spin else "0")
+    return opts
+
+
+# --- Model files ---
+
+def model_path(model: str) -> str:
+    """rembg's ONNX file for `model` (downloaded into U2NET_HOME on first use, as rembg does)."""
+    from rembg.sessions import sessions_class
+    for session_class in sessions_class:
+        if session_class.name() == model:
+            return str(session_class.download_models())
+    raise ValueError(f"Unknown rembg model: {model}")
+
+
+def _with_dynamic_batch(src: str, dst: str):
+    import onnx
+    graph_model = onnx.load(src)
+    for value in list(graph_model.graph.input) + list(graph_model.graph.output):
+        dim = value.type.tensor_type.shape.dim[0]
+        dim.ClearField("dim_value")
+        dim.dim_param = "batch"
+    del graph_model.graph.value_info[:]  # Stale batch-1 intermediate shapes; ORT re-infers them
+    onnx.save(graph_model, dst)
+
+
+def _quantize(src: str, dst: str, input_name: str, calibration: Sequence[np.ndarray]):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(calibration)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    prepared = dst + ".pre.onnx"  # dst is a temp path, so this one is unique too
+    # Folds constants and infers shapes so more nodes quantize (ONNX/ORT inference; no sympy needed)
+    quant_pre_process(src, prepared, skip_symbolic_shape=True)
+    try:
+        quantize_static(
+            prepared, dst, FrameReader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            activation_type=QuantType.QUInt8,
+        )
+    finally:
+        os.remove(prepared)
+
+
+def _build(path: str, write):
+    """Run write(tmp) and move the result into place, so a crash or a concurrent build never leaves a torn model."""
+    tmp = f"{path[:-len('.onnx')]}.{os.getpid()}.tmp.onnx"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def prepare_model(model: str, quantize: bool = False, calibration_images: Sequence[np.ndarray] = ()) -> str:
+    """
+    Path of the batchable (and optionally int8) copy of `model`, built next to rembg's file
+    on first use. The int8 copy is named after a hash of the preprocessed calibration frames,
+    so each set of frames gets its own calibration and the same frames reuse it.
+    """
+    base = model_path(model)
+    batched = base[:-len(".onnx")] + ".batch.onnx"
+    if not os.path.exists(batched):
+        print(f"[{time.strftime('%X')}] Writing {os.path.basename(batched)} (dynamic batch axis)...")
+        _build(batched, lambda tmp: _with_dynamic_batch(base, tmp))
+    if not quantize:
+        return batched
+
+    if not len(calibration_images):
+        raise ValueError("int8 quantization needs calibration images (frames of the clip being processed)")
+    mean, std, size = PREPROCESS[model]
+    calibration = [preprocess([image], mean, std, size) for image in calibration_images]
+    digest = hashlib.sha256()
+    for batch in calibration:
+        digest.update(batch.tobytes())
+    quantized = f"{base[:-len('.onnx')]}.batch.int8.{digest.hexdigest()[:12]}.onnx"
+    if os.path.exists(quantized):
+        print(f"[{time.strftime('%X')}] Reusing {os.path.basename(quantized)} (calibrated on these {len(calibration)} frames)")
+        return quantized
+    print(f"[{time.strftime('%X')}] Quantizing {model} to int8 on {len(calibration)} calibration frames...")
+    input_name = ort.InferenceSession(batched, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    _build(quantized, lambda tmp: _quantize(batched, tmp, input_name, calibration))
+    return quantized
+
+
+# --- Inference ---
+
+def preprocess(images: Sequence[np.ndarray], mean, std, size: int) -> np.ndarray:
+    """RGB uint8 images -> NCHW float32 batch, the way rembg's normalize() prepares one image."""
+    batch = np.empty((len(images), 3, size, size), np.float32)
+    mean, std = np.asarray(mean, np.float32), np.asarray(std, np.float32)
+    for i, image in enumerate(images):
+        resized = np.asarray(Image.fromarray(image).convert("RGB").resize((size, size), Image.Resampling.LANCZOS), np.float32)
+        resized /= max(float(resized.max()), 1.0)  # rembg scales by the image's maximum, not by 255
+        batch[i] = ((resized - mean) / std).transpose(2, 0, 1)
+    return batch
+
+
+def cutout(image_rgb: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """RGBA like rembg's naive_cutout (composite over transparent black)."""
+    image = Image.fromarray(image_rgb).convert("RGBA")
+    empty = Image.new("RGBA", image.size, 0)
+    return np.asarray(Image.composite(image, empty, Image.fromarray(alpha, "L")))
+
+
+class TunedSession:
+    def __init__(
+        self,
+        model: str = "u2net",
+        threads: Optional[int] = None,
+        inter_threads: int = 1,
+        optimization: str = "all",
+        spin: bool = True,
+        batch_size: int = 4,
+        quantize: bool = False,
+        calibration_images: Sequence[np.ndarray] = (),
+    ):
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+        if model not in PREPROCESS:
+            raise ValueError(f"TunedSession supports {', '.join(PREPROCESS)}; use rembg.new_session for {model}")
+        self.model_name = model
+        self.mean, self.std, self.size = PREPROCESS[model]
+        self.path = prepare_model(model, quantize, calibration_images)
+        self.inner_session = ort.InferenceSession(
+            self.path, sess_options=session_options(threads, inter_threads, optimization, spin), providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.inner_session.get_inputs()[0].name
+        self.batch_size = max(1, batch_size)
+        opts = self.inner_session.get_session_options()
+        print(f"[{time.strftime('%X')}] Loaded {os.path.basename(self.path)} "
+              f"(intra-op {opts.intra_op_num_threads}, inter-op {opts.inter_op_num_threads}, batch {self.batch_size})")
+
+    def predict_batch(self, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """uint8 alpha masks (original sizes) for RGB images, batch_size frames per inference call."""
+        masks = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            pred = self._run(chunk)
+            for p, image in zip(pred, chunk):
+                lo, hi = float(p.min()), float(p.max())
+                p = (p - lo) / (hi - lo) if hi > lo else np.zeros_like(p)
+                mask = Image.fromarray((p.clip(0, 1) * 255).astype(np.uint8), "L")
+                masks.append(np.asarray(mask.resize((image.shape[1], image.shape[0]), Image.Resampling.LANCZOS)))
+        return masks
+
+    def _run(self, chunk: Sequence[np.ndarray]) -> np.ndarray:
+        batch = preprocess(chunk, self.mean, self.std, self.size)
+        try:
+            return self.inner_session.run(None, {self.input_name: batch})[0][:, 0]
+        except Exception as e:
+            if len(chunk) == 1:
+                raise
+            # A graph with a hard-coded batch-1 shape somewhere: fall back to one frame per call
+            print(f"Batched inference failed ({type(e).__name__}: {e}); continuing with batch size 1.")
+            self.batch_size = 1
+            return np.concatenate([self.inner_session.run(None, {self.input_name: batch[i:i + 1]})[0][:, 0] for i in range(len(chunk))])
+
+    def predict(self, img: Image.Image, *args, **kwargs) -> List[Image.Image]:
+        """rembg session interface: one PIL image -> [mask]."""
+        return [Image.fromarray(self.predict_batch([np.asarray(img.convert("RGB"))])[0], "L")]
@@ -0,0 +1,602 @@
+"""
+Production traffic capture and replay.
+
+Synthetic load tests never reproduce the real mix of greetings, chip clicks,
+regenerates and long RAG questions. This tool replays real traffic instead:
+
+  export   reads user turns from chat_messages (list_chat_messages RPC) and
+           chat_sessions into an anonymized JSONL file: session/user ids become
+           salted pseudonyms, and emails, URLs, phone numbers and long digit runs
+           are masked. Each turn keeps its arrival offset, whether it was a chip click
+           or a regenerate, and the recorded source/latency as a production baseline.
+  stub     runs fake upstreams on one port: OpenAI (/v1/embeddings and streamed
+           /v1/chat/completions) and Supabase PostgREST (/rest/v1/...), with
+           configurable latency. The stub records logged interactions, so the source
+           of every replayed turn is known without touching a real database.
+  replay   starts a stub and `uvicorn main:app` from --app-dir (a checkout of the
+           build under test; defaults to this backend), then sends the turns to
+           /api/v1/chat with the original inter-arrival times divided by --speed.
+           Turns of one session are sent in order, with history rebuilt from the
+           replayed answers, the way the frontend sends the last 5 messages.
+  compare  puts two replay runs side by side: latency (total / first content)
+           overall and per source, source distribution, error rate and upstream
+           calls per turn.
+
+Run from the backend directory:
+    python -m scripts.replay_traffic export traffic.jsonl --since 2026-10-01
+    git worktree add /tmp/base main
+    python -m scripts.replay_traffic replay traffic.jsonl base.json --app-dir /tmp/base/backend --speed 10
+    python -m scripts.replay_traffic replay traffic.jsonl head.json --speed 10
+    python -m scripts.replay_traffic compare base.json head.json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import socket
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+HISTORY_MESSAGES = 5  # useChat.ts sends messages.slice(-5)
+STUB_SUPABASE_KEY = "stub.stub.stub"  # supabase-py only checks that the key looks like a JWT
+CHUNK_WORDS = 120  # Words per stub document chunk
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRUBBERS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+"), "<email>"),
+    (re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<phone>"),
+    (re.compile(r"\d{5,}"), "<number>"),
+]
+
+
+def scrub(text: str) -> str:
+    """Masks contact details and identifiers. Free-text names are not detected."""
+    for pattern, placeholder in _SCRUBBERS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def pseudonym(salt: bytes, value: str) -> str:
+    """Stable per export, not reversible without the salt. Still a UUID, so it fits the uuid columns."""
+    digest = hmac.new(salt, value.encode("utf-8"), hashlib.sha256).digest()
+    return str(uuid.UUID(bytes=digest[:16], version=4))
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().strip(" ?.!").split())
+
+
+def pct(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+# --- export ---
+
+def export_traffic(args):
+    from src.core.database import get_supabase
+    from src.modules.veda_chatbot.history import MAX_PAGE_SIZE, HistoryService
+
+    if get_supabase() is None:
+        raise SystemExit("SUPABASE_URL / SUPABASE_KEY not set.")
+    salt = args.salt.encode("utf-8") if args.salt else os.urandom(16)
+
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    cursor, fetched = None, 0
+    while True:
+        page = HistoryService.list_messages(cursor=cursor, limit=MAX_PAGE_SIZE, since=args.since, until=args.until, include_recommendations=True)
+        for row in page["messages"]:
+            if row["role"] in ("user", "assistant"):
+                sessions.setdefault(row["session_id"], []).append(row)
+        fetched += len(page["messages"])
+        cursor = page["next_cursor"]
+        if cursor is None or (args.max_sessions and len(sessions) > args.max_sessions):
+            break
+    if args.max_sessions:
+        sessions = dict(list(sessions.items())[:args.max_sessions])
+
+    users: Dict[str, str] = {}
+    supabase = get_supabase()
+    ids = list(sessions)
+    for start in range(0, len(ids), 100):
+        rows = supabase.table("chat_sessions").select("id,user_id").in_("id", ids[start:start + 100]).execute().data or []
+        users.update((row["id"], row["user_id"]) for row in rows if row.get("user_id"))
+
+    turns = []
+    for session_id, rows in sessions.items():
+        previous_user, previous_recs = None, set()
+        for i, row in enumerate(rows):
+            if row["role"] != "user":
+                continue
+            reply = rows[i + 1] if i + 1 < len(rows) and rows[i + 1]["role"] == "assistant" else {}
+            latency_ms = reply.get("latency_ms") or 0.0
+            # Rows are written after the answer finished: arrival = logged time - turn latency
+            arrived = datetime.fromisoformat(row["created_at"]).timestamp() - latency_ms / 1000
+            normalized = _normalize(row["content"])
+            # The frontend resends the same question (without a new user bubble) to regenerate
+            regenerate = normalized == previous_user
+            kind = "regenerate" if regenerate else "chip" if normalized in previous_recs else "typed"
+            turns.append({
+                "session": pseudonym(salt, session_id),
+                "user": pseudonym(salt, f"user:{users[session_id]}") if session_id in users else None,
+                "arrived": arrived,
+                "message": row["content"] if kind == "chip" else scrub(row["content"]),
+                "regenerate": regenerate,
+                "kind": kind,
+                "recorded": {"source": reply.get("source"), "latency_ms": reply.get("latency_ms")},
+            })
+            previous_user = normalized
+            previous_recs = {_normalize(r) for r in reply.get("recommendations") or []}
+
+    turns.sort(key=lambda t: t["arrived"])
+    t0 = turns[0]["arrived"] if turns else 0.0
+    with open(args.output, "w", encoding="utf-8") as f:
+        for n, turn in enumerate(turns):
+            turn["turn"] = n
+            turn["offset_ms"] = round((turn.pop("arrived") - t0) * 1000, 1)
+            f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+    kinds: Dict[str, int] = {}
+    for turn in turns:
+        kinds[turn["kind"]] = kinds.get(turn["kind"], 0) + 1
+    span = turns[-1]["offset_ms"] / 1000 if turns else 0
+    print(f"Exported {len(turns)} turns from {len(sessions)} sessions ({fetched} rows, {span:.0f}s span) to {args.output}: {kinds}")
+
+
+# --- stub upstreams ---
+
+def build_stub_app(args):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    rng = random.Random(args.seed)
+    calls: Dict[str, int] = {}
+    interactions: List[Dict[str, Any]] = []
+    words = ("LeadQ helps teams find verified contacts, enrich leads and sync them to the CRM "
+             "with credits plans exports filters integrations and support").split()
+
+    async def delay(ms: float):
+        if ms > 0:
+            await asyncio.sleep(max(0.0, rng.gauss(ms, ms * args.jitter)) / 1000)
+
+    def count(name: str):
+        calls[name] = calls.get(name, 0) + 1
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dims = body.get("dimensions") or 1536
+        count("openai.embeddings")
+        await delay(args.embed_ms)
+        data = []
+        for i, text in enumerate(inputs):
+            gen = random.Random(hashlib.sha256(str(text).encode("utf-8")).digest())
+            vector = [gen.gauss(0, 1) for _ in range(dims)]
+            norm = sum(v * v for v in vector) ** 0.5
+            vector = [v / norm for v in vector]
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{dims}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(str(t)) // 4 + 1 for t in inputs)
+        return {"object": "list", "data": data, "model": body.get("model", "stub"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        count("openai.chat")
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 4 for m in body.get("messages", []))
+        answer = [("" if i == 0 else " ") + rng.choice(words) for i in range(args.answer_tokens)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer), "total_tokens": prompt_tokens + len(answer)}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            await delay(args.first_token_ms + args.token_ms * len(answer))
+            return {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "".join(answer)}}]}
+
+        def chunk(choices, extra=None):
+            return f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': choices, **(extra or {})})}\n\n"
+
+        async def stream():
+            await delay(args.first_token_ms)
+            for token in answer:
+                yield chunk([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                await delay(args.token_ms)
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk([], {"usage": usage})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def rpc(name: str, request: Request):
+        params = await request.json()
+        count(f"supabase.rpc.{name}")
+        await delay(args.rpc_ms)
+        if not name.startswith("match_documents"):
+            return []
+        n = int(params.get("match_count") or 4)
+        seed = hashlib.sha256(json.dumps(params.get("query_embedding"))[:200].encode("utf-8")).digest()
+        gen = random.Random(seed)
+        rows = []
+        for i in range(n):
+            source = f"{gen.choice(['pricing', 'integrations', 'credits', 'exports', 'onboarding'])}_guide.md"
+            content = " ".join(gen.choice(words) for _ in range(CHUNK_WORDS))
+            rows.append({"id": gen.randint(1, 10 ** 6), "content": f"{source}: {content}",
+                         "metadata": {"source": source}, "similarity": round(0.9 - i * 0.02, 3)})
+        return rows
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH", "DELETE"])
+    async def table(table: str, request: Request):
+        count(f"supabase.{request.method.lower()}.{table}")
+        await delay(args.rpc_ms)
+        if request.method != "POST":
+            return []
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        if table == "chat_messages":
+            # Keyed by the answer text: the replay client saw the same text, and log threads may interleave
+            for row in rows:
+                if row.get("role") == "assistant":
+                    meta = row.get("meta") or {}
+                    interactions.append({
+                        "session": row["session_id"], "answer": row.get("content", ""),
+                        "source": meta.get("source"), "truncated": bool(meta.get("truncated")),
+                    })
+        return JSONResponse(rows, status_code=201)
+
+    @app.get("/_stub/stats")
+    async def stats():
+        return {"calls": calls, "interactions": interactions}
+
+    return app
+
+
+def run_stub(args):
+    import uvicorn
+
+    print(f"Stub upstreams on http://127.0.0.1:{args.port} (OpenAI at /v1, Supabase at /rest/v1)")
+    uvicorn.run(build_stub_app(args), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- replay ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Process for {url} exited with code {proc.returncode}.")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} not ready after {timeout:.0f}s.")
+
+
+def _build_label(app_dir: str) -> str:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=app_dir, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or app_dir
+    except (OSError, subprocess.SubprocessError):
+        return app_dir
+
+
+def load_turns(path: str, limit: Optional[int], max_gap: Optional[float]) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        turns = [json.loads(line) for line in f if line.strip()]
+    turns.sort(key=lambda t: t["offset_ms"])
+    if limit:
+        turns = turns[:limit]
+    if max_gap is not None:
+        # Compress idle stretches (nights, weekends) without touching bursts
+        shifted, previous, removed = [], None, 0.0
+        for turn in turns:
+            if previous is not None:
+                removed += max(0.0, turn["offset_ms"] - previous - max_gap * 1000)
+            previous = turn["offset_ms"]
+            shifted.append({**turn, "offset_ms": turn["offset_ms"] - removed})
+        turns = shifted
+    return turns
+
+
+async def send_turn(client: httpx.AsyncClient, base_url: str, turn: Dict[str, Any], history: List[Dict[str, str]]) -> Dict[str, Any]:
+    payload = {"message": turn["message"], "sessionId": turn["session"], "user_id": turn.get("user"),
+               "regenerate": turn.get("regenerate", False), "history": history[-HISTORY_MESSAGES:]}
+    result = {"turn": turn["turn"], "session": turn["session"], "kind": turn.get("kind"),
+              "recorded_source": (turn.get("recorded") or {}).get("source"), "status": None, "error": None}
+    content, frames = [], 0
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", f"{base_url}/api/v1/chat", json=payload) as response:
+            result["status"] = response.status_code
+            result["trace_id"] = response.headers.get("x-trace-id")
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                frame = json.loads(line)
+                frames += 1
+                if frames == 1:
+                    result["first_frame_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if frame.get("type") == "content":
+                    if not content:
+                        result["first_content_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    content.append(frame.get("chunk", ""))
+                elif frame.get("type") == "recommendations":
+                    result["recommendations"] = len(frame.get("data") or [])
+                elif frame.get("type") == "error":
+                    result["error"] = str(frame.get("message") or frame.get("chunk") or "error frame")
+        if result["status"] >= 400:
+            result["error"] = f"HTTP {result['status']}"
+        elif not content and result["error"] is None:
+            result["error"] = "no content"
+    except (httpx.HTTPError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["frames"] = frames
+    result["answer"] = "".join(content)
+    return result
+
+
+async def replay_turns(base_url: str, turns: List[Dict[str, Any]], speed: float, concurrency: Optional[int]) -> List[Dict[str, Any]]:
+    by_session: Dict[str, List[Dict[str, Any]]] = {}
+    for turn in turns:
+        by_session.setdefault(turn["session"], []).append(turn)
+    results: List[Dict[str, Any]] = []
+    gate = asyncio.Semaphore(concurrency) if concurrency else None
+    lags: List[float] = []
+    start = time.perf_counter()
+
+    async def session_worker(client, session_turns):
+        history: List[Dict[str, str]] = []
+        for turn in session_turns:
+            due = start + turn["offset_ms"] / 1000 / speed
+            wait = due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                lags.append(-wait * 1000)  # Previous turn of the session still running at the due time
+            if gate:
+                async with gate:
+                    result = await send_turn(client, base_url, turn, history)
+            else:
+                result = await send_turn(client, base_url, turn, history)
+            result["sent_at_ms"] = round((time.perf_counter() - start) * 1000 - result["total_ms"], 1)
+            results.append(result)
+            if turn.get("regenerate") and history and history[-1]["role"] == "assistant":
+                history[-1] = {"role": "assistant", "content": result["answer"]}
+            else:
+                history += [{"role": "user", "content": turn["message"]}, {"role": "assistant", "content": result["answer"]}]
+
+    limits = httpx.Limits(max_connections=concurrency or 1000, max_keepalive_connections=100)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0), limits=limits) as client:
+        await asyncio.gather(*(session_worker(client, st) for st in by_session.values()))
+    late = [lag for lag in lags if lag > 100]
+    if late:
+        print(f"  {len(late)} turns started >100 ms late (p95 {pct(late, 0.95):.0f} ms): a session's previous turn was still running")
+    return sorted(results, key=lambda r: r["turn"])
+
+
+def replay(args):
+    turns = load_turns(args.traffic, args.limit, args.max_gap)
+    if not turns:
+        raise SystemExit("No turns to replay.")
+    app_dir = os.path.abspath(args.app_dir)
+    log_path = os.path.splitext(args.output)[0] + ".log"
+    procs = []
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            stub_port, app_port = _free_port(), _free_port()
+            stub_cmd = [sys.executable, "-m", "scripts.replay_traffic", "stub", "--port", str(stub_port), "--seed", str(args.seed),
+                        "--embed-ms", str(args.embed_ms), "--rpc-ms", str(args.rpc_ms), "--first-token-ms", str(args.first_token_ms),
+                        "--token-ms", str(args.token_ms), "--answer-tokens", str(args.answer_tokens), "--jitter", str(args.jitter)]
+            procs.append(subprocess.Popen(stub_cmd, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT))
+            stub_url = f"http://127.0.0.1:{stub_port}"
+            _wait_ready(f"{stub_url}/_stub/stats", procs[-1])
+
+            env = {**os.environ,
+                   "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": f"{stub_url}/v1",
+                   "SUPABASE_URL": stub_url, "SUPABASE_KEY": STUB_SUPABASE_KEY,
+                   "CACHE_BACKEND": os.getenv("REPLAY_CACHE_BACKEND", "memory"), "RETENTION_INTERVAL_HOURS": "0",
+                   "PYTHONUNBUFFERED": "1"}
+            app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                       "--log-level", "warning", "--workers", str(args.workers)]
+            procs.append(subprocess.Popen(app_cmd, cwd=app_dir, env=env, stdout=log, stderr=subprocess.STDOUT))
+            app_url = f"http://127.0.0.1:{app_port}"
+            _wait_ready(f"{app_url}/health", procs[-1])
+
+            span = turns[-1]["offset_ms"] / 1000 / args.speed
+            build = _build_label(app_dir)
+            print(f"Replaying {len(turns)} turns against {build} at {args.speed:g}x (~{span:.0f}s), log: {log_path}")
+            started = time.time()
+            results = asyncio.run(replay_turns(app_url, turns, args.speed, args.concurrency))
+            elapsed = time.time() - started
+
+            time.sleep(1.0)  # Interactions are logged from a background thread after the last frame
+            stats = httpx.get(f"{stub_url}/_stub/stats", timeout=10).json()
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    logged: Dict[tuple, List[Dict[str, Any]]] = {}
+    for item in stats["interactions"]:
+        logged.setdefault((item["session"], item["answer"]), []).append(item)
+    for result in results:
+        match = logged.get((result["session"], result["answer"]))
+        if match:
+            item = match.pop(0)
+            result["source"] = item["source"]
+            result["truncated"] = item["truncated"]
+        result.pop("answer", None)
+
+    run = {
+        "build": build, "app_dir": app_dir, "traffic": os.path.abspath(args.traffic), "started_at": started,
+        "elapsed_s": round(elapsed, 1), "speed": args.speed, "workers": args.workers,
+        "stub": {k: getattr(args, k) for k in ("embed_ms", "rpc_ms", "first_token_ms", "token_ms", "answer_tokens", "jitter", "seed")},
+        "upstream_calls": stats["calls"], "turns": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=1)
+    print_summary([run])
+    print(f"Wrote {args.output}")
+
+
+# --- compare ---
+
+def summarize_run(run: Dict[str, Any]) -> Dict[str, Any]:
+    turns = run["turns"]
+    ok = [t for t in turns if not t.get("error")]
+    sources: Dict[str, int] = {}
+    for t in turns:
+        key = t.get("source") or ("error" if t.get("error") else "unlogged")
+        sources[key] = sources.get(key, 0) + 1
+    by_source: Dict[str, List[float]] = {}
+    for t in ok:
+        by_source.setdefault(t.get("source") or "unlogged", []).append(t["total_ms"])
+    return {
+        "build": run["build"],
+        "turns": len(turns),
+        "error_rate": 1 - len(ok) / len(turns) if turns else 0.0,
+        "total": [t["total_ms"] for t in ok],
+        "first_content": [t["first_content_ms"] for t in ok if "first_content_ms" in t],
+        "sources": sources,
+        "by_source": by_source,
+        "calls_per_turn": {name: n / max(1, len(turns)) for name, n in run.get("upstream_calls", {}).items()},
+    }
+
+
+def _fmt(value: Optional[float], unit: str = "") -> str:
+    return "-" if value is None else f"{value:.0f}{unit}" if abs(value) >= 10 else f"{value:.2f}{unit}"
+
+
+def print_summary(runs: List[Dict[str, Any]]):
+    summaries = [summarize_run(run) for run in runs]
+    width = 18
+    print("".ljust(30) + "".join(s["build"][:width - 2].rjust(width) for s in summaries))
+
+    def row(label, values):
+        print(label.ljust(30) + "".join(v.rjust(width) for v in values))
+
+    row("turns", [str(s["turns"]) for s in summaries])
+    row("error rate", [f"{s['error_rate']:.1%}" for s in summaries])
+    for name, key in (("total", "total"), ("first content", "first_content")):
+        for p in (0.5, 0.95, 0.99):
+            row(f"{name} p{int(p * 100)} (ms)", [_fmt(pct(s[key], p)) for s in summaries])
+
+    sources = sorted({src for s in summaries for src in s["sources"]})
+    recorded: Dict[str, int] = {}
+    for t in runs[0]["turns"]:
+        if t.get("recorded_source"):
+            recorded[t["recorded_source"]] = recorded.get(t["recorded_source"], 0) + 1
+    shares = ", ".join(f"{src} {n / len(runs[0]['turns']):.0%}" for src, n in sorted(recorded.items()))
+    print("source share" + (f"  (production: {shares})" if recorded else ""))
+    for src in sources:
+        row(f"  {src}", [f"{s['sources'].get(src, 0) / max(1, s['turns']):.1%}" for s in summaries])
+    print("p50 / p95 by source (ms)")
+    for src in sources:
+        row(f"  {src}", [f"{_fmt(pct(s['by_source'].get(src, []), 0.5))} / {_fmt(pct(s['by_source'].get(src, []), 0.95))}" for s in summaries])
+    print("upstream calls per turn")
+    for name in sorted({n for s in summaries for n in s["calls_per_turn"]}):
+        row(f"  {name}"[:30], [_fmt(s["calls_per_turn"].get(name, 0.0)) for s in summaries])
+
+
+def compare(args):
+    runs = []
+    for path in (args.baseline, args.candidate):
+        with open(path, "r", encoding="utf-8") as f:
+            runs.append(json.load(f))
+    print_summary(runs)
+
+    base = {t["turn"]: t for t in runs[0]["turns"]}
+    pairs = [(base[t["turn"]], t) for t in runs[1]["turns"] if t["turn"] in base]
+    changed = [(a, b) for a, b in pairs if a.get("source") != b.get("source")]
+    new_errors = [b for a, b in pairs if b.get("error") and not a.get("error")]
+    print(f"Same turns: {len(pairs)}; source changed on {len(changed)}, new errors on {len(new_errors)}")
+    flips: Dict[str, int] = {}
+    for a, b in changed:
+        key = f"{a.get('source')} -> {b.get('source')}"
+        flips[key] = flips.get(key, 0) + 1
+    for key, n in sorted(flips.items(), key=lambda item: item[1], reverse=True)[:10]:
+        print(f"  {key}: {n}")
+    for b in new_errors[:5]:
+        print(f"  turn {b['turn']} ({b.get('kind')}): {b['error']}")
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--embed-ms", type=float, default=120.0, help="Stub embeddings latency")
+    parser.add_argument("--rpc-ms", type=float, default=40.0, help="Stub Supabase RPC/table latency")
+    parser.add_argument("--first-token-ms", type=float, default=450.0, help="Stub completion time to first token")
+    parser.add_argument("--token-ms", type=float, default=12.0, help="Stub completion delay per streamed token")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Tokens per stub answer")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency standard deviation, as a fraction of the mean")
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture production chat traffic and replay it against a build")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Export anonymized turns from chat_messages")
+    p.add_argument("output", help="Traffic JSONL to write")
+    p.add_argument("--since", default=None, help="ISO timestamp (inclusive)")
+    p.add_argument("--until", default=None, help="ISO timestamp (exclusive)")
+    p.add_argument("--max-sessions", type=int, default=None, help="Stop after this many sessions")
+    p.add_argument("--salt", default=None, help="Pseudonym salt (random per export by default)")
+    p.set_defaults(func=export_traffic)
+
+    p = sub.add_parser("stub", help="Run the stub upstreams")
+    p.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(p)
+    p.set_defaults(func=run_stub)
+
+    p = sub.add_parser("replay", help="Replay traffic against a build with stubbed upstreams")
+    p.add_argument("traffic", help="Traffic JSONL from `export`")
+    p.add_argument("output", help="Run results (JSON)")
+    p.add_argument("--app-dir", default=BACKEND_DIR, help="Backend directory of the build under test")
+    p.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor (inter-arrival times are divided by it)")
+    p.add_argument("--max-gap", type=float, default=None, help="Cap idle gaps between turns at this many seconds")
+    p.add_argument("--limit", type=int, default=None, help="Only replay the first N turns")
+    p.add_argument("--concurrency", type=int, default=None, help="Max in-flight turns (default: unbounded, as in production)")
+    p.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    add_stub_arguments(p)
+    p.set_defaults(func=replay)
+
+    p = sub.add_parser("compare", help="Compare two replay runs")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Temporal alpha-mask reuse for video background removal.
+
+The mascot clip is mostly static, so running full rembg inference on every
+frame is wasted work. TemporalMasker compares each frame with the last one
+on a small grayscale thumbnail and:
+  - reuses (or shifts) the previous alpha when the change is below a threshold,
+  - re-segments only the changed region when the change is localized,
+  - runs full inference on keyframes and large changes.
+An optional exponential moving average on alpha removes flicker.
+"""
+import time
+from typing import Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:  # Warping needs OpenCV; reuse/region modes don't
+    cv2 = None
+
+
+def rembg_alpha(session, **remove_kwargs) -> Callable[[np.ndarray], np.ndarray]:
+    """Build an inference callable (RGB array -> uint8 alpha) backed by a rembg session."""
+    from rembg import remove
+
+    def _infer(frame_rgb: np.ndarray) -> np.ndarray:
+        result = np.asarray(remove(frame_rgb, session=session, **remove_kwargs))
+        return result[:, :, 3]
+
+    return _infer
+
+
+class TemporalMasker:
+    def __init__(
+        self,
+        infer: Callable[[np.ndarray], np.ndarray],
+        threshold: float = 0.004,
+        region_threshold: float = 0.03,
+        max_region_fraction: float = 0.35,
+        keyframe_interval: int = 48,
+        smoothing: float = 0.0,
+        warp: bool = True,
+        thumb_size: int = 96,
+        region_padding: int = 24,
+    ):
+        """
+        threshold: mean absolute thumbnail difference (0-1) below which the previous mask is reused.
+        region_threshold: per-pixel thumbnail difference counted as "changed".
+        max_region_fraction: largest changed-area fraction re-segmented as a region instead of a full frame.
+        keyframe_interval: force full inference every N frames to stop drift.
+        smoothing: EMA weight of the previous alpha (0 disables temporal smoothing).
+        """
+        self.infer = infer
+        self.threshold = threshold
+        self.region_threshold = region_threshold
+        self.max_region_fraction = max_region_fraction
+        self.keyframe_interval = keyframe_interval
+        self.smoothing = smoothing
+        self.warp = warp and cv2 is not None
+        self.thumb_size = thumb_size
+        self.region_padding = region_padding
+
+        self._prev_thumb: Optional[np.ndarray] = None
+        self._prev_alpha: Optional[np.ndarray] = None
+        self._since_keyframe = 0
+
+        # Stats
+        self.frames = 0
+        self.full_inferences = 0
+        self.region_inferences = 0
+        self.reused = 0
+        self.inferred_area = 0.0  # In full-frame units
+        self.infer_seconds = 0.0
+        self.full_seconds = 0.0
+        self.mask_seconds = 0.0  # All of process(): inference plus thumbnails, diffs and warps
+
+    def _thumbnail(self, frame_rgb: np.ndarray) -> np.ndarray:
+        gray = Image.fromarray(frame_rgb[:, :, :3]).convert("L")
+        gray.thumbnail((self.thumb_size, self.thumb_size))
+        return np.asarray(gray, dtype=np.float32) / 255.0
+
+    def _run_infer(self, image: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        alpha = self.infer(image)
+        self.infer_seconds += time.perf_counter() - start
+        return alpha
+
+    def _shifted_previous(self, thumb: np.ndarray, shape) -> Optional[np.ndarray]:
+        """Shift the previous alpha by the global translation between thumbnails."""
+        (dx, dy), response = cv2.phaseCorrelate(self._prev_thumb, thumb)
+        if response < 0.3 or (abs(dx) < 0.05 and abs(dy) < 0.05):
+            return None
+        scale_x = shape[1] / thumb.shape[1]
+        scale_y = shape[0] / thumb.shape[0]
+        matrix = np.float32([[1, 0, dx * scale_x], [0, 1, dy * scale_y]])
+        return cv2.warpAffine(self._prev_alpha, matrix, (shape[1], shape[0]), flags=cv2.INTER_LINEAR)
+
+    def process(self, frame_rgb: np.ndarray) -> np.ndarray:
+        """Return the uint8 alpha mask for the next frame of the sequence."""
+        start = time.perf_counter()
+        try:
+            return self._process(frame_rgb)
+        finally:
+            self.mask_seconds += time.perf_counter() - start
+
+    def _process(self, frame_rgb: np.ndarray) -> np.ndarray:
+        self.frames += 1
+        h, w = frame_rgb.shape[:2]
+        thumb = self._thumbnail(frame_rgb)
+
+        alpha = None
+        reference_changed = True
+        keyframe = (
+            self._prev_alpha is None
+            or self._prev_alpha.shape != (h, w)
+            or self._since_keyframe >= self.keyframe_interval
+        )
+
+        if not keyframe:
+            diff = np.abs(thumb - self._prev_thumb)
+            if float(diff.mean()) < self.threshold:
+                self.reused += 1
+                alpha = self._prev_alpha
+                reference_changed = False
+                if self.warp:
+                    shifted = self._shifted_previous(thumb, (h, w))
+                    if shifted is not None:
+                        alpha = shifted
+                        reference_changed = True
+            else:
+                changed = diff > self.region_threshold
+                if changed.any() and changed.mean() <= self.max_region_fraction:
+                    alpha = self._infer_region(frame_rgb, changed)
+
+        if alpha is None:
+            start = time.perf_counter()
+            alpha = self._run_infer(frame_rgb)
+            self.full_seconds += time.perf_counter() - start
+            self.full_inferences += 1
+            self.inferred_area += 1.0
+            self._since_keyframe = 0
+        else:
+            self._since_keyframe += 1
+
+        if self.smoothing > 0 and self._prev_alpha is not None and self._prev_alpha.shape == alpha.shape:
+            alpha = (self.smoothing * self._prev_alpha.astype(np.float32)
+                     + (1.0 - self.smoothing) * alpha.astype(np.float32)).astype(np.uint8)
+
+        # Reused masks keep their reference thumbnail so slow drift still adds up to a re-inference
+        if reference_changed:
+            self._prev_thumb = thumb
+        self._prev_alpha = alpha
+        return alpha
+
+    def _infer_region(self, frame_rgb: np.ndarray, changed: np.ndarray) -> np.ndarray:
+        """Re-segment the bounding box of the changed thumbnail pixels and paste it into the previous mask."""
+        h, w = frame_rgb.shape[:2]
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        sy = h / changed.shape[0]
+        sx = w / changed.shape[1]
+        pad = self.region_padding
+        y0 = max(0, int(rows[0] * sy) - pad)
+        y1 = min(h, int((rows[-1] + 1) * sy) + pad)
+        x0 = max(0, int(cols[0] * sx) - pad)
+        x1 = min(w, int((cols[-1] + 1) * sx) + pad)
+
+        alpha = self._prev_alpha.copy()
+        alpha[y0:y1, x0:x1] = self._run_infer(np.ascontiguousarray(frame_rgb[y0:y1, x0:x1]))
+        self.region_inferences += 1
+        self.inferred_area += ((y1 - y0) * (x1 - x0)) / float(h * w)
+        return alpha
+
+    @property
+    def inferred_fraction(self) -> float:
+        """Share of frames that needed any inference (full or region)."""
+        if not self.frames:
+            return 0.0
+        return (self.full_inferences + self.region_inferences) / self.frames
+
+    def report(self, elapsed_seconds: Optional[float] = None) -> str:
+        """
+        Summary of reuse and the estimated speedup over running full inference on every frame.
+        Both sides count only mask time: measured full inferences extrapolated to every frame,
+        against the time spent in process(). Decoding and writing, the same in both modes, are
+        left out; `elapsed_seconds` (wall time of the whole run) is only reported alongside.
+        """
+        lines = [
+            f"Temporal masks: {self.frames} frames | full {self.full_inferences} | "
+            f"region {self.region_inferences} | reused {self.reused} | "
+            f"inferred {self.inferred_fraction * 100:.1f}% of frames ({self.inferred_area / max(1, self.frames) * 100:.1f}% of pixels)"
+        ]
+        if self.full_inferences:
+            full_estimate = self.full_seconds / self.full_inferences * self.frames
+            lines.append(
+                f"Mask time {self.mask_seconds:.1f}s vs ~{full_estimate:.1f}s with full inference on every frame: "
+                f"estimated speedup x{full_estimate / max(self.mask_seconds, 1e-9):.2f}"
+            )
+        if elapsed_seconds:
+            lines.append(f"Wall time {elapsed_seconds:.1f}s (including decode and output)")
+        return "\n".join(lines)
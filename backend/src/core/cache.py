@@ -0,0 +1,401 @@
+"""
+Cache and shared state with an in-process or Redis-protocol backend.
+
+Keys are namespaced (`<CACHE_PREFIX>:<namespace>:<key>`) and can carry a TTL.
+Values are stored as compact binary: a one-byte tag, then msgpack (msgspec) or
+JSON, zlib-compressed above COMPRESS_MIN_BYTES. Raw `bytes` are stored as-is.
+Counters (incr) are plain ASCII integers, as Redis INCR requires; no tag byte is
+ASCII, so `get` on a counter key returns the int.
+With CACHE_BACKEND=redis every worker and node shares the same entries, locks
+and counters. The default memory backend keeps state per process.
+
+    cache = get_cache("embeddings")
+    vector = await cache.get_or_set(key, compute, ttl=86400)  # single-flight across workers
+    allowed = await cache.incr(f"rate:{user_id}", ttl=60) <= 30
+    async with cache.lock(f"session:{session_id}"):
+        ...
+
+The Redis backend speaks RESP over asyncio streams (GET/SET/DEL/EVAL), so it
+works with Redis, Valkey, KeyDB or Dragonfly without an extra client package.
+Its calls go through the "cache" circuit breaker and degrade to misses when the
+server is unreachable, so the cache never takes the chat path down with it.
+"""
+import asyncio
+import json
+import ssl
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional compact encoding
+    msgspec = None
+
+from src.core.circuit import CircuitOpenError, get_breaker
+from src.core.config import settings
+
+COMPRESS_MIN_BYTES = 1024
+LOCK_POLL_SECONDS = 0.05
+
+# --- Serialization ---
+_RAW, _MSGPACK, _JSON = 1, 2, 3
+_ZLIB = 0x80
+_COUNTER_LEAD = frozenset(b"-0123456789")  # First byte of an incr() value; never a tag
+
+
+def dumps(value: Any) -> bytes:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        tag, body = _RAW, bytes(value)
+    elif msgspec is not None:
+        tag, body = _MSGPACK, msgspec.msgpack.encode(value)
+    elif orjson is not None:
+        tag, body = _JSON, orjson.dumps(value)
+    else:
+        tag, body = _JSON, json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(body) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(body, 1)
+        if len(packed) < len(body):
+            tag, body = tag | _ZLIB, packed
+    return bytes([tag]) + body
+
+
+def loads(data: bytes) -> Any:
+    if data[0] in _COUNTER_LEAD:
+        return int(data)
+    tag, body = data[0], data[1:]
+    if tag & _ZLIB:
+        tag, body = tag & ~_ZLIB, zlib.decompress(body)
+    if tag == _RAW:
+        return body
+    if tag == _MSGPACK:
+        if msgspec is None:
+            raise ValueError("msgpack cache entry but msgspec is not installed")
+        return msgspec.msgpack.decode(body)
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+# --- Backends ---
+class MemoryBackend:
+    """Per-process store with lazy expiry and LRU eviction past `max_entries`."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key: str, value: bytes, ttl: Optional[float]):
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            current = self._live(key)
+            value = int(current or b"0") + 1
+            expires = self._data[key][1] if current is not None else (time.monotonic() + ttl if ttl else None)
+            self._data[key] = (str(value).encode(), expires)
+            return value
+
+    async def release(self, key: str, token: bytes) -> bool:
+        with self._lock:
+            if self._live(key) == token:
+                del self._data[key]
+                return True
+            return False
+
+
+class RedisError(Exception):
+    """Error reply from the server."""
+
+
+# Atomic on the server: first INCR sets the expiry; lock release only by its owner
+_INCR_SCRIPT = "local v = redis.call('INCR', KEYS[1]) if v == 1 and tonumber(ARGV[1]) > 0 then redis.call('PEXPIRE', KEYS[1], ARGV[1]) end return v"
+_RELEASE_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+
+
+class RedisBackend:
+    """Minimal pooled RESP2 client: redis://[user:password@]host:port/db, or rediss:// for TLS."""
+
+    name = "redis"
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.ssl = ssl.create_default_context() if parsed.scheme == "rediss" else None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.breaker = get_breaker("cache")
+
+    # --- Protocol ---
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    async def _read_reply(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("cache server closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            if size < 0:
+                return None
+            data = await reader.readexactly(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [await self._read_reply(reader) for _ in range(count)]
+        raise ConnectionError(f"unexpected reply {line[:20]!r}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        try:
+            if self.password:
+                auth = ("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)
+                writer.write(self._encode(auth))
+                await self._read_reply(reader)
+            if self.db:
+                writer.write(self._encode(("SELECT", self.db)))
+                await self._read_reply(reader)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def execute(self, *args):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams and semaphores are bound to the loop that created them
+            self._loop, self._idle, self._slots = loop, [], asyncio.Semaphore(self.pool_size)
+        with self.breaker.guard():
+            async with self._slots:
+                conn = self._idle.pop() if self._idle else await self._connect()
+                try:
+                    conn[1].write(self._encode(args))
+                    reply = await asyncio.wait_for(self._read_reply(conn[0]), self.timeout)
+                except RedisError:
+                    self._idle.append(conn)  # Protocol still in sync
+                    raise
+                except BaseException:
+                    conn[1].close()
+                    raise
+                self._idle.append(conn)
+                return reply
+
+    # --- Operations ---
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            await self.execute("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            await self.execute("SET", key, value)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        args = ("SET", key, value, "NX") + (("PX", int(ttl * 1000)) if ttl else ())
+        return await self.execute(*args) is not None
+
+    async def delete(self, key: str):
+        await self.execute("DEL", key)
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        return await self.execute("EVAL", _INCR_SCRIPT, 1, key, int((ttl or 0) * 1000))
+
+    async def release(self, key: str, token: bytes) -> bool:
+        return bool(await self.execute("EVAL", _RELEASE_SCRIPT, 1, key, token))
+
+
+# --- Facade ---
+class Cache:
+    """Namespaced view of the shared backend; backend failures read as misses."""
+
+    def __init__(self, namespace: str, backend):
+        self.namespace = namespace
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _key(self, key: str) -> str:
+        return f"{settings.CACHE_PREFIX}:{self.namespace}:{key}"
+
+    async def _safe(self, operation: Awaitable, fallback: Any = None) -> Any:
+        try:
+            return await operation
+        except CircuitOpenError:
+            return fallback
+        except Exception as e:
+            print(f"Cache error ({self.namespace}): {type(e).__name__}: {e}")
+            return fallback
+
+    def _loads(self, data: Optional[bytes]) -> Any:
+        """Decoded entry; an undecodable one (foreign writer, missing msgspec) reads as a miss."""
+        if data is None:
+            return None
+        try:
+            return loads(data)
+        except Exception as e:
+            print(f"Cache error ({self.namespace}): undecodable entry: {type(e).__name__}: {e}")
+            return None
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        value = self._loads(await self._safe(self.backend.get(self._key(key))))
+        return default if value is None else value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._safe(self.backend.set(self._key(key), dumps(value), ttl))
+
+    async def delete(self, key: str):
+        await self._safe(self.backend.delete(self._key(key)))
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        """Atomic counter (fixed-window rate limits); `get` reads it back as an int. Returns 0 if the backend is unavailable."""
+        return await self._safe(self.backend.incr(self._key(key), ttl), 0)
+
+    def lock(self, key: str, ttl: float = 10.0, wait: float = 5.0) -> "CacheLock":
+        """Cross-worker mutex; expires after `ttl` so a crashed holder can't block forever."""
+        return CacheLock(self, key, ttl, wait)
+
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]], ttl: Optional[float] = None, lock_ttl: float = 10.0, wait: float = 5.0) -> Any:
+        """Cached value, or compute it once: concurrent callers in this process share one
+        future, and other workers wait on the holder of the lock instead of recomputing."""
+        value = self._loads(await self._safe(self.backend.get(self._key(key))))
+        if value is not None:
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self.lock(key, ttl=lock_ttl, wait=wait) as lock:
+                if not lock.acquired or lock.waited:
+                    # Another worker may have filled it while we waited
+                    value = self._loads(await self._safe(self.backend.get(self._key(key))))
+                    if value is not None:
+                        future.set_result(value)
+                        return value
+                value = await factory()
+                await self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+class CacheLock:
+    def __init__(self, cache: Cache, key: str, ttl: float, wait: float):
+        self.cache = cache
+        self.key = cache._key(f"lock:{key}")
+        self.ttl = ttl
+        self.wait = wait
+        self.token = uuid.uuid4().hex.encode()
+        self.acquired = False
+        self.waited = False
+
+    async def __aenter__(self) -> "CacheLock":
+        deadline = time.monotonic() + self.wait
+        while True:
+            # None = backend unavailable: proceed unlocked rather than stall the request
+            added = await self.cache._safe(self.cache.backend.add(self.key, self.token, self.ttl))
+            if added is None or added:
+                self.acquired = bool(added)
+                return self
+            if time.monotonic() >= deadline:
+                return self
+            self.waited = True
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.acquired:
+            await self.cache._safe(self.cache.backend.release(self.key, self.token))
+        return False
+
+
+_backend = None
+_caches: Dict[str, Cache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _registry_lock:
+        if _backend is None:
+            if settings.CACHE_BACKEND == "redis":
+                _backend = RedisBackend(settings.CACHE_URL)
+                print(f"Cache backend: redis ({_backend.host}:{_backend.port}/{_backend.db})")
+            else:
+                _backend = MemoryBackend(settings.CACHE_MEMORY_MAX_ENTRIES)
+        return _backend
+
+
+def get_cache(namespace: str) -> Cache:
+    backend = get_backend()
+    with _registry_lock:
+        if namespace not in _caches:
+            _caches[namespace] = Cache(namespace, backend)
+        return _caches[namespace]
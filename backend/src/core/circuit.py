@@ -0,0 +1,171 @@
+"""
+Circuit breakers for external dependencies (OpenAI, Supabase).
+
+Each breaker keeps a rolling window of recent call outcomes and latencies. Once
+the window holds enough calls and the error rate reaches the threshold it opens,
+and callers fail fast with CircuitOpenError, so they go straight to their local
+fallback instead of waiting on a timeout. After BREAKER_OPEN_SECONDS one probe
+call is let through (half-open). If it succeeds the breaker closes, and if it
+fails the breaker opens again.
+
+    async with get_breaker("openai_embeddings").guard():
+        ...
+    with get_breaker("supabase_log").guard():   # also usable from worker threads
+        ...
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+
+from src.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open (retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: Optional[int] = None, min_calls: Optional[int] = None, error_rate: Optional[float] = None, open_seconds: Optional[float] = None, slow_call_ms: Optional[float] = None):
+        self.name = name
+        self.min_calls = settings.BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.error_rate = settings.BREAKER_ERROR_RATE if error_rate is None else error_rate
+        self.open_seconds = settings.BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        # Calls slower than this count as failures: a dependency that hangs is as bad as one that errors
+        self.slow_call_ms = settings.BREAKER_SLOW_CALL_MS if slow_call_ms is None else slow_call_ms
+        self.outcomes = deque(maxlen=settings.BREAKER_WINDOW if window is None else window)  # (ok, latency_ms)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    # --- State machine ---
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, ok: bool, latency_ms: float, error: Optional[BaseException] = None):
+        if ok and latency_ms > self.slow_call_ms:
+            ok, error = False, TimeoutError(f"slow call ({latency_ms:.0f} ms)")
+        with self._lock:
+            self.outcomes.append((ok, latency_ms))
+            if error is not None:
+                self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    print(f"[{time.time()}] Circuit '{self.name}' closed.")
+                else:
+                    self._trip()
+                return
+            if self.state == CLOSED and not ok and len(self.outcomes) >= self.min_calls:
+                failures = sum(1 for success, _ in self.outcomes if not success)
+                if failures / len(self.outcomes) >= self.error_rate:
+                    self._trip()
+
+    def record_failure(self, error: BaseException, latency_ms: float = 0.0):
+        self.record(False, latency_ms, error)
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        print(f"[{time.time()}] Circuit '{self.name}' opened ({self.last_error}).")
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def guard(self) -> "_Guard":
+        """Context manager (sync or async) that short-circuits and records one call."""
+        return _Guard(self)
+
+    # --- Reporting ---
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            outcomes = list(self.outcomes)
+            state = self.state
+        latencies = sorted(latency for _, latency in outcomes)
+        failures = sum(1 for ok, _ in outcomes if not ok)
+        return {
+            "state": state,
+            "calls": len(outcomes),
+            "error_rate": round(failures / len(outcomes), 3) if outcomes else 0.0,
+            "latency_p50_ms": round(latencies[len(latencies) // 2], 1) if latencies else None,
+            "latency_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+            "retry_in_s": round(self.retry_in(), 1) if state == OPEN else None,
+            "last_error": self.last_error,
+        }
+
+
+class _Guard:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.started = 0.0
+
+    def __enter__(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_in())
+        self.started = time.perf_counter()
+        return self.breaker
+
+    def __exit__(self, exc_type, exc, tb):
+        latency_ms = (time.perf_counter() - self.started) * 1000
+        if exc_type is None:
+            self.breaker.record(True, latency_ms)
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            # Caller went away; says nothing about the dependency. Release a half-open probe slot.
+            with self.breaker._lock:
+                self.breaker._probe_in_flight = False
+        else:
+            self.breaker.record(False, latency_ms, exc)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+# Shared across requests and threads
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_snapshots() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
@@ -15,5 +15,75 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
 
+    # Streaming frame encoding
+    FRAME_COALESCE_MS: float = float(os.getenv("FRAME_COALESCE_MS", "30"))
+    FRAME_COALESCE_BYTES: int = int(os.getenv("FRAME_COALESCE_BYTES", "512"))
+    STREAM_COMPRESSION: bool = os.getenv("STREAM_COMPRESSION", "false").lower() in ("1", "true", "yes")
+
+    # Retrieval: HNSW candidate list size per query (higher = better recall, slower)
+    RAG_EF_SEARCH: int = int(os.getenv("RAG_EF_SEARCH", "40"))
+    # Embedding compression: reduced dimensions (text-embedding-3 `dimensions`, must match the
+    # vector(N) column) and index quantization ("none", "half", "binary") with full-precision
+    # rescoring of the top RAG_RESCORE_CANDIDATES
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+    EMBEDDING_QUANTIZATION: str = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()
+    RAG_RESCORE_CANDIDATES: int = int(os.getenv("RAG_RESCORE_CANDIDATES", "40"))
+    # Context selection (see veda_chatbot/context.py): over-fetched candidates, near-duplicate
+    # cutoff (word-shingle Jaccard), MMR relevance weight and prompt token budget for context
+    RAG_CANDIDATES: int = int(os.getenv("RAG_CANDIDATES", "12"))
+    RAG_DEDUP_THRESHOLD: float = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+    RAG_MMR_LAMBDA: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    RAG_CONTEXT_TOKENS: int = int(os.getenv("RAG_CONTEXT_TOKENS", "2400"))
+
+    # Follow-up recommendations (see veda_chatbot/recommendations.py): click-through stats
+    # window, refresh interval and weight of the click-through rate in the ranking
+    REC_CLICK_WINDOW_DAYS: int = int(os.getenv("REC_CLICK_WINDOW_DAYS", "30"))
+    REC_CLICK_REFRESH_SECONDS: float = float(os.getenv("REC_CLICK_REFRESH_SECONDS", "600"))
+    REC_CLICK_WEIGHT: float = float(os.getenv("REC_CLICK_WEIGHT", "2.0"))
+
+    # Shared cache / state (see core/cache.py): "memory" (per process) or "redis" (any
+    # Redis-protocol server, shared by all workers); cached query embeddings live EMBEDDING_CACHE_TTL
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory").lower()
+    CACHE_URL: str = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+    CACHE_PREFIX: str = os.getenv("CACHE_PREFIX", "leadq")
+    CACHE_MEMORY_MAX_ENTRIES: int = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+    EMBEDDING_CACHE_TTL: float = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+
+    # Runtime pipeline profiles / A/B arms (see veda_chatbot/profiles.py); the file is
+    # re-read on change, at most every PIPELINE_PROFILES_RELOAD_SECONDS
+    PIPELINE_PROFILES_PATH: str = os.getenv("PIPELINE_PROFILES_PATH", "")
+    PIPELINE_PROFILES_RELOAD_SECONDS: float = float(os.getenv("PIPELINE_PROFILES_RELOAD_SECONDS", "5"))
+
+    # ADMIN_TOKEN (X-Admin-Token header) guards the history/analytics reads, /admin/* and
+    # per-request profiling (X-Profile, see core/profiling.py); empty refuses them all.
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "3000"))
+    TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "50"))
+    PROFILE_SAMPLE_MS: float = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+    LOOP_MONITOR_INTERVAL_MS: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "250"))
+    LOOP_LAG_WARN_MS: float = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+
+    # Ticket / feedback outbox (see veda_chatbot/outbox.py); Idempotency-Key replays are
+    # recognised for IDEMPOTENCY_TTL_SECONDS
+    OUTBOX_DIR: str = os.getenv("OUTBOX_DIR", "outbox")
+    OUTBOX_ACK_TIMEOUT_SECONDS: float = float(os.getenv("OUTBOX_ACK_TIMEOUT_SECONDS", "1.0"))
+    OUTBOX_RETRY_SECONDS: float = float(os.getenv("OUTBOX_RETRY_SECONDS", "5"))
+    OUTBOX_MAX_BACKOFF_SECONDS: float = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+    IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+    # Chat history retention (see veda_chatbot/retention.py)
+    RETENTION_DAYS: int = int(os.getenv("RETENTION_DAYS", "90"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "100"))
+    RETENTION_BATCH_PAUSE: float = float(os.getenv("RETENTION_BATCH_PAUSE", "0.5"))
+    RETENTION_ARCHIVE_DIR: str = os.getenv("RETENTION_ARCHIVE_DIR", "")
+    RETENTION_INTERVAL_HOURS: float = float(os.getenv("RETENTION_INTERVAL_HOURS", "0"))
+
+    # Dependency circuit breakers (see core/circuit.py)
+    BREAKER_WINDOW: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    BREAKER_ERROR_RATE: float = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    BREAKER_OPEN_SECONDS: float = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+    BREAKER_SLOW_CALL_MS: float = float(os.getenv("BREAKER_SLOW_CALL_MS", "15000"))
+
 
 settings = Settings()
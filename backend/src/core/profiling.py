@@ -0,0 +1,242 @@
+"""
+Request traces, on-demand sampling profiles and event-loop lag monitoring.
+
+RequestTrace: every /chat turn records per-stage durations (a few perf_counter
+calls). Turns slower than SLOW_REQUEST_MS, and every profiled turn, are kept in a
+small ring buffer for GET /admin/traces.
+
+StackSampler: started only for a turn that an admin asked to profile
+(X-Profile header with a valid X-Admin-Token). A background thread samples the
+event-loop thread's Python stack every PROFILE_SAMPLE_MS and aggregates it into
+top frames and folded stacks (flamegraph.pl / speedscope format). Other requests
+share the loop, so their CPU work shows up too. That is the point when hunting
+for something that blocks the loop.
+
+LoopMonitor: a task that sleeps LOOP_MONITOR_INTERVAL_MS and records how late it
+wakes up (event-loop lag). A watchdog thread notices when that heartbeat stalls
+beyond LOOP_LAG_WARN_MS and captures the loop thread's stack while it is still
+blocked. The stack names the sync call (Supabase, regex, JSON) holding the loop.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.core.config import settings
+
+MAX_STACK_DEPTH = 64
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _stack(frame) -> List[str]:
+    """Root-first list of frame labels."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Dict[tuple, int] = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            key = tuple(_stack(frame))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop_event.set()
+        self.join(timeout=1.0)
+        self_counts: Dict[str, int] = {}
+        total_counts: Dict[str, int] = {}
+        for stack, count in self.counts.items():
+            self_counts[stack[-1]] = self_counts.get(stack[-1], 0) + count
+            for label in set(stack):
+                total_counts[label] = total_counts.get(label, 0) + count
+        top = sorted(total_counts, key=lambda label: (self_counts.get(label, 0), total_counts[label]), reverse=True)[:25]
+        folded = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:200]
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "top": [{"frame": label, "self": self_counts.get(label, 0), "total": total_counts[label]} for label in top],
+            "folded": [f"{';'.join(stack)} {count}" for stack, count in folded],
+        }
+
+
+class _Stage:
+    def __init__(self, trace: "RequestTrace", name: str):
+        self.trace = trace
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        self.trace.stages.append({
+            "stage": self.name,
+            "start_ms": round((self.started - self.trace.t0) * 1000, 1),
+            "duration_ms": round((ended - self.started) * 1000, 1),
+            **({"error": exc_type.__name__} if exc_type is not None else {}),
+        })
+        return False
+
+    def end(self):
+        self.__exit__(None, None, None)
+
+
+class RequestTrace:
+    def __init__(self, name: str, trace_id: Optional[str] = None, profile: bool = False, **meta):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.meta = meta
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.marks: Dict[str, float] = {}
+        self.total_ms: Optional[float] = None
+        self.profile: Optional[Dict[str, Any]] = None
+        self.sampler: Optional[StackSampler] = None
+        if profile:
+            # Called on the loop thread: that is the thread to sample
+            self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_MS / 1000)
+            self.sampler.start()
+
+    def stage(self, name: str) -> _Stage:
+        """`with trace.stage("embed"): ...` records the block's duration."""
+        return _Stage(self, name)
+
+    def start(self, name: str) -> _Stage:
+        """Stage spanning code that doesn't fit a `with` block; call .end() on the result."""
+        return _Stage(self, name).__enter__()
+
+    def mark(self, name: str):
+        self.marks[name] = round((time.perf_counter() - self.t0) * 1000, 1)
+
+    def finish(self, **meta):
+        if self.total_ms is not None:
+            return
+        self.total_ms = round((time.perf_counter() - self.t0) * 1000, 1)
+        self.meta.update(meta)
+        if self.sampler is not None:
+            self.profile = self.sampler.stop()
+            self.sampler = None
+        if self.profile is not None or self.total_ms >= settings.SLOW_REQUEST_MS:
+            recent_traces.append(self)
+
+    def to_dict(self, full: bool = True) -> Dict[str, Any]:
+        data = {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "stages": self.stages,
+            "marks": self.marks,
+            **self.meta,
+            "profiled": self.profile is not None,
+        }
+        if full and self.profile is not None:
+            data["profile"] = self.profile
+        return data
+
+
+recent_traces: Deque[RequestTrace] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+
+
+def find_trace(trace_id: str) -> Optional[RequestTrace]:
+    return next((trace for trace in reversed(recent_traces) if trace.id == trace_id), None)
+
+
+class LoopMonitor:
+    def __init__(self, interval_ms: float, warn_ms: float):
+        self.interval = interval_ms / 1000
+        self.warn_ms = warn_ms
+        self.lags: Deque[float] = deque(maxlen=max(10, int(60_000 / max(interval_ms, 1))))  # ~1 minute
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self._captured_beat = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self.loop_thread_id = threading.get_ident()
+        self.task = asyncio.create_task(self._run())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        print(f"[{time.time()}] Event-loop lag monitor started ({self.interval * 1000:.0f} ms interval).")
+
+    async def _run(self):
+        try:
+            while True:
+                before = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                lag_ms = max(0.0, (time.perf_counter() - before - self.interval) * 1000)
+                self.lags.append(lag_ms)
+                self.heartbeat = time.monotonic()
+                if lag_ms >= self.warn_ms:
+                    print(f"[{time.time()}] Event loop lag {lag_ms:.0f} ms.")
+        finally:
+            self._stop_event.set()
+
+    def _watchdog(self):
+        threshold = self.interval + self.warn_ms / 1000
+        while not self._stop_event.wait(self.interval):
+            beat = self.heartbeat
+            blocked = time.monotonic() - beat
+            if blocked < threshold or beat == self._captured_beat:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            self._captured_beat = beat  # One capture per stall
+            self.stalls.append({"at": time.time(), "blocked_ms": round(blocked * 1000, 1), "stack": _stack(frame)[-20:]})
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+
+        def pct(p):
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 1) if lags else None
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(lags),
+            "lag_p50_ms": pct(0.5),
+            "lag_p95_ms": pct(0.95),
+            "lag_p99_ms": pct(0.99),
+            "lag_max_ms": round(lags[-1], 1) if lags else None,
+            "stalls": list(self.stalls),
+        }
+
+
+loop_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor() -> Optional[LoopMonitor]:
+    """Start the monitor on the running loop (once); disabled when LOOP_MONITOR_INTERVAL_MS is 0."""
+    global loop_monitor
+    if loop_monitor is None and settings.LOOP_MONITOR_INTERVAL_MS > 0:
+        loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL_MS, settings.LOOP_LAG_WARN_MS)
+        loop_monitor.start()
+    return loop_monitor
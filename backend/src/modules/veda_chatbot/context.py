@@ -0,0 +1,132 @@
+"""
+Context selection between retrieval and prompt assembly.
+
+match_documents over-fetches RAG_CANDIDATES chunks. select_context then:
+  1. drops near-duplicates (same normalized text, or word-shingle Jaccard at or
+     above RAG_DEDUP_THRESHOLD), which repeated ingest runs and overlapping
+     chunk boundaries produce
+  2. picks chunks by maximal marginal relevance, trading retrieval similarity
+     against overlap with the chunks already chosen (RAG_MMR_LAMBDA)
+  3. stops at MATCH_COUNT chunks or the RAG_CONTEXT_TOKENS budget
+The RPC returns no vectors, so redundancy is measured on text shingles rather
+than embedding cosine; that keeps the payload small and catches copies exactly.
+"""
+import re
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from src.core.config import settings
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+SHINGLE_SIZE = 3
+TOKENIZER_RETRY_SECONDS = 60.0
+
+_WORD_RE = re.compile(r"\w+")
+_encoding = None
+_encoding_retry_at = 0.0
+_encoding_lock = threading.Lock()
+
+
+def load_tokenizer():
+    """
+    Load the cl100k encoding once. The first load may download it, so main.py calls
+    this in a worker thread at startup rather than on the first RAG turn.
+    A failed load (e.g. a transient network error) is retried after
+    TOKENIZER_RETRY_SECONDS; returns None until one succeeds.
+    """
+    global _encoding, _encoding_retry_at
+    with _encoding_lock:
+        if _encoding is None and time.time() >= _encoding_retry_at:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                _encoding_retry_at = time.time() + TOKENIZER_RETRY_SECONDS
+                print(f"[{time.time()}] Tokenizer unavailable, estimating context tokens (retry in {TOKENIZER_RETRY_SECONDS:.0f}s): {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """cl100k token count; falls back to ~4 characters per token while tiktoken can't load."""
+    encoding = _encoding
+    if encoding is None and time.time() >= _encoding_retry_at:
+        encoding = load_tokenizer()
+    if encoding:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def _shingles(text: str) -> FrozenSet[Tuple[str, ...]]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def _jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_context(
+    chunks: List[Dict[str, Any]],
+    max_chunks: int,
+    token_budget: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+    dedup_threshold: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Returns the chunks to put in the prompt (in selection order) and an audit record for meta."""
+    token_budget = settings.RAG_CONTEXT_TOKENS if token_budget is None else token_budget
+    mmr_lambda = settings.RAG_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    dedup_threshold = settings.RAG_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    # 1. Near-duplicate removal, best-scoring copy wins
+    ranked = sorted(chunks, key=lambda c: c.get("similarity") or 0.0, reverse=True)
+    pool, seen_text = [], set()
+    for chunk in ranked:
+        normalized = " ".join(chunk["content"].split()).lower()
+        if normalized in seen_text:
+            continue
+        shingles = _shingles(normalized)
+        if any(_jaccard(shingles, kept["shingles"]) >= dedup_threshold for kept in pool):
+            continue
+        seen_text.add(normalized)
+        pool.append({"chunk": chunk, "shingles": shingles, "tokens": count_tokens(chunk["content"])})
+    duplicates = len(chunks) - len(pool)
+
+    # 2-3. MMR under the token budget (the best chunk is always kept, even if oversized)
+    selected, used_tokens, over_budget = [], 0, 0
+    while pool and len(selected) < max_chunks:
+        def mmr(item):
+            redundancy = max((_jaccard(item["shingles"], s["shingles"]) for s in selected), default=0.0)
+            return mmr_lambda * (item["chunk"].get("similarity") or 0.0) - (1 - mmr_lambda) * redundancy
+
+        best = max(pool, key=mmr)
+        pool.remove(best)
+        if selected and used_tokens + best["tokens"] > token_budget:
+            over_budget += 1
+            continue
+        selected.append(best)
+        used_tokens += best["tokens"]
+
+    report = {
+        "candidates": len(chunks),
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "tokens": used_tokens,
+        "chunks": [
+            {
+                "id": item["chunk"].get("id"),
+                "source": (item["chunk"].get("metadata") or {}).get("source"),
+                "similarity": round(item["chunk"]["similarity"], 4) if item["chunk"].get("similarity") is not None else None,
+            }
+            for item in selected
+        ],
+    }
+    return [item["chunk"] for item in selected], report
+
+
+def format_context(chunks: List[Dict[str, Any]]) -> str:
+    return CONTEXT_SEPARATOR.join(chunk["content"] for chunk in chunks)
@@ -0,0 +1,208 @@
+"""
+NDJSON frame encoding for the chat stream.
+Serializes frames with orjson/msgspec when available, coalesces small
+content deltas and optionally compresses the stream (gzip / brotli).
+"""
+import asyncio
+import json
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional fast path
+    msgspec = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional compression
+    brotli = None
+
+from src.core.config import settings
+
+Frame = Dict[str, Any]
+
+
+# --- Serialization ---
+if orjson is not None:
+    ENCODER_BACKEND = "orjson"
+
+    def encode_frame(frame: Frame) -> bytes:
+        """Serialize a frame as a single NDJSON line."""
+        return orjson.dumps(frame, option=orjson.OPT_APPEND_NEWLINE)
+elif msgspec is not None:
+    ENCODER_BACKEND = "msgspec"
+    _msgspec_encoder = msgspec.json.Encoder()
+
+    def encode_frame(frame: Frame) -> bytes:
+        """Serialize a frame as a single NDJSON line."""
+        return _msgspec_encoder.encode(frame) + b"\n"
+else:
+    ENCODER_BACKEND = "json"
+
+    def encode_frame(frame: Frame) -> bytes:
+        """Serialize a frame as a single NDJSON line."""
+        return (json.dumps(frame, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def encode_frame_stdlib(frame: Frame) -> bytes:
+    """Reference encoder matching the original `json.dumps(...) + "\\n"` frames."""
+    return (json.dumps(frame) + "\n").encode("utf-8")
+
+
+# --- Delta coalescing ---
+async def _next_frame(frames: AsyncIterator[Frame]) -> Frame:
+    return await frames.__anext__()
+
+
+async def coalesce_frames(
+    frames: AsyncIterator[Frame],
+    window_ms: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> AsyncIterator[Frame]:
+    """
+    Merge consecutive `content` frames until the time or size window is exceeded.
+    The window runs on a timer: buffered text is flushed when it expires even if
+    the upstream has not produced another frame yet, so a slow model never holds
+    a delta back longer than the window.
+    Any other frame type flushes the buffer first so frame ordering is preserved.
+    A window of 0 disables coalescing.
+    """
+    window_ms = settings.FRAME_COALESCE_MS if window_ms is None else window_ms
+    max_bytes = settings.FRAME_COALESCE_BYTES if max_bytes is None else max_bytes
+
+    if window_ms <= 0 and max_bytes <= 0:
+        async for frame in frames:
+            yield frame
+        return
+
+    frames = frames.__aiter__()
+    buffer = []
+    buffered_len = 0
+    first_at = 0.0
+    pending: Optional[asyncio.Task] = None
+
+    try:
+        while True:
+            try:
+                if pending is None and not (buffer and window_ms > 0):
+                    frame = await frames.__anext__()  # Nothing buffered: no deadline to watch
+                else:
+                    if pending is None:
+                        pending = asyncio.ensure_future(_next_frame(frames))
+                    remaining = window_ms / 1000 - (time.monotonic() - first_at)
+                    if buffer and window_ms > 0 and remaining > 0:
+                        await asyncio.wait({pending}, timeout=remaining)
+                    if buffer and not pending.done():
+                        # Window expired while the upstream is still working: flush now, keep waiting
+                        yield {"type": "content", "chunk": "".join(buffer)}
+                        buffer, buffered_len = [], 0
+                        continue
+                    frame = await pending
+                    pending = None
+            except StopAsyncIteration:
+                pending = None
+                break
+
+            if frame.get("type") == "content":
+                if not buffer:
+                    first_at = time.monotonic()
+                buffer.append(frame["chunk"])
+                buffered_len += len(frame["chunk"])
+                elapsed_ms = (time.monotonic() - first_at) * 1000
+                if (max_bytes > 0 and buffered_len >= max_bytes) or (window_ms > 0 and elapsed_ms >= window_ms):
+                    yield {"type": "content", "chunk": "".join(buffer)}
+                    buffer, buffered_len = [], 0
+                continue
+
+            if buffer:
+                yield {"type": "content", "chunk": "".join(buffer)}
+                buffer, buffered_len = [], 0
+            yield frame
+    finally:
+        if pending is not None:
+            # Stop the in-flight read so the source can be closed (it can't while a read runs)
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    if buffer:
+        yield {"type": "content", "chunk": "".join(buffer)}
+
+
+# --- Streaming compression ---
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick `br` or `gzip` from an Accept-Encoding header, honouring q-values."""
+    if not settings.STREAM_COMPRESSION or not accept_encoding:
+        return None
+
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token.strip().lower()] = q
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = offered.get(name, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class _GzipStream:
+    def __init__(self):
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def push(self, data: bytes) -> bytes:
+        # Sync flush so each chunk reaches the client immediately
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._obj = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+
+    def push(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+async def encode_stream(frames: AsyncIterator[Frame], encoding: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Coalesce, serialize and (optionally) compress a frame stream."""
+    compressor = None
+    if encoding == "gzip":
+        compressor = _GzipStream()
+    elif encoding == "br" and brotli is not None:
+        compressor = _BrotliStream()
+
+    async for frame in coalesce_frames(frames):
+        data = encode_frame(frame)
+        if compressor is not None:
+            data = compressor.push(data)
+        yield data
+
+    if compressor is not None:
+        tail = compressor.finish()
+        if tail:
+            yield tail
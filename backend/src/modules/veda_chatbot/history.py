@@ -0,0 +1,107 @@
+"""
+Read side of the chat tables: session transcripts, usage analytics and exports.
+All queries go through the SQL functions in supabase_schema.sql so projection,
+keyset pagination and aggregation happen in Postgres.
+"""
+import asyncio
+import base64
+from typing import Optional, List, Dict, Any, AsyncGenerator, Tuple
+
+from src.core.database import get_supabase
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+EXPORT_PAGE_SIZE = 500
+VOLUME_BUCKETS = ("hour", "day", "week", "month")
+
+
+def encode_cursor(created_at: str, message_id: str) -> str:
+    """Opaque keyset cursor for the last row of a page."""
+    return base64.urlsafe_b64encode(f"{created_at}|{message_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    if not cursor:
+        return None, None
+    try:
+        created_at, _, message_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if not created_at or not message_id:
+        raise ValueError("Invalid cursor.")
+    return created_at, message_id
+
+
+class HistoryService:
+    @staticmethod
+    def _rpc(name: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        supabase = get_supabase()
+        if supabase is None:
+            raise RuntimeError("Database not configured.")
+        return supabase.rpc(name, params).execute().data or []
+
+    @staticmethod
+    def list_messages(session_id: Optional[str] = None, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, since: Optional[str] = None, until: Optional[str] = None, include_recommendations: bool = False) -> Dict[str, Any]:
+        """One page of messages in (created_at, id) order, with the cursor for the next page."""
+        after, after_id = decode_cursor(cursor)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        rows = HistoryService._rpc("list_chat_messages", {
+            "p_session_id": session_id,
+            "p_since": since,
+            "p_until": until,
+            "p_after": after,
+            "p_after_id": after_id,
+            "p_limit": limit,
+            "p_include_recommendations": include_recommendations,
+        })
+        if not include_recommendations:
+            for row in rows:
+                row.pop("recommendations", None)
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == limit else None
+        return {"messages": rows, "next_cursor": next_cursor}
+
+    @staticmethod
+    def latency_by_source(since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        return HistoryService._rpc("chat_latency_by_source", _range(since, until))
+
+    @staticmethod
+    def message_volume(since: Optional[str] = None, until: Optional[str] = None, bucket: str = "day") -> List[Dict[str, Any]]:
+        if bucket not in VOLUME_BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(VOLUME_BUCKETS)}.")
+        return HistoryService._rpc("chat_message_volume", {**_range(since, until), "p_bucket": bucket})
+
+    @staticmethod
+    def top_questions(since: Optional[str] = None, until: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        return HistoryService._rpc("chat_top_questions", {**_range(since, until), "p_limit": limit})
+
+    @staticmethod
+    def experiment_summary(experiment: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        return HistoryService._rpc("chat_experiment_summary", {**_range(since, until), "p_experiment": experiment})
+
+    @staticmethod
+    async def export_frames(session_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None, include_recommendations: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream every matching message page by page (one `message` frame per row),
+        so an export never holds more than EXPORT_PAGE_SIZE rows in memory.
+        """
+        cursor = None
+        exported = 0
+        while True:
+            page = await asyncio.to_thread(HistoryService.list_messages, session_id, cursor, EXPORT_PAGE_SIZE, since, until, include_recommendations)
+            for row in page["messages"]:
+                yield {"type": "message", **row}
+            exported += len(page["messages"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        yield {"type": "done", "count": exported}
+
+
+def _range(since: Optional[str], until: Optional[str]) -> Dict[str, Any]:
+    """Only send the bounds that were given so the SQL defaults apply otherwise."""
+    params = {}
+    if since:
+        params["p_since"] = since
+    if until:
+        params["p_until"] = until
+    return params
@@ -0,0 +1,302 @@
+"""
+Durable outbox for support tickets and feedback.
+
+/ticket and /feedback no longer insert into Supabase inside the request. Each
+submission gets its row id up front, derived from the client's Idempotency-Key
+(a retried request maps to the same id). The row is appended and fsynced to a
+local JSONL outbox. Then delivery is tried for up to OUTBOX_ACK_TIMEOUT_SECONDS.
+If it succeeds or the timeout passes, the API acknowledges with the id, and a
+slow or failed delivery carries on in the background.
+
+Delivery upserts with ON CONFLICT (id) DO NOTHING. Redelivery after a crash, or
+a retry that reached another worker, therefore never creates a second row. The
+delivery loop retries with exponential backoff. Errors retrying can't fix (bad
+input, CHECK violations) go to outbox-dead.jsonl. An unknown user_id (foreign
+key) is dropped so the ticket still lands.
+
+An acknowledged id is therefore not a guarantee that the row exists: it may still
+be queued, or have been dead-lettered. lookup() tells which (GET /ticket/{id} and
+/feedback/{id}), and a dead-lettered id never turns into a row by itself.
+
+Each process writes its own outbox-<pid>.jsonl under OUTBOX_DIR. On start, files
+left behind by processes that are no longer running are adopted and drained.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from src.core.circuit import CircuitOpenError, get_breaker
+from src.core.config import settings
+from src.core.database import get_supabase
+
+# Fixed namespace: record ids must stay stable across deploys
+_ID_NAMESPACE = uuid.UUID("6f1c1f0e-8a4b-4c55-9d2e-0f3b7a51c2d4")
+# not_null / check / invalid text representation / undefined column: retrying cannot help
+PERMANENT_ERROR_CODES = frozenset({"23502", "23514", "22P02", "42703", "PGRST204"})
+FOREIGN_KEY_VIOLATION = "23503"
+COMPACT_AFTER_RECORDS = 1000
+
+
+def record_id(table: str, idempotency_key: str, user_id: Optional[str] = None) -> str:
+    """Stable row id for a submission: the same key (per user) always names the same row."""
+    return str(uuid.uuid5(_ID_NAMESPACE, f"{table}:{user_id or ''}:{idempotency_key}"))
+
+
+def fingerprint(row: Dict[str, Any]) -> str:
+    """Payload hash: the same id must never be reused for different content."""
+    return hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class PayloadConflict(ValueError):
+    """A submission id is already queued with a different payload."""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Outbox:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self.adopted: List[str] = []
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.inflight: Set[str] = set()
+        self.delivered = 0
+        self.dead = 0
+        self.task: Optional[asyncio.Task] = None
+        self._records = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+
+    # --- File ---
+    def _open(self):
+        """Own file for this process, plus any outbox left by a process that is gone."""
+        if self.path is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"outbox-{os.getpid()}.jsonl")
+        for path in sorted(glob.glob(os.path.join(self.directory, "outbox-*.jsonl"))):
+            owner = os.path.basename(path)[len("outbox-"):-len(".jsonl")].split("-")[0]
+            if path == self.path or not owner.isdigit() or _pid_alive(int(owner)):
+                continue
+            claimed = os.path.join(self.directory, f"outbox-{os.getpid()}-{os.path.basename(path)[len('outbox-'):]}")
+            try:
+                os.rename(path, claimed)  # Atomic: only one worker adopts a file
+            except FileNotFoundError:
+                continue
+            self.adopted.append(claimed)
+        for path in self.adopted + [self.path]:
+            self._load(path)
+        if self.pending:
+            print(f"[{time.time()}] Outbox: {len(self.pending)} undelivered submissions to resend.")
+            self._rewrite()
+
+    def _load(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn last line from a crash mid-write
+            if record.get("op") == "put":
+                self.pending[record["id"]] = {k: v for k, v in record.items() if k != "op"}
+            elif record.get("op") == "done":
+                self.pending.pop(record["id"], None)
+
+    def _append(self, record: Dict[str, Any]):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._records += 1
+
+    def _rewrite(self):
+        """Replace the log with just the pending entries (and drop adopted files)."""
+        with self._lock:
+            # Snapshot under the lock: a put appended before this point is already in
+            # `pending`, one appended after lands in the new file. The copies are atomic
+            # under the GIL, so the loop can keep updating entries meanwhile.
+            entries = [{**entry, "row": dict(entry["row"])} for entry in list(self.pending.copy().values())]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps({"op": "put", **entry}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            for path in self.adopted:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.adopted = []
+            self._records = len(entries)
+
+    # --- Delivery ---
+    def _insert(self, entry: Dict[str, Any]):
+        supabase = get_supabase()
+        if supabase is None:
+            raise RuntimeError("Database not configured.")
+        with get_breaker("supabase_outbox").guard():
+            supabase.table(entry["table"]).upsert(entry["row"], on_conflict="id", ignore_duplicates=True).execute()
+
+    async def _deliver(self, entry: Dict[str, Any]) -> bool:
+        if entry["id"] in self.inflight or entry["id"] not in self.pending:
+            return False  # Being sent, or already finished since the caller looked it up
+        self.inflight.add(entry["id"])
+        try:
+            await asyncio.to_thread(self._insert, entry)
+        except CircuitOpenError as e:
+            entry["next_attempt"] = time.time() + e.retry_in  # Not an attempt: nothing was sent
+            return False
+        except Exception as e:
+            code = str(getattr(e, "code", "") or "")
+            entry["attempts"] += 1
+            entry["last_error"] = f"{type(e).__name__}: {e}"[:300]
+            if code == FOREIGN_KEY_VIOLATION and entry["row"].get("user_id"):
+                print(f"Outbox: unknown user_id on {entry['table']} {entry['id']}, delivering without it.")
+                entry["row"].pop("user_id")
+                entry["next_attempt"] = time.time()
+            elif code in PERMANENT_ERROR_CODES:
+                print(f"Outbox: {entry['table']} {entry['id']} rejected ({entry['last_error']}), moved to dead letters.")
+                await asyncio.to_thread(self._dead_letter, entry)
+                self.dead += 1
+                await self._finish(entry["id"])
+            else:
+                backoff = min(settings.OUTBOX_MAX_BACKOFF_SECONDS, settings.OUTBOX_RETRY_SECONDS * 2 ** (entry["attempts"] - 1))
+                entry["next_attempt"] = time.time() + backoff
+                print(f"Outbox: {entry['table']} {entry['id']} not delivered (attempt {entry['attempts']}, retry in {backoff:.0f}s): {entry['last_error']}")
+            return False
+        finally:
+            self.inflight.discard(entry["id"])
+        self.delivered += 1
+        await self._finish(entry["id"])
+        return True
+
+    def _dead_letter(self, entry: Dict[str, Any]):
+        with self._lock:
+            with open(os.path.join(self.directory, "outbox-dead.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({**entry, "failed_at": time.time()}, ensure_ascii=False) + "\n")
+
+    async def _finish(self, entry_id: str):
+        """Drop a delivered or dead-lettered entry; `pending` is only mutated on the event loop."""
+        if self.pending.pop(entry_id, None) is None:
+            return
+        if not self.pending or self._records >= COMPACT_AFTER_RECORDS:
+            await asyncio.to_thread(self._rewrite)
+        else:
+            await asyncio.to_thread(self._append, {"op": "done", "id": entry_id})
+
+    # --- API ---
+    async def submit(self, table: str, row: Dict[str, Any]) -> bool:
+        """Durably queue `row` (which carries its id), then wait briefly for delivery. True if delivered."""
+        if self.path is None:
+            await asyncio.to_thread(self._open)
+        entry = self.pending.get(row["id"])
+        digest = fingerprint(row)
+        if entry is not None and entry.get("fingerprint", digest) != digest:
+            raise PayloadConflict("Idempotency-Key was already used for a different request.")
+        if entry is None:
+            entry = {"id": row["id"], "table": table, "row": row, "fingerprint": digest, "attempts": 0, "next_attempt": 0.0, "enqueued_at": time.time()}
+            # Pending before the write, so a concurrent compaction can't drop the new entry
+            self.pending[entry["id"]] = entry
+            try:
+                await asyncio.to_thread(self._append, {"op": "put", **entry})
+            except Exception:
+                self.pending.pop(entry["id"], None)
+                raise
+        delivery = asyncio.create_task(self._deliver(entry))
+        done, _ = await asyncio.wait({delivery}, timeout=settings.OUTBOX_ACK_TIMEOUT_SECONDS)
+        if delivery not in done and self._wakeup is not None:
+            self._wakeup.set()
+        return delivery in done and delivery.result()
+
+    async def _run(self):
+        while True:
+            timeout = settings.OUTBOX_RETRY_SECONDS
+            try:
+                now = time.time()
+                due = [e for e in list(self.pending.values()) if e["next_attempt"] <= now and e["id"] not in self.inflight]
+                for entry in due:
+                    await self._deliver(entry)
+                waits = [e["next_attempt"] - time.time() for e in list(self.pending.values())]
+                timeout = min([timeout] + [max(0.05, w) for w in waits])
+            except Exception as e:
+                # A failed journal write must not stop delivery for the life of the process
+                print(f"[{time.time()}] Outbox delivery loop error: {type(e).__name__}: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Adopt leftovers and start the delivery loop on the running event loop (once)."""
+        if self.task is not None:
+            return
+        self._open()
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def lookup(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Where an acknowledged submission stands, if it is not (yet) a row: queued in this
+        or another worker's outbox, or rejected into the dead letters. None otherwise.
+        Blocking file reads; call via asyncio.to_thread.
+        """
+        try:
+            with open(os.path.join(self.directory, "outbox-dead.jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    if entry_id in line:
+                        record = json.loads(line)
+                        if record.get("id") == entry_id:
+                            return {"state": "rejected", "error": record.get("last_error"), "failed_at": record.get("failed_at")}
+        except (OSError, ValueError):
+            pass
+        entry = self.pending.get(entry_id)
+        if entry is None:
+            for path in glob.glob(os.path.join(self.directory, "outbox-*.jsonl")):
+                if path == self.path or not os.path.basename(path)[len("outbox-"):][:1].isdigit():
+                    continue  # Own file is mirrored in self.pending; skips outbox-dead.jsonl
+                queued = False
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            if entry_id in line:
+                                queued = json.loads(line).get("op") == "put"
+                except (OSError, ValueError):
+                    continue
+                if queued:
+                    return {"state": "queued"}
+            return None
+        return {"state": "queued", "attempts": entry["attempts"], "last_error": entry.get("last_error")}
+
+    def status(self) -> Dict[str, Any]:
+        oldest = min((e["enqueued_at"] for e in self.pending.values()), default=None)
+        return {
+            "pending": len(self.pending),
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest is not None else None,
+            "delivered": self.delivered,
+            "dead_letters": self.dead,
+        }
+
+
+outbox = Outbox(settings.OUTBOX_DIR)
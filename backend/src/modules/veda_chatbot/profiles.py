@@ -0,0 +1,153 @@
+"""
+Runtime pipeline profiles and A/B experiment arms.
+
+A profile bundles the per-turn knobs of /chat (models, retrieval, context budget,
+history window, sampling). The field defaults form the "default" profile and back
+the module constants in service.py. Extra
+profiles and an optional experiment come from PIPELINE_PROFILES_PATH, a JSON file
+that is re-read when its mtime changes (checked at most every
+PIPELINE_PROFILES_RELOAD_SECONDS), so tuning needs no restart:
+
+    {
+      "profiles": {
+        "default": {"temperature": 0.3},
+        "lean": {"match_count": 3, "context_tokens": 1200, "max_tokens": 350}
+      },
+      "experiment": {"name": "lean-context-1", "arms": {"default": 50, "lean": 50}}
+    }
+
+Profiles only list overrides; everything else falls back to the defaults. A
+session always lands in the same arm: the arm is picked from a hash of the
+experiment name and session id. Each turn logs profile/experiment/arm in meta,
+and chat_experiment_summary aggregates them. A broken file is reported and
+ignored, and the last good configuration stays active.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from src.core.config import settings
+from src.modules.veda_chatbot.prompts import HISTORY_WINDOW
+
+DEFAULT_PROFILE = "default"
+
+
+class PipelineProfile(BaseModel):
+    model_config = ConfigDict(extra="forbid")  # A typo in the file should fail loudly, not be ignored
+
+    name: str = DEFAULT_PROFILE
+    chat_model: str = "gpt-4o-mini"
+    match_threshold: float = 0.72  # Broader coverage for product docs + RAG
+    match_count: int = 4  # Chunks in the prompt, after context selection
+    rag_candidates: int = settings.RAG_CANDIDATES
+    context_tokens: int = settings.RAG_CONTEXT_TOKENS
+    history_window: int = HISTORY_WINDOW
+    max_tokens: int = 500
+    temperature: float = 0.3
+    regenerate_temperature: float = 0.7
+    top_p: float = 0.9
+
+
+class ProfileRegistry:
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.profiles: Dict[str, PipelineProfile] = {DEFAULT_PROFILE: PipelineProfile()}
+        self.experiment: Optional[str] = None
+        self.arms: Tuple[Tuple[str, float], ...] = ()
+        self.loaded_mtime: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, mtime: float):
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        # Valid JSON of the wrong shape is a broken file too, not an AttributeError later
+        if not isinstance(raw, dict):
+            raise ValueError("profiles file must be a JSON object")
+        overrides = raw.get("profiles") or {}
+        if not isinstance(overrides, dict) or not all(isinstance(v, dict) for v in overrides.values()):
+            raise ValueError('"profiles" must map profile names to objects of overrides')
+        base = PipelineProfile(**{**overrides.get(DEFAULT_PROFILE, {}), "name": DEFAULT_PROFILE})
+        profiles = {DEFAULT_PROFILE: base}
+        for name, values in overrides.items():
+            if name != DEFAULT_PROFILE:
+                profiles[name] = PipelineProfile(**{**base.model_dump(), **values, "name": name})
+
+        experiment, arms = None, ()
+        spec = raw.get("experiment")
+        if spec is not None and not isinstance(spec, dict):
+            raise ValueError('"experiment" must be an object with "name" and "arms"')
+        if spec and spec.get("arms"):
+            if not isinstance(spec["arms"], dict):
+                raise ValueError('experiment "arms" must map profile names to weights')
+            if not all(isinstance(w, (int, float)) and not isinstance(w, bool) and w >= 0 for w in spec["arms"].values()):
+                raise ValueError("experiment arm weights must be non-negative numbers")
+            unknown = [arm for arm in spec["arms"] if arm not in profiles]
+            if unknown:
+                raise ValueError(f"experiment arms reference unknown profiles: {', '.join(unknown)}")
+            total = float(sum(spec["arms"].values()))
+            if total <= 0:
+                raise ValueError("experiment arm weights must add up to more than 0")
+            experiment = str(spec.get("name") or "experiment")
+            arms = tuple((arm, weight / total) for arm, weight in spec["arms"].items() if weight > 0)
+
+        self.profiles, self.experiment, self.arms = profiles, experiment, arms
+        self.loaded_mtime, self.last_error = mtime, None
+        arms_txt = ", ".join(f"{arm} {share:.0%}" for arm, share in arms) or "none"
+        print(f"[{time.time()}] Pipeline profiles loaded: {', '.join(profiles)} (experiment {experiment}: {arms_txt}).")
+
+    def refresh(self, force: bool = False):
+        """Re-read the file if it changed since the last load."""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.PIPELINE_PROFILES_RELOAD_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return  # No file yet: keep the current profiles
+            if mtime == self.loaded_mtime and not force:
+                return
+            try:
+                self._load(mtime)
+            except Exception as e:  # Any broken file, including valid JSON of the wrong shape
+                # Keep serving the last good configuration; retry once the file changes again
+                self.loaded_mtime = mtime
+                self.last_error = f"{type(e).__name__}: {e}"[:500]
+                print(f"Pipeline profiles not reloaded ({self.path}): {self.last_error}")
+
+    def assign(self, session_id: Optional[str]) -> Tuple[PipelineProfile, Dict[str, Any]]:
+        """Profile for this session, and the meta fields identifying it."""
+        self.refresh()
+        profiles, experiment, arms = self.profiles, self.experiment, self.arms
+        if not experiment or not session_id:
+            return profiles[DEFAULT_PROFILE], {"profile": DEFAULT_PROFILE}
+        digest = hashlib.sha256(f"{experiment}:{session_id}".encode("utf-8")).digest()
+        point = int.from_bytes(digest[:8], "big") / 2 ** 64
+        cumulative = 0.0
+        for arm, share in arms:
+            cumulative += share
+            if point < cumulative:
+                break
+        return profiles[arm], {"profile": arm, "experiment": experiment, "arm": arm}
+
+    def status(self) -> Dict[str, Any]:
+        self.refresh()
+        return {
+            "path": self.path or None,
+            "profiles": {name: profile.model_dump() for name, profile in self.profiles.items()},
+            "experiment": {"name": self.experiment, "arms": dict(self.arms)} if self.experiment else None,
+            "last_error": self.last_error,
+        }
+
+
+profiles = ProfileRegistry(settings.PIPELINE_PROFILES_PATH)
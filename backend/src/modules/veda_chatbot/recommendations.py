@@ -0,0 +1,165 @@
+"""
+Local follow-up question ranking (the "recommendations" chips).
+
+The model no longer writes follow-ups after a ###REC### marker. They are picked here
+from a fixed pool: every KNOWLEDGE_BASE topic's marketing_links, plus past suggestions
+users actually clicked (recommendation_clicks RPC over chat_messages). Each candidate
+is scored against the user's question and the retrieved context the answer is
+grounded on, including the chunks' source file names:
+  relevance   IDF-weighted term overlap between the candidate and question + context
+  topic       how strongly the candidate's topic keywords appear in question + context
+  clicks      smoothed click-through rate of the candidate in recent sessions
+Ranking needs no model output, so /chat sends the recommendations frame right after
+retrieval, while the answer is still streaming.
+"""
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.core.circuit import get_breaker
+from src.core.config import settings
+from src.core.database import get_supabase
+
+RECOMMENDATION_COUNT = 3
+TOPIC_WEIGHT = 0.5
+MIN_CLICKS_FOR_POOL = 2  # Past suggestions outside the KB join the pool once clicked this often
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from how i in is it me my of on or our
+    the this to what when where which who why will with you your leadq tell about
+""".split())
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().strip(" ?.!").split())
+
+
+def _terms(text: str) -> Set[str]:
+    """Content words, with a naive plural strip so "contacts" matches "contact"."""
+    terms = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        terms.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return terms
+
+
+class RecommendationEngine:
+    def __init__(self, knowledge_base: Dict[str, Dict[str, Any]]):
+        self.topics = {topic: _terms(" ".join(data["keywords"])) for topic, data in knowledge_base.items()}
+        self.candidates: Dict[str, Dict[str, Any]] = {}  # normalized question -> candidate
+        for topic, data in knowledge_base.items():
+            for question in data.get("marketing_links", []):
+                self._add_candidate(question, topic)
+        self._base_keys = set(self.candidates)
+        self.fallback = [c["question"] for c in list(self.candidates.values())[:RECOMMENDATION_COUNT]]
+        self.clicks: Dict[str, Dict[str, int]] = {}  # normalized question -> {"offered", "clicked"}
+        self._clicks_loaded_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._reindex()
+
+    def _add_candidate(self, question: str, topic: Optional[str]):
+        key = _normalize(question)
+        if key and key not in self.candidates:
+            self.candidates[key] = {"question": question.strip(), "topic": topic, "terms": _terms(question)}
+
+    def _reindex(self):
+        """Inverse document frequency of each term across the candidate pool."""
+        df: Dict[str, int] = {}
+        for candidate in self.candidates.values():
+            for term in candidate["terms"]:
+                df[term] = df.get(term, 0) + 1
+        total = len(self.candidates) or 1
+        self.idf = {term: math.log(1 + total / count) for term, count in df.items()}
+
+    # --- Click-through history ---
+    def _refresh_clicks(self):
+        try:
+            supabase = get_supabase()
+            if supabase is None:
+                return
+            since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - settings.REC_CLICK_WINDOW_DAYS * 86400))
+            with get_breaker("supabase_rpc").guard():
+                rows = supabase.rpc("recommendation_clicks", {"p_since": since}).execute().data or []
+            clicks = {_normalize(r["question"]): {"offered": int(r["offered"]), "clicked": int(r["clicked"])} for r in rows}
+            with self._lock:
+                self.clicks = clicks
+                for row in rows:
+                    if int(row["clicked"]) >= MIN_CLICKS_FOR_POOL:
+                        self._add_candidate(row["question"], None)
+                self._reindex()
+            print(f"[{time.time()}] Loaded click-through stats for {len(clicks)} recommendations.")
+        except Exception as e:
+            print(f"Recommendation click stats error: {e}")
+        finally:
+            self._clicks_loaded_at = time.monotonic()
+            self._refreshing = False
+
+    def _maybe_refresh(self):
+        """Stale stats are refreshed in a background thread; ranking never waits on the database."""
+        if self._refreshing or time.monotonic() - self._clicks_loaded_at < settings.REC_CLICK_REFRESH_SECONDS:
+            return
+        self._refreshing = True
+        threading.Thread(target=self._refresh_clicks, daemon=True).start()
+
+    def _click_rate(self, key: str) -> float:
+        stats = self.clicks.get(key)
+        if not stats:
+            return 0.0
+        # Smoothed toward zero so a single lucky click doesn't dominate
+        return (stats["clicked"] + 0.5) / (stats["offered"] + 10)
+
+    # --- Ranking ---
+    def recommend(
+        self,
+        message: str,
+        context_text: str = "",
+        chunks: Optional[List[Dict[str, Any]]] = None,
+        exclude: Iterable[str] = (),
+        count: int = RECOMMENDATION_COUNT,
+    ) -> List[str]:
+        """Best `count` follow-ups for this turn, at most one per topic while possible."""
+        self._maybe_refresh()
+        sources = " ".join(str((c.get("metadata") or {}).get("source", "")).rsplit(".", 1)[0].replace("_", " ") for c in chunks or [])
+        question_terms = _terms(message)
+        focus = question_terms | _terms(context_text) | _terms(sources)
+        excluded = {_normalize(message)} | {_normalize(e) for e in exclude}
+
+        topic_scores = {}
+        for topic, keywords in self.topics.items():
+            # Question matches count double: the context often spans several topics
+            hits = len(keywords & focus) + len(keywords & question_terms)
+            topic_scores[topic] = hits / (len(keywords) ** 0.5) if keywords else 0.0
+        top_topic_score = max(topic_scores.values(), default=0.0) or 1.0
+
+        with self._lock:
+            candidates = list(self.candidates.items())
+            idf = self.idf
+        scored = []
+        for key, candidate in candidates:
+            if key in excluded:
+                continue
+            terms = candidate["terms"]
+            weight = sum(idf.get(t, 0.0) for t in terms) or 1.0
+            relevance = sum(idf.get(t, 0.0) for t in terms & focus) / weight
+            topic = topic_scores.get(candidate["topic"], 0.0) / top_topic_score
+            score = relevance + TOPIC_WEIGHT * topic + settings.REC_CLICK_WEIGHT * self._click_rate(key)
+            scored.append((score, key, candidate))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        picked, topics_used = [], set()
+        for diverse in (True, False):
+            for score, key, candidate in scored:
+                if len(picked) >= count:
+                    break
+                if candidate in picked or (diverse and candidate["topic"] is not None and candidate["topic"] in topics_used):
+                    continue
+                if any(len(candidate["terms"] & p["terms"]) / max(1, len(candidate["terms"] | p["terms"])) >= 0.6 for p in picked):
+                    continue  # Near-identical phrasing of an already picked question
+                picked.append(candidate)
+                topics_used.add(candidate["topic"])
+        return [c["question"] for c in picked] or list(self.fallback)
@@ -0,0 +1,195 @@
+"""
+Retention job for the chat tables.
+
+Sessions idle for longer than RETENTION_DAYS are rolled into one gzip-compressed
+NDJSON transcript each (a `chat_session_archives` row, or a file under
+RETENTION_ARCHIVE_DIR), then removed from the hot tables in batches with a pause
+between batches so the deletes never compete with live inserts for long.
+
+    python -m src.modules.veda_chatbot.retention --days 90 --batch-size 100 --dry-run
+
+Set RETENTION_INTERVAL_HOURS to also run it periodically inside the API process.
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+
+from src.core.config import settings
+from src.core.database import get_supabase
+from src.modules.veda_chatbot.frames import encode_frame
+
+MESSAGE_COLUMNS = "id,session_id,role,content,recommendations,meta,created_at"
+FETCH_PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+# Progress of the current / last run, exposed at GET /admin/retention
+retention_status: Dict[str, Any] = {"state": "idle"}
+
+
+def _fetch_messages(supabase, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Full rows for a batch of sessions, grouped by session, paged past the row cap."""
+    grouped = {sid: [] for sid in session_ids}
+    start = 0
+    while True:
+        rows = (
+            supabase.table("chat_messages")
+            .select(MESSAGE_COLUMNS)
+            .in_("session_id", session_ids)
+            .order("session_id").order("created_at").order("id")
+            .range(start, start + FETCH_PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        for row in rows:
+            grouped[row["session_id"]].append(row)
+        if len(rows) < FETCH_PAGE_SIZE:
+            return grouped
+        start += FETCH_PAGE_SIZE
+
+
+def _pack(messages: List[Dict[str, Any]]) -> tuple:
+    raw = b"".join(encode_frame(m) for m in messages)
+    return raw, gzip.compress(raw, compresslevel=6)
+
+
+def _write_archive_file(archive_dir: str, session: Dict[str, Any], payload: bytes) -> str:
+    month = (session.get("last_active_at") or "unknown")[:7]
+    folder = os.path.join(archive_dir, month)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{session['id']}.ndjson.gz")
+    with open(path, "wb") as f:
+        f.write(payload)
+    return path
+
+
+def run_retention(days: Optional[int] = None, batch_size: Optional[int] = None, pause: Optional[float] = None, archive_dir: Optional[str] = None, max_batches: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """Archive and prune idle sessions batch by batch; returns the run metrics."""
+    days = settings.RETENTION_DAYS if days is None else days
+    batch_size = settings.RETENTION_BATCH_SIZE if batch_size is None else batch_size
+    pause = settings.RETENTION_BATCH_PAUSE if pause is None else pause
+    archive_dir = settings.RETENTION_ARCHIVE_DIR if archive_dir is None else archive_dir
+
+    supabase = get_supabase()
+    if supabase is None:
+        raise RuntimeError("Database not configured.")
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    metrics = {
+        "state": "running",
+        "cutoff": cutoff,
+        "dry_run": dry_run,
+        "batches": 0,
+        "sessions": 0,
+        "messages": 0,
+        "raw_bytes": 0,
+        "compressed_bytes": 0,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    }
+    retention_status.clear()
+    retention_status.update(metrics)
+    start = time.perf_counter()
+
+    try:
+        while max_batches is None or metrics["batches"] < max_batches:
+            sessions = supabase.rpc("chat_retention_candidates", {"p_cutoff": cutoff, "p_limit": batch_size}).execute().data or []
+            if not sessions:
+                break
+
+            session_ids = [s["id"] for s in sessions]
+            grouped = _fetch_messages(supabase, session_ids)
+            archives = []
+            for session in sessions:
+                messages = grouped[session["id"]]
+                raw, payload = _pack(messages)
+                archive = {
+                    "session_id": session["id"],
+                    "user_id": session.get("user_id"),
+                    "started_at": session.get("started_at"),
+                    "last_active_at": session.get("last_active_at"),
+                    "message_count": len(messages),
+                    "raw_bytes": len(raw),
+                }
+                if archive_dir:
+                    archive["payload_uri"] = _write_archive_file(archive_dir, session, payload) if not dry_run else None
+                else:
+                    archive["payload"] = "\\x" + payload.hex()  # bytea hex input format
+                archives.append(archive)
+                metrics["messages"] += len(messages)
+                metrics["raw_bytes"] += len(raw)
+                metrics["compressed_bytes"] += len(payload)
+
+            if dry_run:
+                # Candidates would repeat forever without the delete, so report one batch only
+                metrics["batches"] += 1
+                metrics["sessions"] += len(sessions)
+                break
+
+            # Archive first (idempotent on session_id), then drop the session; messages cascade.
+            # The delete re-checks the cutoff: a turn logged since the fetch bumped last_active_at
+            # before inserting its messages, so that session stays (with its unarchived messages)
+            # and its archive row is simply replaced when it goes idle again.
+            supabase.table("chat_session_archives").upsert(archives).execute()
+            deleted = (
+                supabase.table("chat_sessions").delete()
+                .in_("id", session_ids)
+                .lt("last_active_at", cutoff)
+                .execute()
+            ).data or []
+            if len(deleted) < len(session_ids):
+                metrics["skipped_active"] = metrics.get("skipped_active", 0) + len(session_ids) - len(deleted)
+
+            metrics["batches"] += 1
+            metrics["sessions"] += len(deleted)
+            metrics["elapsed_s"] = round(time.perf_counter() - start, 2)
+            retention_status.update(metrics)
+            print(f"[{time.time()}] Retention batch {metrics['batches']}: {len(deleted)} of {len(sessions)} sessions pruned, "
+                  f"{metrics['sessions']} total, {metrics['messages']} messages archived")
+
+            if len(sessions) < batch_size or not deleted:
+                break  # Nothing deleted: the same candidates would come back, stop until the next run
+            time.sleep(pause)
+
+        metrics["state"] = "done"
+    except Exception as e:
+        metrics["state"] = "failed"
+        metrics["error"] = str(e)
+        print(f"Retention Error: {e}")
+    finally:
+        metrics["elapsed_s"] = round(time.perf_counter() - start, 2)
+        if metrics["compressed_bytes"]:
+            metrics["compression_ratio"] = round(metrics["raw_bytes"] / metrics["compressed_bytes"], 2)
+        retention_status.update(metrics)
+    return metrics
+
+
+async def retention_loop(interval_hours: float):
+    """Background task started by main.py when RETENTION_INTERVAL_HOURS > 0; a failed run is retried next interval."""
+    while True:
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception as e:
+            retention_status.clear()
+            retention_status.update({"state": "failed", "error": str(e), "failed_at": datetime.now(timezone.utc).isoformat()})
+            print(f"Retention Error: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and prune idle chat sessions")
+    parser.add_argument("--days", type=int, default=None, help=f"Idle age in days (default {settings.RETENTION_DAYS})")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=None, help="Seconds to sleep between batches")
+    parser.add_argument("--archive-dir", default=None, help="Write .ndjson.gz files here instead of archive rows")
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Measure the first batch without writing or deleting")
+    args = parser.parse_args()
+
+    metrics = run_retention(args.days, args.batch_size, args.pause, args.archive_dir, args.max_batches, args.dry_run)
+    for key, value in metrics.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,215 @@
+import asyncio
+import hmac
+import json
 import os
 import shutil
 import uuid
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, BackgroundTasks, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 
+from src.core.config import settings
+from src.core import profiling
 from src.modules.veda_chatbot.schemas import ChatRequest, FeedbackRequest, TicketRequest
 from src.modules.veda_chatbot.service import ChatService
+from src.modules.veda_chatbot.history import HistoryService, DEFAULT_PAGE_SIZE
+from src.modules.veda_chatbot.profiles import profiles as pipeline_profiles
+from src.modules.veda_chatbot.retention import retention_status
+from src.modules.veda_chatbot.frames import encode_frame, encode_stream, negotiate_encoding
+from src.modules.veda_chatbot.transports import ChannelOwnerMismatch, ChatChannel, find_channel, get_channel, sse_stream
 
 router = APIRouter(tags=["Chatbot"])
 
+def is_admin(http_request: Request) -> bool:
+    """X-Admin-Token matches ADMIN_TOKEN (never true while ADMIN_TOKEN is unset)."""
+    token = http_request.headers.get("x-admin-token", "")
+    return bool(settings.ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8"))
+
 @router.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     session_id = request.sessionId if request.sessionId else str(uuid.uuid4())
+    encoding = negotiate_encoding(http_request.headers.get("accept-encoding"))
+    trace_id = uuid.uuid4().hex[:16]
+    # Sampling profile on demand: X-Profile: 1 plus a valid X-Admin-Token
+    profile = http_request.headers.get("x-profile", "").lower() in ("1", "true", "yes") and is_admin(http_request)
+    headers = {"Vary": "Accept-Encoding", "X-Trace-Id": trace_id}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        ChatService.chat_generator(request.message, session_id, request.user_id, request.regenerate, request.history, encoding, http_request.is_disconnected, trace_id, profile),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
+
+@router.websocket("/chat/ws")
+async def chat_socket(websocket: WebSocket, sessionId: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Persistent chat over one WebSocket per session.
+    Client sends {"type": "message", "message": ..., "regenerate": ..., "history": ...}
+    or {"type": "cancel"}; server sends the usual frames tagged with a `turn` number.
+    """
+    await websocket.accept()
+    channel = ChatChannel(sessionId or str(uuid.uuid4()), user_id)
+    queue = channel.subscribe()
+
+    async def _sender():
+        while True:
+            frame = await queue.get()
+            await websocket.send_text(encode_frame(frame).decode("utf-8"))
+
+    sender = asyncio.create_task(_sender())
+    queue.put_nowait({"type": "ready", "sessionId": channel.session_id})
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                queue.put_nowait({"type": "error", "message": "Invalid JSON."})
+                continue
+            if not isinstance(data, dict):
+                queue.put_nowait({"type": "error", "message": "Expected a JSON object."})
+                continue
+            if data.get("type") == "cancel":
+                channel.cancel()
+                continue
+            message = data.get("message")
+            if not isinstance(message, str) or not message:
+                queue.put_nowait({"type": "error", "message": "Missing message."})
+                continue
+            channel.submit(message, bool(data.get("regenerate", False)), data.get("history"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        channel.unsubscribe(queue)
+        sender.cancel()
+
+@router.get("/chat/sse")
+async def chat_sse(sessionId: Optional[str] = None, user_id: Optional[str] = None):
+    """Open the SSE event stream for a session; turns are posted to /chat/sse/{session_id}."""
+    try:
+        channel = get_channel(sessionId or str(uuid.uuid4()), user_id)
+    except ChannelOwnerMismatch:
+        return {"status": "error", "message": "Session belongs to another user."}
+    return StreamingResponse(
+        sse_stream(channel),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/sse/{session_id}")
+async def chat_sse_message(session_id: str, request: ChatRequest):
+    channel = find_channel(session_id, request.user_id)
+    if channel is None:
+        return {"status": "error", "message": "No open event stream for this session."}
+    turn = channel.submit(request.message, request.regenerate, request.history)
+    return {"status": "accepted", "sessionId": session_id, "turn": turn}
+
+@router.post("/chat/sse/{session_id}/cancel")
+async def chat_sse_cancel(session_id: str, user_id: Optional[str] = None):
+    channel = find_channel(session_id, user_id)
+    cancelled = channel.cancel() if channel else False
+    return {"status": "success", "cancelled": cancelled}
+
+@router.get("/history/export")
+async def export_history(http_request: Request, session_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None, include_recommendations: bool = False):
+    """Stream messages as NDJSON, fetched page by page with keyset pagination (admin only)."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    encoding = negotiate_encoding(http_request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding", "Content-Disposition": "attachment; filename=chat_history.ndjson"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
     return StreamingResponse(
-        ChatService.chat_generator(request.message, session_id, request.user_id, request.regenerate, request.history),
-        media_type="application/x-ndjson"
+        encode_stream(HistoryService.export_frames(session_id, since, until, include_recommendations), encoding),
+        media_type="application/x-ndjson",
+        headers=headers
     )
 
+@router.get("/history/{session_id}")
+async def session_history(session_id: str, http_request: Request, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, include_recommendations: bool = False):
+    """Session transcript, oldest first; pass `next_cursor` back as `cursor` for the next page (admin only)."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    try:
+        page = await asyncio.to_thread(HistoryService.list_messages, session_id, cursor, limit, None, None, include_recommendations)
+        return {"status": "success", "sessionId": session_id, **page}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/analytics/latency")
+async def analytics_latency(http_request: Request, since: Optional[str] = None, until: Optional[str] = None):
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(HistoryService.latency_by_source, since, until)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/analytics/volume")
+async def analytics_volume(http_request: Request, since: Optional[str] = None, until: Optional[str] = None, bucket: str = "day"):
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(HistoryService.message_volume, since, until, bucket)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/analytics/top-questions")
+async def analytics_top_questions(http_request: Request, since: Optional[str] = None, until: Optional[str] = None, limit: int = 20):
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(HistoryService.top_questions, since, until, limit)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/analytics/experiments")
+async def analytics_experiments(http_request: Request, experiment: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None):
+    """Per-arm latency, token usage and fallback rates of pipeline experiments."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(HistoryService.experiment_summary, experiment, since, until)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/admin/profiles")
+async def pipeline_profiles_status(http_request: Request):
+    """Active pipeline profiles and experiment (reloads the profiles file if it changed)."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    return await asyncio.to_thread(pipeline_profiles.status)
+
+@router.get("/admin/traces")
+async def recent_traces(http_request: Request, limit: int = 20):
+    """Slow and profiled /chat turns (newest first), plus event-loop lag and stalls."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    traces = list(profiling.recent_traces)[-max(1, min(limit, settings.TRACE_BUFFER_SIZE)):]
+    monitor = profiling.loop_monitor
+    return {
+        "status": "success",
+        "traces": [trace.to_dict(full=False) for trace in reversed(traces)],
+        "event_loop": monitor.snapshot() if monitor else None,
+    }
+
+@router.get("/admin/traces/{trace_id}")
+async def trace_detail(trace_id: str, http_request: Request):
+    """One trace with its stage timings and, if profiled, top frames and folded stacks."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    trace = profiling.find_trace(trace_id)
+    if trace is None:
+        return {"status": "error", "message": "Trace not found (fast unprofiled turns are not kept)"}
+    return {"status": "success", "data": trace.to_dict()}
+
+@router.get("/admin/retention")
+async def retention_progress(http_request: Request):
+    """Progress metrics of the current or last retention run."""
+    if not is_admin(http_request):
+        return {"status": "error", "message": "Admin token required"}
+    return retention_status
+
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     """
@@ -40,9 +233,36 @@ async def upload_document(file: UploadFile = File(...)):
         return {"status": "error", "message": str(e)}
 
 @router.post("/feedback")
-async def submit_feedback(request: FeedbackRequest):
-    return ChatService.submit_feedback(request.message, request.category, request.user_id)
+async def submit_feedback(request: FeedbackRequest, idempotency_key: Optional[str] = Header(None, max_length=200)):
+    """Queued through the outbox; send the same Idempotency-Key when retrying."""
+    try:
+        return await ChatService.submit_feedback(request.message, request.category, str(request.user_id) if request.user_id else None, idempotency_key)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/feedback/{feedback_id}")
+async def feedback_status(feedback_id: uuid.UUID):
+    """Delivery state of an acknowledged feedback id (queued / delivered / rejected)."""
+    try:
+        return await ChatService.submission_status("feedback_submissions", str(feedback_id))
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 @router.post("/ticket")
-async def submit_ticket(request: TicketRequest):
-    return ChatService.submit_ticket(request.model_dump(exclude_none=True))
+async def submit_ticket(request: TicketRequest, idempotency_key: Optional[str] = Header(None, max_length=200)):
+    """
+    Acknowledged with the ticket's id once it is durably queued; retries with the same Idempotency-Key get the same ticket.
+    The row may still be on its way; GET /ticket/{ticket_id} reports queued, delivered or rejected.
+    """
+    try:
+        return await ChatService.submit_ticket(request.model_dump(mode="json", exclude_none=True), idempotency_key)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.get("/ticket/{ticket_id}")
+async def ticket_status(ticket_id: uuid.UUID):
+    """Delivery state of an acknowledged ticket id; `rejected` means it was dead-lettered and will never exist."""
+    try:
+        return await ChatService.submission_status("support_tickets", str(ticket_id))
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
@@ -1,5 +1,10 @@
-from typing import Optional, List, Dict
-from pydantic import BaseModel
+from typing import Optional, List, Dict, Literal
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+# Mirror the support_tickets CHECK constraints, so bad input fails here instead of at the database
+TicketCategory = Literal["Technical", "Billing", "Feature", "General"]
+TicketPriority = Literal["Low", "Medium", "High", "Urgent"]
 
 class ChatRequest(BaseModel):
     message: str
@@ -9,13 +14,13 @@ class ChatRequest(BaseModel):
     history: Optional[List[Dict[str, str]]] = None
 
 class FeedbackRequest(BaseModel):
-    user_id: Optional[str] = None
-    message: str
+    user_id: Optional[UUID] = None
+    message: str = Field(min_length=1)
     category: str = "General"
 
 class TicketRequest(BaseModel):
-    user_id: Optional[str] = None
-    category: str
-    priority: str = "Medium"
-    subject: str
-    description: str
+    user_id: Optional[UUID] = None
+    category: TicketCategory
+    priority: TicketPriority = "Medium"
+    subject: str = Field(min_length=1)
+    description: str = Field(min_length=1)
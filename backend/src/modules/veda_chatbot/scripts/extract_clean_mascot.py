@@ -1,70 +1,35 @@
 
-import cv2
-import numpy as np
-from rembg import remove
-from PIL import Image
+import sys
+from pathlib import Path
 
-def refined_clean():
-    video_path = r"d:\LeadQ Chatbot\frontend\src\assets\chatbot-icon.webm"
-    output_path = r"d:\LeadQ Chatbot\frontend\src\assets\chatbot-mascot.png"
-    
-    cap = cv2.VideoCapture(video_path)
-    # Skip more frames to find a very clear pose (e.g. frame 30)
-    for _ in range(30):
-        cap.read()
-    success, frame = cap.read()
-    cap.release()
-    
-    if not success:
-        return
+# Shared helpers from the mascot media CLI (backend/scripts/mascot_media.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[4] / "scripts"))
+from mascot_media import read_frame, remove_background, cleanup_hsv, save_rgba
+
+FRAME_INDEX = 30  # A very clear pose
+
+
+def refined_clean(video_path: str, output_path: str, frame_index: int = FRAME_INDEX):
+    # Seek straight to the pose instead of reading and discarding earlier frames
+    frame_rgb = read_frame(video_path, frame_index)
 
-    # Convert to RGB
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    
     # 1. First pass: use rembg for general subject isolation
-    pil_img = Image.fromarray(frame_rgb)
     print("Initial AI isolation...")
-    isolated = remove(pil_img)
-    isolated_np = np.array(isolated)
-    
-    # 2. Second pass: aggressive checkerboard removal
-    # The checkerboard in the original is gray/white.
-    # We want to keep anything that is saturated (cyan) or very dark (black visor) 
-    # and be careful with white.
-    
-    # Convert isolated image to HSV to find saturation
-    hsv = cv2.cvtColor(isolated_np[:,:,:3], cv2.COLOR_RGB2HSV)
-    sat = hsv[:,:,1]
-    val = hsv[:,:,2]
-    
-    # Mask for high saturation (cyan) or high/low value (visor/body)
-    # Checkerboard is typically mid-gray (low saturation, mid value)
-    mask = np.ones(isolated_np.shape[:2], dtype=bool)
-    
-    # Identify checkerboard-like areas: Low saturation AND mid-level brightness
-    # (Checking for the specific gray of the checkerboard)
-    checker_gray = (sat < 30) & (val > 50) & (val < 250)
-    
-    # We apply this only to pixels that are NOT clearly part of the robot subject
-    # The subject has high saturation (cyan) OR very high brightness (white body) 
-    # OR very low brightness (visor).
-    subject_mask = (sat > 40) | (val > 252) | (val < 10)
-    
-    # Final alpha correction: make checkerboard pixels transparent
-    alpha = isolated_np[:,:,3]
-    alpha[checker_gray & ~subject_mask] = 0
-    
-    # 3. Clean up edges with a small erosion/dilation if needed
-    kernel = np.ones((2,2), np.uint8)
-    alpha = cv2.erode(alpha, kernel, iterations=1)
-    alpha = cv2.dilate(alpha, kernel, iterations=1)
-    
-    isolated_np[:,:,3] = alpha
-    
-    # 4. Save
-    result = Image.fromarray(isolated_np)
-    result.save(output_path)
+    isolated = remove_background(frame_rgb)
+
+    # 2. Second pass: aggressive checkerboard removal (low saturation, mid brightness),
+    #    keeping saturated cyan, the white body and the dark visor; small erode/dilate on edges
+    result = cleanup_hsv(isolated)
+
+    # 3. Save
+    save_rgba(result, output_path)
     print(f"Saved refined mascot to {output_path}")
 
+
 if __name__ == "__main__":
-    refined_clean()
+    # extract_clean_mascot.py VIDEO OUTPUT [FRAME_INDEX]
+    # (equivalent to `mascot_media.py frame VIDEO OUTPUT --index 30 --remove-bg --cleanup hsv`)
+    if len(sys.argv) < 3:
+        print("Usage: extract_clean_mascot.py VIDEO OUTPUT [FRAME_INDEX]")
+        sys.exit(1)
+    refined_clean(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else FRAME_INDEX)
@@ -7,86 +7,123 @@ Process chatbot mascot image - final combined approach:
 from PIL import Image
 import numpy as np
 import os
-from io import BytesIO
-from rembg import remove
+import sys
 from scipy import ndimage
 
 
 INPUT_PATH = r"C:\Users\DELL\.gemini\antigravity\brain\b3e6e785-f299-41b8-8b5b-e48939e79967\media__1772003147336.jpg"
 OUTPUT_PATH = r"d:\LeadQ Chatbot\frontend\src\assets\chatbot-mascot.png"
 
+GREEN = np.array([0, 177, 64], dtype=np.uint8)  # Standard green screen
+DILATE_STEP = 3
+MAX_EXPANSIONS = 8
+MIN_CLUSTER = 10
 
-def process_image(input_path, output_path):
-    img_orig = Image.open(input_path).convert("RGB")
-    orig_data = np.array(img_orig, dtype=np.float32)
-    h, w = orig_data.shape[:2]
-    
-    r, g, b = orig_data[:,:,0], orig_data[:,:,1], orig_data[:,:,2]
-    max_rgb = np.maximum(np.maximum(r, g), b)
-    min_rgb = np.minimum(np.minimum(r, g), b)
-    chroma = max_rgb - min_rgb
-    brightness = (r + g + b) / 3.0
-    
-    # Step 1: Replace checker with green screen  
-    print("Step 1: Replacing checker with green screen...")
-    modified = np.array(img_orig).copy()
-    green = np.array([0, 177, 64], dtype=np.uint8)  # Standard green screen
-    
-    # Pure gray checker: chroma < 25, brightness 40-210
-    pure_checker = (chroma < 25) & (brightness > 40) & (brightness < 210)
-    modified[pure_checker] = green
-    
-    # Tinted checker: chroma 25-80, and adjacent to pure checker
-    # Dilate pure checker mask progressively and fill tinted pixels
+
+def channel_stats(rgb):
+    """float32 chroma and brightness, computed once and shared by steps 1 and 3."""
+    r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    # Max/min on uint8 planes, then a single float32 cast
+    chroma = (np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)).astype(np.float32)
+    brightness = (r.astype(np.float32) + g + b) / 3.0
+    return chroma, brightness
+
+
+# Pixels reached by DILATE_STEP cross-shaped dilations: the L1 ball of that radius
+REACH = [(dy, dx) for dy in range(-DILATE_STEP, DILATE_STEP + 1) for dx in range(-DILATE_STEP, DILATE_STEP + 1)
+         if abs(dy) + abs(dx) <= DILATE_STEP]
+
+
+def fill_checker(chroma, brightness):
+    """
+    Step 1 mask: pure gray checker plus tinted checker pixels connected to it.
+    Only tinted candidates can be added, and they are usually a thin halo, so each
+    round tests just those pixels for a frontier pixel within reach instead of
+    dilating the whole image (same result as DILATE_STEP dilations per round).
+    A dense tinted area falls back to dilating the frontier.
+    """
+    candidates = (chroma < 80) & (brightness > 40) & (brightness < 210)
+    pure_checker = candidates & (chroma < 25)
     filled = pure_checker.copy()
-    for expansion in range(8):
-        near = ndimage.binary_dilation(filled, iterations=3)
-        # Tinted candidates: moderate chroma, not part of highly saturated robot parts
-        tinted = near & ~filled & (chroma < 80) & (brightness > 40) & (brightness < 210)
-        if tinted.sum() == 0:
+    ys, xs = np.nonzero(candidates & ~pure_checker)
+    if not len(ys):
+        return filled
+
+    if len(ys) * len(REACH) > filled.size:
+        remaining = candidates & ~pure_checker
+        frontier = filled.copy()
+        for _ in range(MAX_EXPANSIONS):
+            # Tinted candidates: moderate chroma, not part of highly saturated robot parts
+            tinted = ndimage.binary_dilation(frontier, iterations=DILATE_STEP) & remaining
+            if not tinted.any():
+                break
+            filled |= tinted
+            remaining &= ~tinted
+            frontier = tinted
+        return filled
+
+    # Frontier padded by the reach, so neighbour lookups never leave the array
+    frontier = np.pad(filled, DILATE_STEP)
+    ys, xs = ys + DILATE_STEP, xs + DILATE_STEP
+    for _ in range(MAX_EXPANSIONS):
+        hit = np.zeros(len(ys), dtype=bool)
+        for dy, dx in REACH:
+            hit |= frontier[ys + dy, xs + dx]
+        if not hit.any():
             break
-        filled |= tinted
-        modified[tinted] = green
-    
+        frontier[:] = False
+        frontier[ys[hit], xs[hit]] = True
+        filled[ys[hit] - DILATE_STEP, xs[hit] - DILATE_STEP] = True
+        ys, xs = ys[~hit], xs[~hit]
+    return filled
+
+
+def drop_checker_clusters(result, chroma, brightness):
+    """Step 3: clear alpha on surviving gray-checker clusters of MIN_CLUSTER+ pixels in one pass."""
+    opaque = result[:, :, 3] > 128
+    remaining_checker = opaque & (chroma < 30) & (brightness > 40) & (brightness < 190)
+    labeled, num = ndimage.label(remaining_checker)
+    if num:
+        sizes = np.bincount(labeled.ravel(), minlength=num + 1)
+        drop = sizes >= MIN_CLUSTER
+        drop[0] = False
+        result[drop[labeled], 3] = 0
+    return remaining_checker
+
+
+def clean_checker(image_rgb, session=None):
+    """Isolate the mascot from a checkerboard background; returns the cropped RGBA array."""
+    orig = np.ascontiguousarray(np.asarray(image_rgb)[:, :, :3], dtype=np.uint8)
+    h, w = orig.shape[:2]
+    chroma, brightness = channel_stats(orig)
+
+    # Step 1: Replace checker with green screen
+    print("Step 1: Replacing checker with green screen...")
+    filled = fill_checker(chroma, brightness)
+    modified = orig.copy()
+    modified[filled] = GREEN
     print(f"  Total pixels replaced with green: {filled.sum()}")
-    
-    # Step 2: Run rembg
+
+    # Step 2: Run rembg (arrays in, arrays out - no PNG encode/decode round trip)
     print("Step 2: Running rembg...")
-    buf = BytesIO()
-    Image.fromarray(modified).save(buf, format="PNG")
-    buf.seek(0)
-    rembg_output = remove(buf.read())
-    result_img = Image.open(BytesIO(rembg_output)).convert("RGBA")
-    result = np.array(result_img)
-    
+    from rembg import remove  # Imported here so the cleanup steps can be benchmarked without the model
+    result = np.array(remove(modified, session=session))
+
     # Step 3: Post-process - remove remaining checker and green artifacts
     print("Step 3: Post-processing...")
-    r_r, g_r, b_r, a_r = result[:,:,0].astype(float), result[:,:,1].astype(float), result[:,:,2].astype(float), result[:,:,3]
-    
+    r_r, g_r, b_r = (result[:, :, c].astype(np.int16) for c in range(3))
+
     # Remove green remnants
-    is_green = (g_r > r_r + 30) & (g_r > b_r + 30) & (g_r > 100) & (a_r > 0)
+    is_green = (g_r > r_r + 30) & (g_r > b_r + 30) & (g_r > 100) & (result[:, :, 3] > 0)
     result[is_green, 3] = 0
-    
+
     # Remove any remaining gray checker pixels that survived
-    opaque = result[:,:,3] > 128
-    orig_at_surviving = orig_data.copy()
-    r_o, g_o, b_o = orig_at_surviving[:,:,0], orig_at_surviving[:,:,1], orig_at_surviving[:,:,2]
-    max_o = np.maximum(np.maximum(r_o, g_o), b_o)
-    min_o = np.minimum(np.minimum(r_o, g_o), b_o)
-    chroma_o = max_o - min_o
-    bright_o = (r_o + g_o + b_o) / 3.0
-    
-    remaining_checker = opaque & (chroma_o < 30) & (bright_o > 40) & (bright_o < 190)
-    # Only remove if they're in a cluster (avoid removing single pixels on robot)
-    labeled, num = ndimage.label(remaining_checker)
-    for i in range(1, num + 1):
-        region = labeled == i
-        if region.sum() >= 10:  # Only remove clusters of 10+
-            result[region, 3] = 0
-    
+    # (only in clusters, to avoid removing single pixels on the robot)
+    remaining_checker = drop_checker_clusters(result, chroma, brightness)
+
     remaining_removed = np.sum(result[remaining_checker, 3] == 0)
     print(f"  Green remnants: {is_green.sum()}, remaining checker clusters: {remaining_removed}")
-    
+
     # Step 4: Crop to content + padding
     print("Step 4: Cropping...")
     alpha = result[:,:,3]
@@ -94,21 +131,25 @@ def process_image(input_path, output_path):
     cols = np.any(alpha > 0, axis=0)
     rmin, rmax = np.where(rows)[0][[0, -1]]
     cmin, cmax = np.where(cols)[0][[0, -1]]
-    
+
     # Add 10px padding
     pad = 10
     rmin = max(0, rmin - pad)
     rmax = min(h - 1, rmax + pad)
     cmin = max(0, cmin - pad)
     cmax = min(w - 1, cmax + pad)
-    
-    cropped = result[rmin:rmax+1, cmin:cmax+1]
-    
+
+    return result[rmin:rmax+1, cmin:cmax+1]
+
+
+def process_image(input_path, output_path):
+    cropped = clean_checker(np.array(Image.open(input_path).convert("RGB")))
+
     # Save
     output_img = Image.fromarray(cropped, "RGBA")
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     output_img.save(output_path, "PNG", optimize=True)
-    
+
     total = cropped.shape[0] * cropped.shape[1]
     transparent = np.sum(cropped[:,:,3] == 0)
     print(f"\nSaved to: {output_path}")
@@ -117,4 +158,9 @@ def process_image(input_path, output_path):
 
 
 if __name__ == "__main__":
-    process_image(INPUT_PATH, OUTPUT_PATH)
+    # Optional: process_chatbot_icon.py [input] [output]
+    # (also available as `mascot_media.py image --cleanup checker`)
+    process_image(
+        sys.argv[1] if len(sys.argv) > 1 else INPUT_PATH,
+        sys.argv[2] if len(sys.argv) > 2 else OUTPUT_PATH,
+    )
@@ -1,42 +1,46 @@
+import array
+import asyncio
+import hashlib
+import json
 import os
 import time
 import uuid
-import json
+from datetime import datetime, timezone
 import random
 import threading
 import re
-from typing import Optional, List, Dict, Any, AsyncGenerator
+from typing import Optional, List, Dict, Any, AsyncGenerator, Awaitable, Callable
 
 from openai import AsyncOpenAI
 from supabase import Client
 
+from src.core.cache import get_cache
+from src.core.circuit import CircuitOpenError, get_breaker
 from src.core.config import settings
 from src.core.database import get_supabase
-
-# --- Greeting Detection ---
-GREETING_PATTERNS = [
-    r"^\s*(hi|hello|hey|hiya|howdy|hola|namaste)\s*[!.?\U0001f44b]*\s*$",
-    r"^\s*(good\s*(morning|afternoon|evening|day|night))\s*[!.?]*\s*$",
-    r"^\s*(what'?s\s*up|sup|yo|greetings)\s*[!.?]*\s*$",
-    r"^\s*(hi\s+there|hello\s+there|hey\s+there)\s*[!.?\U0001f44b]*\s*$",
-]
-GREETING_COMPILED = [re.compile(p, re.IGNORECASE) for p in GREETING_PATTERNS]
-
-THANK_YOU_PATTERNS = [
-    r"^\s*(thanks|thank\s*you|thankyou|ty|thx|thank\s*u|thanks\s*a\s*lot|thank\s*you\s*so\s*much)\s*[!.?]*\s*$",
-]
-THANK_YOU_COMPILED = [re.compile(p, re.IGNORECASE) for p in THANK_YOU_PATTERNS]
-
-GREETING_RESPONSES = [
-    "Hi there! \U0001f44b Welcome to LeadQ! I'm **Veda**, your AI assistant. I'm here to help you with anything related to our platform \u2014 features, setup, integrations, automation, and more.\n\nWhat would you like to explore today?",
-    "Hello! \U0001f60a Welcome to LeadQ! I'm **Veda**, and I'm here to make your experience seamless. Whether you need help with contact capture, meeting intelligence, email automation, or anything else \u2014 just ask!\n\nHow can I help you today?",
-    "Hey! \U0001f44b Great to see you here! I'm **Veda**, your LeadQ assistant. I can help you with features, setup, VocalQ voice agent, Chrome extension, and much more.\n\nWhat would you like to know?",
-]
-
-THANK_YOU_RESPONSES = [
-    "You're welcome! \U0001f60a I'm always here if you need more help with LeadQ. Is there anything else you'd like to explore?",
-    "Happy to help! \U0001f64c Feel free to ask me anything else about LeadQ anytime. What else can I assist you with?",
-]
+from src.core.profiling import RequestTrace
+from src.modules.veda_chatbot.context import format_context, select_context
+from src.modules.veda_chatbot.frames import encode_stream
+from src.modules.veda_chatbot.outbox import PayloadConflict, fingerprint, outbox, record_id
+from src.modules.veda_chatbot.profiles import PipelineProfile, profiles as pipeline_profiles
+from src.modules.veda_chatbot.prompts import PROMPT_VERSION, build_messages, usage_meta
+from src.modules.veda_chatbot.recommendations import RecommendationEngine
+from src.modules.veda_chatbot.smalltalk import SMALL_TALK_REPLIES, classify_small_talk, normalize_message
+
+REC_MARKER = "###REC###"  # Legacy follow-up suffix; still held back and stripped if the model emits one
+DISCONNECT_POLL_SECONDS = 0.25
+
+# Model / retrieval parameters shared by /chat and the batch answering CLI. Per-turn values
+# come from the session's pipeline profile (profiles.py); these are the "default" profile's.
+EMBEDDING_MODEL = "text-embedding-3-small"
+_DEFAULT_PROFILE = PipelineProfile()
+CHAT_MODEL = _DEFAULT_PROFILE.chat_model
+MAX_ANSWER_TOKENS = _DEFAULT_PROFILE.max_tokens
+MATCH_THRESHOLD = _DEFAULT_PROFILE.match_threshold
+MATCH_COUNT = _DEFAULT_PROFILE.match_count
+
+# In-flight /chat generations per session, so a regenerate can supersede the previous one
+_inflight_generations: Dict[str, asyncio.Task] = {}
 
 # --- Knowledge Base (Merged & Expanded with Product Documentation) ---
 KNOWLEDGE_BASE = {
@@ -98,6 +102,9 @@ KNOWLEDGE_BASE = {
     }
 }
 
+# Follow-up chips are ranked locally from the KB's marketing links and click-through history
+recommender = RecommendationEngine(KNOWLEDGE_BASE)
+
 
 class ChatService:
     @staticmethod
@@ -110,26 +117,14 @@ class ChatService:
     def log_interaction_to_db(session_id: str, user_id: Optional[str], user_message: str, assistant_response: str, recommendations: List[str], meta: Dict[str, Any]):
         def _log():
             supabase = get_supabase()
+            if supabase is None:
+                return
             try:
-                # Upsert Session
-                supabase.table("chat_sessions").upsert({"id": session_id, "user_id": user_id}).execute()
-                
-                # Log User Message
-                supabase.table("chat_messages").insert({
-                    "session_id": session_id,
-                    "role": "user",
-                    "content": user_message
-                }).execute()
-
-                # Log Assistant Message
-                supabase.table("chat_messages").insert({
-                    "session_id": session_id,
-                    "role": "assistant",
-                    "content": assistant_response,
-                    "recommendations": recommendations,
-                    "meta": meta
-                }).execute()
+                with get_breaker("supabase_log").guard():
+                    ChatService._insert_interaction(supabase, session_id, user_id, user_message, assistant_response, recommendations, meta)
                 print(f"[{time.time()}] Logged interaction to Supabase.")
+            except CircuitOpenError as e:
+                print(f"DB Log skipped: {e}")
             except Exception as e:
                 print(f"DB Log Error: {e}")
                 
@@ -137,205 +132,307 @@ class ChatService:
         thread = threading.Thread(target=_log)
         thread.start()
 
+    @staticmethod
+    def _insert_interaction(supabase: Client, session_id: str, user_id: Optional[str], user_message: str, assistant_response: str, recommendations: List[str], meta: Dict[str, Any]):
+        # Upsert Session (bumps last_active_at so retention only archives idle sessions)
+        supabase.table("chat_sessions").upsert({
+            "id": session_id,
+            "user_id": user_id,
+            "last_active_at": datetime.now(timezone.utc).isoformat()
+        }).execute()
+
+        # Log User Message
+        supabase.table("chat_messages").insert({
+            "session_id": session_id,
+            "role": "user",
+            "content": user_message
+        }).execute()
+
+        # Log Assistant Message
+        supabase.table("chat_messages").insert({
+            "session_id": session_id,
+            "role": "assistant",
+            "content": assistant_response,
+            "recommendations": recommendations,
+            "meta": meta
+        }).execute()
+
+    @staticmethod
+    def match_documents(query_embedding: List[float], match_threshold: float = MATCH_THRESHOLD, match_count: int = MATCH_COUNT, filter_source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top document chunks for an embedding, optionally from one source (blocking; call via asyncio.to_thread)."""
+        supabase = get_supabase()
+        if supabase is None:
+            return []
+        params = {
+            "query_embedding": query_embedding,
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter_source": filter_source,
+            "ef_search": settings.RAG_EF_SEARCH
+        }
+        function = "match_documents"
+        if settings.EMBEDDING_QUANTIZATION in ("half", "binary"):
+            # Candidates come from the compact index, then are rescored at full precision in SQL
+            function = "match_documents_quantized"
+            params["quantization"] = settings.EMBEDDING_QUANTIZATION
+            params["candidates"] = max(settings.RAG_RESCORE_CANDIDATES, match_count)
+        with get_breaker("supabase_rpc").guard():
+            rpc_response = supabase.rpc(function, params).execute()
+        return rpc_response.data or []
+
+    @staticmethod
+    async def embed_query(client: AsyncOpenAI, message: str) -> List[float]:
+        """Query embedding, cached across workers (repeat questions skip the OpenAI round trip)."""
+        async def _create() -> bytes:
+            # Open breaker raises CircuitOpenError -> straight to the no-context path
+            async with get_breaker("openai_embeddings").guard():
+                response = await client.embeddings.create(
+                    input=message,
+                    model=EMBEDDING_MODEL,
+                    **ChatService.embedding_options()
+                )
+            return array.array("f", response.data[0].embedding).tobytes()
+
+        if settings.EMBEDDING_CACHE_TTL <= 0:
+            return array.array("f", await _create()).tolist()
+        text = " ".join(message.split())
+        key = hashlib.sha1(f"{EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSIONS}:{text}".encode("utf-8")).hexdigest()
+        packed = await get_cache("embeddings").get_or_set(key, _create, ttl=settings.EMBEDDING_CACHE_TTL)
+        return array.array("f", packed).tolist()
+
+    @staticmethod
+    def embedding_options() -> Dict[str, Any]:
+        """Extra embeddings.create arguments; must match the dimension of the stored vectors."""
+        if settings.EMBEDDING_DIMENSIONS < 1536:
+            return {"dimensions": settings.EMBEDDING_DIMENSIONS}
+        return {}
+
     @staticmethod
     def _is_greeting(message: str) -> bool:
         """Detect if the message is a simple greeting."""
-        clean = message.strip()
-        for pattern in GREETING_COMPILED:
-            if pattern.match(clean):
-                return True
-        return False
+        return classify_small_talk(normalize_message(message)) == "greeting"
 
     @staticmethod
     def _is_thank_you(message: str) -> bool:
         """Detect if the message is a thank-you."""
-        clean = message.strip()
-        for pattern in THANK_YOU_COMPILED:
-            if pattern.match(clean):
-                return True
-        return False
+        return classify_small_talk(normalize_message(message)) == "thanks"
 
     @staticmethod
-    async def chat_generator(message: str, session_id: str, user_id: Optional[str], regenerate: bool = False, history: Optional[List[Dict[str, str]]] = None) -> AsyncGenerator[str, None]:
+    async def chat_generator(message: str, session_id: str, user_id: Optional[str], regenerate: bool = False, history: Optional[List[Dict[str, str]]] = None, encoding: Optional[str] = None, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None, trace_id: Optional[str] = None, profile: bool = False) -> AsyncGenerator[bytes, None]:
+        """
+        NDJSON byte stream for `/chat` (coalesced, optionally compressed).
+        Generation runs in its own task so a client disconnect, or a regenerate
+        for the same session, cancels the upstream embedding/RPC/completion calls.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def _produce():
+            try:
+                async for frame in ChatService.chat_frames(message, session_id, user_id, regenerate, history, trace_id, profile):
+                    await queue.put(frame)
+            except Exception as e:
+                print(f"Chat generation error: {e}")
+            finally:
+                queue.put_nowait(done)
+
+        async def _frames():
+            while True:
+                frame = await queue.get()
+                if frame is done:
+                    return
+                yield frame
+
+        async def _watch_disconnect():
+            while not producer.done():
+                if await is_disconnected():
+                    print(f"[{time.time()}] Client disconnected, cancelling generation ({session_id}).")
+                    producer.cancel()
+                    return
+                await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+        if regenerate:
+            previous = _inflight_generations.get(session_id)
+            if previous is not None and not previous.done():
+                previous.cancel()
+
+        producer = asyncio.create_task(_produce())
+        _inflight_generations[session_id] = producer
+        watcher = asyncio.create_task(_watch_disconnect()) if is_disconnected else None
+        try:
+            async for data in encode_stream(_frames(), encoding):
+                yield data
+        finally:
+            producer.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            if _inflight_generations.get(session_id) is producer:
+                del _inflight_generations[session_id]
+
+    @staticmethod
+    async def chat_frames(message: str, session_id: str, user_id: Optional[str], regenerate: bool = False, history: Optional[List[Dict[str, str]]] = None, trace_id: Optional[str] = None, profile: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Frame stream for one chat turn.
+        If the consumer goes away before the `meta` frame, the partial answer is
+        logged with `truncated: true` instead of the full interaction.
+        Stage timings go to a RequestTrace (kept if slow); `profile` also samples the loop's stack.
+        """
+        turn = {"request_start": time.time(), "source": "kb-match", "trace": RequestTrace("chat", trace_id, profile, session_id=session_id)}
+        delivered = []
+        recommendations = []
+        completed = False
+        try:
+            async for frame in ChatService._turn_frames(turn, message, session_id, user_id, regenerate, history):
+                if frame["type"] == "content":
+                    delivered.append(frame["chunk"])
+                elif frame["type"] == "recommendations":
+                    recommendations = frame["data"]
+                elif frame["type"] == "meta":
+                    completed = True
+                yield frame
+        except (asyncio.CancelledError, GeneratorExit):
+            if not completed:
+                print(f"[{time.time()}] Generation cancelled ({session_id}), logging truncated turn.")
+                ChatService.log_interaction_to_db(
+                    session_id, user_id, message, "".join(delivered), recommendations,
+                    {"latency_ms": (time.time() - turn["request_start"]) * 1000, "source": turn["source"], "truncated": True, **ChatService._turn_meta(turn)}
+                )
+            raise
+        finally:
+            turn["trace"].finish(source=turn["source"], completed=completed, profile=turn.get("profile", {}).get("profile"))
+
+    @staticmethod
+    async def _turn_frames(turn: Dict[str, Any], message: str, session_id: str, user_id: Optional[str], regenerate: bool = False, history: Optional[List[Dict[str, str]]] = None) -> AsyncGenerator[Dict[str, Any], None]:
         client = ChatService.get_openai_client()
-        request_start = time.time()
+        request_start = turn["request_start"]
+        trace = turn["trace"]
         print(f"[{request_start}] Incoming chat request: {message}")
         
-        user_message_clean = message.lower().strip()
+        user_message_clean = normalize_message(message)
         full_response_text = ""
         recommendations = []
         source = "kb-match"
         found_match = False
         
-        yield json.dumps({"type": "status", "chunk": "thinking"}) + "\n"
+        yield {"type": "status", "chunk": "thinking"}
         
-        # --- 0. Greeting & Thank You Detection (instant response, no RAG needed) ---
-        if not regenerate:
-            if ChatService._is_thank_you(message):
-                full_response_text = random.choice(THANK_YOU_RESPONSES)
-                recommendations = [
-                    "What features does LeadQ offer?",
-                    "How does VocalQ voice agent work?",
-                    "Tell me about pricing plans"
-                ]
-                source = "greeting"
-                found_match = True
-                yield json.dumps({"type": "content", "chunk": full_response_text}) + "\n"
-                yield json.dumps({"type": "recommendations", "data": recommendations}) + "\n"
-                yield json.dumps({"type": "meta", "sessionId": session_id}) + "\n"
-                ChatService.log_interaction_to_db(
-                    session_id, user_id, message, full_response_text, recommendations,
-                    {"latency_ms": (time.time() - request_start) * 1000, "source": source}
-                )
-                return
-
-            if ChatService._is_greeting(message):
-                full_response_text = random.choice(GREETING_RESPONSES)
-                recommendations = [
-                    "What can LeadQ do for me?",
-                    "How do I get started with LeadQ?",
-                    "Tell me about LeadQ pricing"
-                ]
-                source = "greeting"
-                found_match = True
-                yield json.dumps({"type": "content", "chunk": full_response_text}) + "\n"
-                yield json.dumps({"type": "recommendations", "data": recommendations}) + "\n"
-                yield json.dumps({"type": "meta", "sessionId": session_id}) + "\n"
-                ChatService.log_interaction_to_db(
-                    session_id, user_id, message, full_response_text, recommendations,
-                    {"latency_ms": (time.time() - request_start) * 1000, "source": source}
-                )
-                return
+        # --- 0. Small-talk Detection (greetings, thanks, goodbyes...: instant response, no RAG needed) ---
+        small_talk = None if regenerate else classify_small_talk(user_message_clean, history)
+        if small_talk:
+            reply = SMALL_TALK_REPLIES[small_talk]
+            full_response_text = random.choice(reply["responses"])
+            recommendations = list(reply["recommendations"])
+            source = turn["source"] = "greeting" if small_talk == "greeting" else f"small-talk:{small_talk}"
+            found_match = True
+            yield {"type": "content", "chunk": full_response_text}
+            yield {"type": "recommendations", "data": recommendations}
+            yield {"type": "meta", "sessionId": session_id}
+            ChatService.log_interaction_to_db(
+                session_id, user_id, message, full_response_text, recommendations,
+                {"latency_ms": (time.time() - request_start) * 1000, "source": source, "small_talk": small_talk}
+            )
+            return
+
+        # Runtime-tunable parameters; sticky per session when an experiment is running
+        profile, turn["profile"] = pipeline_profiles.assign(session_id)
 
         # 1. RAG Search (Context from both RAG Knowledge Base + Product Documentation)
         context_text = ""
+        context_chunks = []
         if client:
             try:
-                supabase = get_supabase()
-                embedding_response = await client.embeddings.create(
-                    input=message,
-                    model="text-embedding-3-small"
-                )
-                query_embedding = embedding_response.data[0].embedding
-
-                rpc_response = supabase.rpc("match_documents", {
-                    "query_embedding": query_embedding,
-                    "match_threshold": 0.72,  # Broader coverage for product docs + RAG
-                    "match_count": 4  # More chunks for richer context from both sources
-                }).execute()
-
-                if rpc_response.data:
-                    context_chunks = [item['content'] for item in rpc_response.data]
-                    context_text = "\n\n---\n\n".join(context_chunks)
-                    print(f"[{time.time()}] RAG context found ({len(context_chunks)} chunks).")
+                with trace.stage("embed"):
+                    query_embedding = await ChatService.embed_query(client, message)
+
+                # Blocking client call runs off the loop so it can be abandoned on cancel.
+                # Over-fetch, then dedupe / diversify / budget before anything reaches the prompt.
+                with trace.stage("retrieve"):
+                    candidates = await asyncio.to_thread(ChatService.match_documents, query_embedding, profile.match_threshold, profile.rag_candidates)
+                if candidates:
+                    with trace.stage("select_context"):
+                        # Off the loop: tokenizing (and a tokenizer still loading) must not stall other requests
+                        context_chunks, turn["context"] = await asyncio.to_thread(select_context, candidates, profile.match_count, token_budget=profile.context_tokens)
+                        context_text = format_context(context_chunks)
+                    print(f"[{time.time()}] RAG context found ({len(context_chunks)} of {len(candidates)} chunks, {turn['context']['tokens']} tokens).")
             except Exception as e:
                 print(f"RAG Error: {e}")
 
-        # 2. Build enhanced system prompt with domain restriction & conversational behavior
-        base_personality = """You are **Veda**, LeadQ's warm, friendly, and knowledgeable AI assistant.
-
-CORE IDENTITY:
-- You ONLY answer questions related to LeadQ.ai - the sales intelligence platform.
-- You are NOT a general-purpose AI. You do not answer questions about weather, sports, politics, coding, math, history, or any topic unrelated to LeadQ.
-- If a question is clearly outside the LeadQ domain, respond with: "I appreciate your curiosity! However, I'm specifically designed to assist with **LeadQ.ai** - our sales intelligence platform. I can help you with contact capture, meeting intelligence, email automation, VocalQ voice agent, Chrome extension, pricing, and much more. How can I help you with LeadQ today?"
-- NEVER make up features or capabilities that are not documented. Only reference actual LeadQ features.
-
-CRITICAL - FEATURES NOT YET AVAILABLE (DO NOT MENTION AS AVAILABLE):
-- **CRM Integrations** are NOT yet implemented. Do NOT mention Salesforce, HubSpot, Zoho, Pipedrive, or any CRM as a supported integration. If asked about CRM, say: "CRM integrations are on our roadmap and coming soon! Currently, LeadQ supports integrations with Google Calendar, Gmail, Zapier, VocalQ, and our Chrome Extension. Would you like to know more about any of these?"
-- **WhatsApp Integration** is NOT yet implemented. Do NOT mention WhatsApp as a supported feature. If asked about WhatsApp, say: "WhatsApp integration is planned for a future update! Right now, you can follow up with contacts via email automation and VocalQ voice calls. Want to learn more about those?"
-- Even if the provided Context mentions CRM or WhatsApp, do NOT present them as currently available features.
-
-CONVERSATIONAL STYLE:
-- Be warm, friendly, and professional - never robotic or overly formal.
-- Acknowledge the user's query naturally before answering (e.g., "Great question!" or "Absolutely!").
-- Use short paragraphs and bullet points for clarity.
-- Use **bold** for key terms, feature names, and important information.
-- Use relevant emojis sparingly to add warmth.
-- ALWAYS end your response with a contextual follow-up question that encourages deeper product exploration.
-- Keep responses concise but comprehensive - aim for 3-6 short paragraphs or bullet sections.
-
-ANSWER QUALITY:
-- Provide precise, feature-aligned answers reflecting actual LeadQ capabilities.
-- When explaining a feature, include: what it does, key benefits, and how to access it.
-- Reference specific UI paths where helpful (e.g., "Go to Settings > Integrations").
-- If a feature has pricing implications, mention the relevant plan tier.
-
-FOLLOW-UP QUESTIONS:
-- After your answer, ALWAYS suggest exactly 3 UNIQUE follow-up questions.
-- Format them on a new line as: ###REC###Question one?|Question two?|Question three?
-- Each must be SPECIFIC to a LeadQ feature and contextually related to the user's question.
-- Avoid generic suggestions like "Tell me more" - be specific like "How does VocalQ handle call objections?"
-- Each question must be DIFFERENT from the others and from the user's original message."""
-
+        # 2. Messages: byte-stable system prefix first, variable context and history after it
         if client:
-            if context_text:
-                source = "rag-openai"
-                system_prompt = f"""{base_personality}
-
-CONTEXT FROM LEADQ DOCUMENTATION:
-{context_text}
-
-ANSWER PRIORITY:
-1. Use the Context above as your PRIMARY source of truth.
-2. If the Context covers the topic, provide a clear, structured response based on it.
-3. If the Context partially covers it, supplement with your knowledge of LeadQ features.
-4. If the Context doesn't cover it and it's about LeadQ, provide your best knowledge about LeadQ.
-5. If it's NOT about LeadQ at all, politely redirect to LeadQ topics.
-"""
-            else:
-                source = "llm-openai-fallback"
-                system_prompt = f"""{base_personality}
-
-IMPORTANT: No documentation context was found for this query.
-- If the question is about LeadQ: Answer based on your knowledge of LeadQ's features (contact capture, business card scanning, profile enrichment, meeting intelligence, email automation, VocalQ voice agent, Chrome extension, pricing, security).
-- If the question is NOT about LeadQ: Politely redirect to LeadQ topics.
-- Do NOT invent features or make assumptions beyond documented capabilities.
-"""
-            
-            # Prepare conversation history for LLM
-            messages_payload = [{"role": "system", "content": system_prompt}]
-            if history:
-                # Add last 6 messages for richer conversational context
-                for h in history[-6:]:
-                    messages_payload.append({"role": h["role"], "content": h["content"]})
-            
-            # Add current message
-            messages_payload.append({"role": "user", "content": message})
-
+            source = turn["source"] = "rag-openai" if context_text else "llm-openai-fallback"
+            messages_payload = build_messages(message, context_text, history, profile.history_window)
+            turn["llm"] = {"prompt_version": PROMPT_VERSION, "model": profile.chat_model}
+
+            # Follow-ups depend only on the question and its context, so they go out before the answer
+            previous_questions = [h["content"] for h in history or [] if h.get("role") == "user"]
+            with trace.stage("recommend"):
+                recommendations = recommender.recommend(message, context_text, context_chunks, exclude=previous_questions)
+            yield {"type": "recommendations", "data": recommendations}
+
+            emitted = []
+            raw_parts = None
+            completion_breaker = get_breaker("openai_chat")
+            generation = trace.start("generate")
             try:
-                completion = await client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages_payload,
-                    temperature=0.7 if regenerate else 0.3,
-                    max_tokens=500,
-                    top_p=0.9
-                )
-                full_raw_response = completion.choices[0].message.content
-                
-                # Parse Response and Recommendations
-                if "###REC###" in full_raw_response:
-                    parts = full_raw_response.split("###REC###")
-                    full_response_text = parts[0].strip()
-                    rec_string = parts[1].strip()
-                    raw_recs = [r.strip() for r in rec_string.split("|") if r.strip()]
-                    
-                    # Deduplicate recommendations
-                    seen = set()
-                    recommendations = []
-                    for r in raw_recs:
-                        r_lower = r.lower().strip("?. ")
-                        if r_lower not in seen:
-                            seen.add(r_lower)
-                            recommendations.append(r)
-                else:
-                    full_response_text = full_raw_response
-                    recommendations = ["What features does LeadQ offer?", "How does VocalQ voice agent work?", "Tell me about LeadQ pricing plans"]
-                
-                yield json.dumps({"type": "content", "chunk": full_response_text}) + "\n"
-                yield json.dumps({"type": "recommendations", "data": recommendations}) + "\n"
+                # Streamed so a cancelled turn closes the upstream request and stops generation
+                # (an open breaker skips straight to the static KB fallback below)
+                async with completion_breaker.guard():
+                    stream = await client.chat.completions.create(
+                        model=profile.chat_model,
+                        messages=messages_payload,
+                        temperature=profile.regenerate_temperature if regenerate else profile.temperature,
+                        max_tokens=profile.max_tokens,
+                        top_p=profile.top_p,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                raw_parts = []
+                pending = ""
+                rec_started = False
+                async with stream:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            # Final chunk (no choices) carries token usage incl. prompt-cache hits
+                            turn["llm"].update(usage_meta(chunk.usage))
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not raw_parts:
+                            turn["llm"]["first_token_ms"] = round((time.time() - request_start) * 1000, 1)
+                            trace.mark("first_token")
+                        raw_parts.append(delta)
+                        if rec_started:
+                            continue
+                        pending += delta
+                        if REC_MARKER in pending:
+                            rec_started = True
+                            safe = pending.split(REC_MARKER, 1)[0].rstrip()
+                        else:
+                            # Hold back anything that could be the start of the marker
+                            cut = len(pending) - (len(REC_MARKER) - 1)
+                            safe = pending[:cut] if cut > 0 else ""
+                        pending = pending[len(safe):] if not rec_started else ""
+                        if not emitted:
+                            safe = safe.lstrip()
+                        if safe:
+                            emitted.append(safe)
+                            yield {"type": "content", "chunk": safe}
+                if not rec_started and pending.rstrip():
+                    tail = pending.rstrip() if emitted else pending.strip()
+                    emitted.append(tail)
+                    yield {"type": "content", "chunk": tail}
+                full_response_text = "".join(emitted)
                 found_match = True
             except Exception as e:
                 print(f"OpenAI Generation Error: {e}")
+                if raw_parts is not None:
+                    # Failed mid-stream, after the breaker already recorded the request as opened fine
+                    completion_breaker.record_failure(e)
+                if emitted:
+                    # Part of the answer already reached the client; finish it rather than append a fallback
+                    full_response_text = "".join(emitted)
+                    found_match = True
+            generation.end()
 
         # 3. Static KB Pattern Matching (Final Fallback if LLM fails)
         if not found_match and not regenerate:
@@ -351,42 +448,95 @@ IMPORTANT: No documentation context was found for this query.
                 print(f"[{time.time()}] Static match found: {best_topic}")
                 full_response_text = KNOWLEDGE_BASE[best_topic]["answer"]
                 recommendations = KNOWLEDGE_BASE[best_topic]["marketing_links"]
-                source = "kb-pattern"
+                source = turn["source"] = "kb-pattern"
                 found_match = True
                 
-                yield json.dumps({"type": "content", "chunk": full_response_text}) + "\n"
-                yield json.dumps({"type": "recommendations", "data": recommendations}) + "\n"
+                yield {"type": "content", "chunk": full_response_text}
+                yield {"type": "recommendations", "data": recommendations}
 
         if not found_match:
-            # Even the fallback stays on-brand and helpful
+            # Even the fallback stays on-brand and helpful (its own source, so fallback rates count it)
+            source = turn["source"] = "error-fallback"
             error_msg = "I'm having a little trouble finding the right info for that. But I'm here to help with anything about **LeadQ**! You can ask me about contact capture, meeting intelligence, VocalQ, email automation, pricing, or any other feature.\n\nWhat would you like to know?"
-            yield json.dumps({"type": "content", "chunk": error_msg}) + "\n"
+            yield {"type": "content", "chunk": error_msg}
             full_response_text = error_msg
             recommendations = ["What features does LeadQ offer?", "How do I get started with LeadQ?", "Tell me about LeadQ pricing plans"]
-            yield json.dumps({"type": "recommendations", "data": recommendations}) + "\n"
+            yield {"type": "recommendations", "data": recommendations}
 
         # 4. Log to DB
-        yield json.dumps({"type": "meta", "sessionId": session_id}) + "\n"
+        yield {"type": "meta", "sessionId": session_id}
         ChatService.log_interaction_to_db(
             session_id, user_id, message, full_response_text, recommendations, 
-            {"latency_ms": (time.time() - request_start) * 1000, "source": source}
+            {"latency_ms": (time.time() - request_start) * 1000, "source": source, **ChatService._turn_meta(turn)}
         )
 
     @staticmethod
-    def submit_feedback(message: str, category: str, user_id: Optional[str]):
-        supabase = get_supabase()
-        supabase.table("feedback_submissions").insert({
-            "message": message,
-            "category": category,
-            "user_id": user_id
-        }).execute()
-        return {"status": "success"}
+    def _turn_meta(turn: Dict[str, Any]) -> Dict[str, Any]:
+        """Profile / experiment arm, token usage and the selected context (what the answer was grounded on)."""
+        meta = {**turn.get("profile", {}), **turn.get("llm", {})}
+        if "context" in turn:
+            meta["context"] = turn["context"]
+        return meta
 
     @staticmethod
-    def submit_ticket(data: Dict[str, Any]):
+    async def _submit_once(table: str, data: Dict[str, Any], idempotency_key: Optional[str]) -> Dict[str, Any]:
+        """
+        Queue one row through the outbox under a stable id.
+        A retry with the same Idempotency-Key gets the same id back instead of a second row;
+        reusing the key for a different payload is refused. Concurrent requests with one key
+        are serialized by a cache lock, so only one of them queues the row.
+        """
+        record = record_id(table, idempotency_key or uuid.uuid4().hex, data.get("user_id"))
+        digest = fingerprint(data)
+        cache = get_cache("idempotency")
+        async with cache.lock(f"submit:{record}", ttl=settings.OUTBOX_ACK_TIMEOUT_SECONDS + 10, wait=settings.OUTBOX_ACK_TIMEOUT_SECONDS + 5) as lock:
+            if lock.waited and not lock.acquired:
+                return {"status": "error", "message": "A request with this Idempotency-Key is still being processed; retry shortly."}
+            previous = await cache.get(record)
+            if previous is not None:
+                if previous != digest:
+                    return {"status": "error", "message": "Idempotency-Key was already used for a different request."}
+                return {"status": "success", "id": record, "replayed": True}
+            try:
+                delivered = await outbox.submit(table, {"id": record, **data})
+            except PayloadConflict as e:
+                return {"status": "error", "message": str(e)}
+            await cache.set(record, digest, ttl=settings.IDEMPOTENCY_TTL_SECONDS)
+        return {"status": "success", "id": record, "queued": not delivered}
+
+    @staticmethod
+    async def submission_status(table: str, record: str) -> Dict[str, Any]:
+        """
+        State of an acknowledged ticket/feedback id: queued (still in an outbox), rejected
+        (dead-lettered: the id will never exist), delivered, or not_found.
+        """
+        found = await asyncio.to_thread(outbox.lookup, record)
+        if found is not None:
+            return {"status": "success", "id": record, **found}
         supabase = get_supabase()
-        result = supabase.table("support_tickets").insert(data).execute()
-        ticket_id = str(uuid.uuid4())
-        if result.data and len(result.data) > 0:
-            ticket_id = result.data[0].get('id', ticket_id)
-        return {"status": "success", "ticket_id": ticket_id}
+        if supabase is None:
+            return {"status": "error", "message": "Database not configured."}
+
+        def _select():
+            with get_breaker("supabase_outbox").guard():
+                return supabase.table(table).select("id").eq("id", record).limit(1).execute().data
+
+        rows = await asyncio.to_thread(_select)
+        return {"status": "success", "id": record, "state": "delivered" if rows else "not_found"}
+
+    @staticmethod
+    async def submit_feedback(message: str, category: str, user_id: Optional[str], idempotency_key: Optional[str] = None):
+        data = {"message": message, "category": category}
+        if user_id:
+            data["user_id"] = user_id
+        result = await ChatService._submit_once("feedback_submissions", data, idempotency_key)
+        if "id" in result:
+            result["feedback_id"] = result.pop("id")
+        return result
+
+    @staticmethod
+    async def submit_ticket(data: Dict[str, Any], idempotency_key: Optional[str] = None):
+        result = await ChatService._submit_once("support_tickets", data, idempotency_key)
+        if "id" in result:
+            result["ticket_id"] = result.pop("id")
+        return result
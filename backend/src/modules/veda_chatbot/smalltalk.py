@@ -0,0 +1,114 @@
+"""
+Small-talk detection (greetings, thanks, goodbyes, acknowledgements, emoji-only).
+Every pattern lives in one compiled alternation with a named group per kind, and
+the message is normalized once, so classification is a single regex pass.
+"""
+import re
+from typing import Dict, List, Optional
+
+_EMOJI = r"[\U0001f300-\U0001faff\u2600-\u27bf\U0001f1e6-\U0001f1ff\ufe0f\u200d]"
+_TAIL = rf"(?:[\s!.?,~]|{_EMOJI})*"  # Trailing punctuation / emoji, e.g. "hi!! \U0001f44b"
+
+_GREETING = r"""
+    (?:hi|hello|hey|hiya|howdy|heya|yo|sup|greetings|what'?s\s*up)(?:\s+(?:there|veda|team|all|everyone))?
+  | good\s*(?:morning|afternoon|evening|day|night)
+  | hola|namaste|namaskar(?:am)?|vanakkam|bonjour|salut|hallo|guten\s*tag|ciao|ol[aá]|hej
+  | salaam|salam|as+alam+u?\s*alaikum|marhaba|konnichiwa|ni\s*hao|annyeong(?:haseyo)?|merhaba|privet
+  | \U0001f44b+
+"""
+_THANKS = r"""
+    (?:(?:ok(?:ay)?|great|cool|awesome|perfect)\s*,?\s*)?
+    (?:thanks|thank\s*(?:you|u)|thankyou|ty|thx|tysm|cheers|much\s*appreciated|appreciate\s*it
+      |gracias|merci|danke|dhanyavaad|dhanyavad|shukriya|arigato)
+    (?:\s*(?:a\s*lot|so\s*much|very\s*much|again|veda))?
+"""
+_GOODBYE = r"""
+    bye|bye\s*bye|goodbye|good\s*bye|see\s*(?:you|ya|u)(?:\s*(?:later|soon|around))?|cya|later|take\s*care
+  | adios|au\s*revoir|tsch[uü]ss|alvida|sayonara|ciao\s*for\s*now
+"""
+_ACK = r"""
+    ok|okay|k|kk|okie|alright|all\s*right|got\s*it|understood|cool|great|nice|awesome|perfect
+  | sounds\s*good|makes\s*sense|sure|fine|noted|\U0001f44d+
+"""
+
+SMALL_TALK_RE = re.compile(
+    rf"""(?:
+        (?P<thanks>{_THANKS})
+      | (?P<greeting>{_GREETING})
+      | (?P<goodbye>{_GOODBYE})
+      | (?P<ack>{_ACK})
+    ){_TAIL}
+    | (?P<emoji>{_EMOJI}(?:{_EMOJI}|\s)*)""",
+    re.VERBOSE,  # No IGNORECASE: input is already lowercased, and case-folding doubles match time
+)
+
+GREETING_RESPONSES = [
+    "Hi there! \U0001f44b Welcome to LeadQ! I'm **Veda**, your AI assistant. I'm here to help you with anything related to our platform \u2014 features, setup, integrations, automation, and more.\n\nWhat would you like to explore today?",
+    "Hello! \U0001f60a Welcome to LeadQ! I'm **Veda**, and I'm here to make your experience seamless. Whether you need help with contact capture, meeting intelligence, email automation, or anything else \u2014 just ask!\n\nHow can I help you today?",
+    "Hey! \U0001f44b Great to see you here! I'm **Veda**, your LeadQ assistant. I can help you with features, setup, VocalQ voice agent, Chrome extension, and much more.\n\nWhat would you like to know?",
+]
+
+THANK_YOU_RESPONSES = [
+    "You're welcome! \U0001f60a I'm always here if you need more help with LeadQ. Is there anything else you'd like to explore?",
+    "Happy to help! \U0001f64c Feel free to ask me anything else about LeadQ anytime. What else can I assist you with?",
+]
+
+GOODBYE_RESPONSES = [
+    "Goodbye! \U0001f44b Thanks for chatting with me. Come back anytime you have questions about LeadQ!",
+    "Take care! \U0001f60a I'll be right here whenever you need help with LeadQ.",
+]
+
+ACK_RESPONSES = [
+    "Great! \U0001f44d Is there anything else you'd like to know about LeadQ?",
+    "Got it! \U0001f60a Let me know if you'd like to dive into any other LeadQ feature.",
+]
+
+EMOJI_RESPONSES = [
+    "\U0001f60a I'm **Veda**, LeadQ's assistant! Ask me anything about features, pricing, setup, or integrations.",
+]
+
+# Canned reply set per small-talk kind
+SMALL_TALK_REPLIES = {
+    "greeting": {
+        "responses": GREETING_RESPONSES,
+        "recommendations": ["What can LeadQ do for me?", "How do I get started with LeadQ?", "Tell me about LeadQ pricing"],
+    },
+    "thanks": {
+        "responses": THANK_YOU_RESPONSES,
+        "recommendations": ["What features does LeadQ offer?", "How does VocalQ voice agent work?", "Tell me about pricing plans"],
+    },
+    "goodbye": {
+        "responses": GOODBYE_RESPONSES,
+        "recommendations": ["What features does LeadQ offer?", "How do I get started with LeadQ?", "How do I contact support?"],
+    },
+    "ack": {
+        "responses": ACK_RESPONSES,
+        "recommendations": ["What features does LeadQ offer?", "Tell me about LeadQ pricing", "How does the Chrome Extension work?"],
+    },
+    "emoji": {
+        "responses": EMOJI_RESPONSES,
+        "recommendations": ["What can LeadQ do for me?", "How do I get started with LeadQ?", "Tell me about LeadQ pricing"],
+    },
+}
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, trimmed, single-spaced form shared by small-talk and KB matching."""
+    return " ".join(message.split()).lower()
+
+
+def classify_small_talk(clean: str, history: Optional[List[Dict[str, str]]] = None) -> Optional[str]:
+    """
+    Small-talk kind for a normalized message, or None if it needs a real answer.
+    Mid-conversation an acknowledgement ("sure", "ok") usually answers the
+    assistant's last reply (often a follow-up question), so with any assistant
+    turn in `history` it goes to the normal answer path.
+    """
+    if not clean or len(clean) > 64:
+        return None
+    match = SMALL_TALK_RE.fullmatch(clean)
+    if not match:
+        return None
+    if match.lastgroup == "ack" and any(h.get("role") == "assistant" for h in history or []):
+        return None
+    return match.lastgroup
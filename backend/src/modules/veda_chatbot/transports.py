@@ -0,0 +1,125 @@
+"""
+Persistent chat transports (WebSocket / Server-Sent Events).
+One ChatChannel per chat session multiplexes turns over its connections.
+Starting a new turn cancels the in-flight generation of the previous one.
+Each connection subscribes its own queue and sees every frame; the channel
+closes (cancelling its turn) when the last connection detaches.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from src.modules.veda_chatbot.frames import coalesce_frames, encode_frame
+from src.modules.veda_chatbot.service import ChatService
+
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+class ChannelOwnerMismatch(Exception):
+    """The session's channel belongs to another user_id."""
+
+
+class ChatChannel:
+    """Per-session fan-out of turn frames, with at most one in-flight generation."""
+
+    def __init__(self, session_id: str, user_id: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._turn = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Detach one connection; the last one to leave closes the channel."""
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.close()
+
+    def publish(self, frame: Dict[str, Any]):
+        for queue in list(self.subscribers):
+            queue.put_nowait(frame)
+
+    def submit(self, message: str, regenerate: bool = False, history: Optional[List[Dict[str, str]]] = None) -> int:
+        """Start a new turn, superseding any generation still in flight."""
+        self.cancel()
+        self._turn += 1
+        self._task = asyncio.create_task(self._run(self._turn, message, regenerate, history))
+        return self._turn
+
+    def cancel(self) -> bool:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            return True
+        return False
+
+    def close(self):
+        self.cancel()
+        if _channels.get(self.session_id) is self:
+            del _channels[self.session_id]
+
+    async def _run(self, turn: int, message: str, regenerate: bool, history: Optional[List[Dict[str, str]]]):
+        frames = ChatService.chat_frames(message, self.session_id, self.user_id, regenerate, history)
+        try:
+            async for frame in coalesce_frames(frames):
+                frame["turn"] = turn
+                self.publish(frame)
+        except asyncio.CancelledError:
+            self.publish({"type": "cancelled", "turn": turn})
+            raise
+        except Exception as e:
+            print(f"Chat channel error ({self.session_id}): {e}")
+            self.publish({"type": "error", "turn": turn, "message": "Generation failed."})
+        finally:
+            await frames.aclose()
+
+
+_channels: Dict[str, ChatChannel] = {}
+
+
+def get_channel(session_id: str, user_id: Optional[str] = None) -> ChatChannel:
+    """
+    Get or create the channel for a session. The first attach binds its user_id;
+    attaching with a different one raises ChannelOwnerMismatch.
+    Channels live in this worker's memory, so SSE posts must reach the same
+    worker as the event stream (sticky sessions behind a load balancer).
+    """
+    channel = _channels.get(session_id)
+    if channel is None:
+        channel = ChatChannel(session_id, user_id)
+        _channels[session_id] = channel
+    elif channel.user_id != user_id:
+        raise ChannelOwnerMismatch(session_id)
+    return channel
+
+
+def find_channel(session_id: str, user_id: Optional[str] = None) -> Optional[ChatChannel]:
+    """Open channel for a session, if it belongs to `user_id`."""
+    channel = _channels.get(session_id)
+    if channel is not None and channel.user_id != user_id:
+        return None
+    return channel
+
+
+def format_sse(frame: Dict[str, Any]) -> bytes:
+    """Encode a frame as an SSE event named after its frame type."""
+    return b"event: " + frame["type"].encode("utf-8") + b"\ndata: " + encode_frame(frame) + b"\n"
+
+
+async def sse_stream(channel: ChatChannel) -> AsyncIterator[bytes]:
+    """Drain this connection's subscription as an SSE stream, with keep-alive comments for idle proxies."""
+    queue = channel.subscribe()
+    yield format_sse({"type": "ready", "sessionId": channel.session_id})
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_sse(frame)
+    finally:
+        channel.unsubscribe(queue)
@@ -0,0 +1,63 @@
+-- Migration: HNSW index + single-distance, filterable match_documents
+-- Safe to re-run. Run each statement on its own (not inside one transaction):
+-- CREATE INDEX CONCURRENTLY cannot run in a transaction block, and it keeps
+-- document_chunks writable while the index builds.
+
+-- 1. The old 3-argument function would become an ambiguous overload of the new one
+DROP FUNCTION IF EXISTS match_documents(vector(1536), float, int);
+
+-- 2. ANN index (build time grows with row count; raise maintenance_work_mem for large tables)
+SET maintenance_work_mem = '512MB';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_chunks_embedding_hnsw
+    ON document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_chunks_source ON document_chunks ((metadata->>'source'));
+ANALYZE document_chunks;
+
+-- 3. New function (same definition as supabase_schema.sql)
+-- Function to match documents
+-- The inner query is a plain ORDER BY distance LIMIT, which the HNSW index serves; the
+-- distance is computed once there and the similarity threshold is applied to those
+-- top candidates afterwards. filter_source restricts to one metadata source; HNSW
+-- filters after the index scan, so ef_search is raised to keep enough candidates.
+create or replace function match_documents (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  filter_source text default null,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config(
+    'hnsw.ef_search',
+    least(1000, greatest(ef_search, match_count, case when filter_source is null then 0 else match_count * 10 end))::text,
+    true
+  );
+  return query
+  select
+    top.id,
+    top.content,
+    top.metadata,
+    1 - top.distance as similarity
+  from (
+    select
+      c.id,
+      c.content,
+      c.metadata,
+      c.embedding <=> query_embedding as distance
+    from document_chunks c
+    where filter_source is null or c.metadata->>'source' = filter_source
+    order by c.embedding <=> query_embedding
+    limit match_count
+  ) top
+  where 1 - top.distance > match_threshold
+  order by top.distance;
+end;
+$$;
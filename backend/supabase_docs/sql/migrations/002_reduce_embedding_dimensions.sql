@@ -0,0 +1,29 @@
+-- Migration: reduce stored embeddings to EMBEDDING_DIMENSIONS (written for 512; replace
+-- every 512 below with the configured value, and set EMBEDDING_DIMENSIONS for both the API
+-- and scripts/ingest.py before re-ingesting).
+--
+-- text-embedding-3 embeddings are Matryoshka-trained: requesting `dimensions=N` equals
+-- taking the first N components and re-normalizing, so existing rows are converted in
+-- place instead of being re-embedded. Requires pgvector >= 0.7 (subvector, l2_normalize).
+-- Run outside a transaction (CREATE INDEX CONCURRENTLY).
+
+DROP INDEX IF EXISTS idx_document_chunks_embedding_hnsw;
+DROP INDEX IF EXISTS idx_document_chunks_embedding_half;
+DROP INDEX IF EXISTS idx_document_chunks_embedding_bits;
+DROP FUNCTION IF EXISTS match_documents(vector(1536), float, int, text, int);
+DROP FUNCTION IF EXISTS match_documents_quantized(vector(1536), float, int, text, int, text, int);
+
+ALTER TABLE document_chunks
+    ALTER COLUMN embedding TYPE vector(512)
+    USING l2_normalize(subvector(embedding, 1, 512))::vector(512);
+
+SET maintenance_work_mem = '512MB';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_chunks_embedding_hnsw
+    ON document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+-- Optional, for EMBEDDING_QUANTIZATION=binary (or halfvec(512) / halfvec_cosine_ops for 'half'):
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_chunks_embedding_bits
+--     ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(512)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
+ANALYZE document_chunks;
+
+-- Then re-run the match_documents and match_documents_quantized definitions from
+-- supabase_schema.sql with vector(1536) / halfvec(1536) / bit(1536) replaced by 512.
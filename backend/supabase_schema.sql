@@ -13,11 +13,24 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ANN index: HNSW over cosine distance. m / ef_construction trade build time for recall;
+-- query-time recall is tuned per call through match_documents' ef_search argument.
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_hnsw
+    ON document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_document_chunks_source ON document_chunks ((metadata->>'source'));
+
 -- Function to match documents
+DROP FUNCTION IF EXISTS match_documents(vector(1536), float, int);  -- Pre-HNSW signature
+-- The inner query is a plain ORDER BY distance LIMIT, which the HNSW index serves; the
+-- distance is computed once there and the similarity threshold is applied to those
+-- top candidates afterwards. filter_source restricts to one metadata source; HNSW
+-- filters after the index scan, so ef_search is raised to keep enough candidates.
 create or replace function match_documents (
   query_embedding vector(1536),
   match_threshold float,
-  match_count int
+  match_count int,
+  filter_source text default null,
+  ef_search int default 40
 )
 returns table (
   id uuid,
@@ -28,16 +41,96 @@ returns table (
 language plpgsql
 as $$
 begin
+  perform set_config(
+    'hnsw.ef_search',
+    least(1000, greatest(ef_search, match_count, case when filter_source is null then 0 else match_count * 10 end))::text,
+    true
+  );
   return query
   select
-    document_chunks.id,
-    document_chunks.content,
-    document_chunks.metadata,
-    1 - (document_chunks.embedding <=> query_embedding) as similarity
-  from document_chunks
-  where 1 - (document_chunks.embedding <=> query_embedding) > match_threshold
-  order by document_chunks.embedding <=> query_embedding
-  limit match_count;
+    top.id,
+    top.content,
+    top.metadata,
+    1 - top.distance as similarity
+  from (
+    select
+      c.id,
+      c.content,
+      c.metadata,
+      c.embedding <=> query_embedding as distance
+    from document_chunks c
+    where filter_source is null or c.metadata->>'source' = filter_source
+    order by c.embedding <=> query_embedding
+    limit match_count
+  ) top
+  where 1 - top.distance > match_threshold
+  order by top.distance;
+end;
+$$;
+
+-- Quantized retrieval (EMBEDDING_QUANTIZATION = 'half' | 'binary')
+-- The HNSW index is built over a compact expression of `embedding` (float16, or 1 bit per
+-- dimension); the top `candidates` from that index are rescored with the full-precision
+-- vector. Create only the index matching the configured mode; the expression must match
+-- the function's ORDER BY exactly for the planner to use it.
+-- CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_half
+--     ON document_chunks USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+-- CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_bits
+--     ON document_chunks USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
+create or replace function match_documents_quantized (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  quantization text default 'binary',
+  candidates int default 40,
+  filter_source text default null,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config('hnsw.ef_search', least(1000, greatest(ef_search, candidates))::text, true);
+  if quantization = 'half' then
+    return query
+    select r.id, r.content, r.metadata, 1 - r.distance as similarity
+    from (
+      select c.id, c.content, c.metadata, c.embedding <=> query_embedding as distance
+      from (
+        select d.id from document_chunks d
+        where filter_source is null or d.metadata->>'source' = filter_source
+        order by d.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+        limit candidates
+      ) approx
+      join document_chunks c on c.id = approx.id
+      order by distance
+      limit match_count
+    ) r
+    where 1 - r.distance > match_threshold
+    order by r.distance;
+  else
+    return query
+    select r.id, r.content, r.metadata, 1 - r.distance as similarity
+    from (
+      select c.id, c.content, c.metadata, c.embedding <=> query_embedding as distance
+      from (
+        select d.id from document_chunks d
+        where filter_source is null or d.metadata->>'source' = filter_source
+        order by binary_quantize(d.embedding)::bit(1536) <~> binary_quantize(query_embedding)
+        limit candidates
+      ) approx
+      join document_chunks c on c.id = approx.id
+      order by distance
+      limit match_count
+    ) r
+    where 1 - r.distance > match_threshold
+    order by r.distance;
+  end if;
 end;
 $$;
 
@@ -92,14 +185,274 @@ CREATE TABLE IF NOT EXISTS chat_messages (
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_support_tickets_user_id ON support_tickets(user_id);
 CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id ON chat_sessions(user_id);
-CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
-CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
+-- Transcript reads filter by session and page by (created_at, id); the composite index
+-- serves both and replaces the old single-column session_id index.
+DROP INDEX IF EXISTS idx_chat_messages_session_id;
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created ON chat_messages(session_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at, id);
+
+-- 5. History & Analytics Read Functions
+-- Keyset-paginated message listing with a narrow projection: only the scalar
+-- `source`/`latency_ms` fields are pulled out of `meta`, never the whole blob.
+-- Pass p_session_id for a transcript, or NULL to scan all messages in a time range (exports).
+create or replace function list_chat_messages (
+  p_session_id uuid default null,
+  p_since timestamptz default null,
+  p_until timestamptz default null,
+  p_after timestamptz default null,
+  p_after_id uuid default null,
+  p_limit int default 50,
+  p_include_recommendations boolean default false
+)
+returns table (
+  id uuid,
+  session_id uuid,
+  role text,
+  content text,
+  source text,
+  latency_ms float,
+  recommendations jsonb,
+  created_at timestamptz
+)
+language sql stable
+as $$
+  select
+    m.id,
+    m.session_id,
+    m.role,
+    m.content,
+    m.meta->>'source',
+    (m.meta->>'latency_ms')::float,
+    case when p_include_recommendations then m.recommendations end,
+    m.created_at
+  from chat_messages m
+  where (p_session_id is null or m.session_id = p_session_id)
+    and (p_since is null or m.created_at >= p_since)
+    and (p_until is null or m.created_at < p_until)
+    and (p_after is null or (m.created_at, m.id) > (p_after, coalesce(p_after_id, '00000000-0000-0000-0000-000000000000'::uuid)))
+  order by m.created_at, m.id
+  limit least(greatest(p_limit, 1), 1000);
+$$;
+
+-- Assistant latency by answer source (kb / greeting / rag / llm ...)
+create or replace function chat_latency_by_source (
+  p_since timestamptz default now() - interval '7 days',
+  p_until timestamptz default now()
+)
+returns table (
+  source text,
+  messages bigint,
+  avg_latency_ms float,
+  p50_latency_ms float,
+  p95_latency_ms float
+)
+language sql stable
+as $$
+  select
+    coalesce(m.meta->>'source', 'unknown') as source,
+    count(*) as messages,
+    avg((m.meta->>'latency_ms')::float) as avg_latency_ms,
+    percentile_cont(0.5) within group (order by (m.meta->>'latency_ms')::float) as p50_latency_ms,
+    percentile_cont(0.95) within group (order by (m.meta->>'latency_ms')::float) as p95_latency_ms
+  from chat_messages m
+  where m.role = 'assistant'
+    and m.created_at >= p_since
+    and m.created_at < p_until
+  group by 1
+  order by messages desc;
+$$;
+
+-- Message and session volume per time bucket ('hour', 'day', 'week', 'month')
+create or replace function chat_message_volume (
+  p_since timestamptz default now() - interval '30 days',
+  p_until timestamptz default now(),
+  p_bucket text default 'day'
+)
+returns table (
+  bucket timestamptz,
+  user_messages bigint,
+  assistant_messages bigint,
+  sessions bigint
+)
+language sql stable
+as $$
+  select
+    date_trunc(p_bucket, m.created_at) as bucket,
+    count(*) filter (where m.role = 'user') as user_messages,
+    count(*) filter (where m.role = 'assistant') as assistant_messages,
+    count(distinct m.session_id) as sessions
+  from chat_messages m
+  where m.created_at >= p_since
+    and m.created_at < p_until
+  group by 1
+  order by 1;
+$$;
+
+-- Most frequent user questions (case/whitespace-normalized)
+create or replace function chat_top_questions (
+  p_since timestamptz default now() - interval '30 days',
+  p_until timestamptz default now(),
+  p_limit int default 20
+)
+returns table (
+  question text,
+  asked bigint,
+  last_asked_at timestamptz
+)
+language sql stable
+as $$
+  select
+    lower(regexp_replace(trim(m.content), '\s+', ' ', 'g')) as question,
+    count(*) as asked,
+    max(m.created_at) as last_asked_at
+  from chat_messages m
+  where m.role = 'user'
+    and m.created_at >= p_since
+    and m.created_at < p_until
+  group by 1
+  order by asked desc, last_asked_at desc
+  limit least(greatest(p_limit, 1), 200);
+$$;
+
+-- Pipeline experiments: per-arm latency, token usage and fallback rates from the meta
+-- logged by /chat (profile / experiment / arm, see veda_chatbot/profiles.py).
+-- no_context_rate: answered without retrieved documentation; fallback_rate: the model
+-- call failed and a static answer was served (kb-pattern, or the generic error-fallback).
+create or replace function chat_experiment_summary (
+  p_experiment text default null,
+  p_since timestamptz default now() - interval '14 days',
+  p_until timestamptz default now()
+)
+returns table (
+  experiment text,
+  arm text,
+  turns bigint,
+  sessions bigint,
+  avg_latency_ms float,
+  p50_latency_ms float,
+  p95_latency_ms float,
+  p50_first_token_ms float,
+  avg_prompt_tokens float,
+  avg_completion_tokens float,
+  avg_cached_tokens float,
+  no_context_rate float,
+  fallback_rate float,
+  truncated_rate float
+)
+language sql stable
+as $$
+  select
+    m.meta->>'experiment' as experiment,
+    m.meta->>'arm' as arm,
+    count(*) as turns,
+    count(distinct m.session_id) as sessions,
+    avg((m.meta->>'latency_ms')::float) as avg_latency_ms,
+    percentile_cont(0.5) within group (order by (m.meta->>'latency_ms')::float) as p50_latency_ms,
+    percentile_cont(0.95) within group (order by (m.meta->>'latency_ms')::float) as p95_latency_ms,
+    percentile_cont(0.5) within group (order by (m.meta->>'first_token_ms')::float) as p50_first_token_ms,
+    avg((m.meta->>'prompt_tokens')::float) as avg_prompt_tokens,
+    avg((m.meta->>'completion_tokens')::float) as avg_completion_tokens,
+    avg((m.meta->>'cached_tokens')::float) as avg_cached_tokens,
+    avg(case when m.meta->>'source' = 'llm-openai-fallback' then 1.0 else 0.0 end) as no_context_rate,
+    avg(case when m.meta->>'source' in ('rag-openai', 'llm-openai-fallback') then 0.0 else 1.0 end) as fallback_rate,
+    avg(case when (m.meta->>'truncated')::boolean then 1.0 else 0.0 end) as truncated_rate
+  from chat_messages m
+  where m.role = 'assistant'
+    and m.meta ? 'arm'
+    and (p_experiment is null or m.meta->>'experiment' = p_experiment)
+    and m.created_at >= p_since
+    and m.created_at < p_until
+  group by 1, 2
+  order by 1, 2;
+$$;
+
+-- Follow-up chip click-through: how often each suggested question was offered, and how
+-- often the user's next message in that session was exactly that question (a click).
+-- Feeds the local recommendation ranker (veda_chatbot/recommendations.py).
+create or replace function recommendation_clicks (
+  p_since timestamptz default now() - interval '30 days',
+  p_limit int default 500
+)
+returns table (
+  question text,
+  offered bigint,
+  clicked bigint
+)
+language sql stable
+as $$
+  select
+    rec.question,
+    count(*) as offered,
+    count(*) filter (
+      where lower(regexp_replace(trim(nxt.content), '\s+', ' ', 'g')) = lower(regexp_replace(trim(rec.question), '\s+', ' ', 'g'))
+    ) as clicked
+  from chat_messages a
+  cross join lateral jsonb_array_elements_text(a.recommendations) as rec(question)
+  left join lateral (
+    select u.content
+    from chat_messages u
+    where u.session_id = a.session_id
+      and u.role = 'user'
+      and (u.created_at, u.id) > (a.created_at, a.id)
+    order by u.created_at, u.id
+    limit 1
+  ) nxt on true
+  where a.role = 'assistant'
+    and a.created_at >= p_since
+    and jsonb_typeof(a.recommendations) = 'array'
+  group by rec.question
+  order by clicked desc, offered desc
+  limit least(greatest(p_limit, 1), 5000);
+$$;
+
+-- 6. Retention: cold archive of idle sessions
+-- One row per archived session; `payload` is the gzip-compressed NDJSON transcript
+-- (one full chat_messages row per line, meta and recommendations included).
+CREATE TABLE IF NOT EXISTS chat_session_archives (
+    session_id UUID PRIMARY KEY,
+    user_id UUID,
+    started_at TIMESTAMP WITH TIME ZONE,
+    last_active_at TIMESTAMP WITH TIME ZONE,
+    message_count INT NOT NULL DEFAULT 0,
+    payload BYTEA,                                 -- NULL when the transcript was exported to a file
+    payload_uri TEXT,                              -- File location when archived to disk instead
+    raw_bytes INT,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_active_at ON chat_sessions(last_active_at);
+
+-- Sessions idle since before p_cutoff. Sessions created before last_active_at was
+-- maintained are protected by also requiring no message newer than the cutoff.
+create or replace function chat_retention_candidates (
+  p_cutoff timestamptz,
+  p_limit int default 100
+)
+returns table (
+  id uuid,
+  user_id uuid,
+  started_at timestamptz,
+  last_active_at timestamptz
+)
+language sql stable
+as $$
+  select s.id, s.user_id, s.started_at, s.last_active_at
+  from chat_sessions s
+  where s.last_active_at < p_cutoff
+    and not exists (
+      select 1 from chat_messages m
+      where m.session_id = s.id and m.created_at >= p_cutoff
+    )
+  order by s.last_active_at
+  limit least(greatest(p_limit, 1), 1000);
+$$;
 
 -- Row Level Security (RLS) Policies (Optional but Recommended)
 ALTER TABLE support_tickets ENABLE ROW LEVEL SECURITY;
 ALTER TABLE feedback_submissions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE chat_session_archives ENABLE ROW LEVEL SECURITY;
 
 -- Example Policy: Users can only see their own tickets
 -- CREATE POLICY "Users can only view their own tickets" ON support_tickets
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Tests import the app as `src.…`, like main.py does when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.veda_chatbot import service  # noqa: E402
+from src.modules.veda_chatbot.service import ChatService  # noqa: E402
+
+# --- Stub OpenAI client shared by the chat_generator tests ---
+
+WORDS = [f"word{i} " for i in range(200)]
+
+
+class SlowStream:
+    """Streamed completion: one word every `delay` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.sent = 0
+        self.cancelled = False
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        try:
+            for word in WORDS:
+                await asyncio.sleep(self.delay)
+                self.sent += 1
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class SlowOpenAI:
+    """AsyncOpenAI stand-in: zero embeddings, slow streamed completions; records each completion request."""
+
+    words = WORDS
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.streams = []
+        self.requests = []
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    async def _embed(self, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * 8)])
+
+    async def _complete(self, **kwargs):
+        self.requests.append(kwargs)
+        stream = SlowStream(self.delay)
+        self.streams.append(stream)
+        return stream
+
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    client = SlowOpenAI()
+    monkeypatch.setattr(ChatService, "get_openai_client", staticmethod(lambda: client))
+    monkeypatch.setattr(ChatService, "match_documents", staticmethod(lambda *args, **kwargs: []))
+    monkeypatch.setattr(service, "DISCONNECT_POLL_SECONDS", 0.01)
+    return client
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    calls = []
+
+    def _log(session_id, user_id, user_message, assistant_response, recommendations, meta):
+        calls.append({"session_id": session_id, "response": assistant_response, "meta": meta})
+
+    monkeypatch.setattr(ChatService, "log_interaction_to_db", staticmethod(_log))
+    return calls
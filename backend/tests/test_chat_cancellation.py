@@ -0,0 +1,110 @@
+"""
+Cancellation of /chat generations (ChatService.chat_generator), against a slow
+stub AsyncOpenAI: a client disconnect or a regenerate for the same session must
+cancel the upstream completion, and the partial answer is logged as truncated.
+"""
+import asyncio
+import json
+
+from src.modules.veda_chatbot import service
+from src.modules.veda_chatbot.service import ChatService
+
+QUESTION = "Explain how contact capture works in detail"
+
+
+async def _read_frames(stream, frames, first_content: asyncio.Event):
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            frame = json.loads(line)
+            frames.append(frame)
+            if frame["type"] == "content":
+                first_content.set()
+
+
+def test_disconnect_cancels_producer_and_logs_truncated_turn(stub_openai, logged):
+    async def scenario():
+        disconnected = False
+
+        async def is_disconnected():
+            return disconnected
+
+        frames, first_content = [], asyncio.Event()
+        stream = ChatService.chat_generator(QUESTION, "s-disconnect", None, is_disconnected=is_disconnected)
+        reader = asyncio.create_task(_read_frames(stream, frames, first_content))
+        await asyncio.wait_for(first_content.wait(), 5)
+        producer = service._inflight_generations["s-disconnect"]
+
+        disconnected = True
+        await asyncio.wait_for(reader, 5)
+        return frames, producer
+
+    frames, producer = asyncio.run(scenario())
+    upstream = stub_openai.streams[0]
+
+    assert producer.cancelled()
+    assert upstream.cancelled and upstream.closed
+    assert upstream.sent < len(stub_openai.words)
+    assert "s-disconnect" not in service._inflight_generations
+    assert not any(frame["type"] == "meta" for frame in frames)
+
+    assert len(logged) == 1
+    assert logged[0]["meta"]["truncated"] is True
+    partial = logged[0]["response"]
+    full = "".join(stub_openai.words).strip()
+    assert partial and full.startswith(partial) and len(partial) < len(full)
+    # Everything the client saw is part of what was logged
+    shown = "".join(frame["chunk"] for frame in frames if frame["type"] == "content")
+    assert partial.startswith(shown)
+
+
+def test_regenerate_cancels_previous_generation(stub_openai, logged):
+    async def scenario():
+        first_frames, first_content = [], asyncio.Event()
+        first = asyncio.create_task(_read_frames(
+            ChatService.chat_generator(QUESTION, "s-regen", None), first_frames, first_content
+        ))
+        await asyncio.wait_for(first_content.wait(), 5)
+        first_producer = service._inflight_generations["s-regen"]
+
+        second_frames, second_content = [], asyncio.Event()
+        second = asyncio.create_task(_read_frames(
+            ChatService.chat_generator(QUESTION, "s-regen", None, regenerate=True), second_frames, second_content
+        ))
+        await asyncio.wait_for(first, 5)  # Superseded stream ends early
+        first_cancelled = first_producer.cancelled()
+        second_running = not second.done()
+        second.cancel()
+        try:
+            await second
+        except asyncio.CancelledError:
+            pass
+        return first_frames, first_cancelled, second_running
+
+    first_frames, first_cancelled, second_running = asyncio.run(scenario())
+
+    assert first_cancelled
+    assert second_running
+    assert stub_openai.streams[0].cancelled
+    assert stub_openai.streams[0].sent < len(stub_openai.words)
+    assert not any(frame["type"] == "meta" for frame in first_frames)
+    assert logged[0]["meta"]["truncated"] is True
+    assert "s-regen" not in service._inflight_generations
+
+
+def test_completed_turn_is_not_truncated(stub_openai, logged):
+    stub_openai.delay = 0
+
+    async def scenario():
+        frames = []
+        await _read_frames(ChatService.chat_generator(QUESTION, "s-complete", None), frames, asyncio.Event())
+        return frames
+
+    frames = asyncio.run(scenario())
+
+    assert frames[-1]["type"] == "meta"
+    assert len(logged) == 1
+    assert "truncated" not in logged[0]["meta"]
+    assert logged[0]["response"] == "".join(stub_openai.words).strip()
@@ -0,0 +1,49 @@
+"""
+Prompt caching needs every turn of a session to send the same leading messages:
+the static system prompt, then the session history. Two chat_generator turns with
+different questions and retrieved context must share that prefix byte for byte,
+with the per-query context and question only after it.
+"""
+import asyncio
+import json
+
+from src.modules.veda_chatbot.service import ChatService
+
+HISTORY = [
+    {"role": "user", "content": "What does LeadQ do?"},
+    {"role": "assistant", "content": "LeadQ captures contacts and automates follow-ups."},
+]
+
+TURNS = [
+    ("How much is the Team plan?", "Team plan: $199/month for up to 10 seats."),
+    ("Does VocalQ book meetings?", "VocalQ books meetings straight into your calendar."),
+]
+
+
+def _run_turn(stub_openai, monkeypatch, question, context):
+    rows = [{"id": 1, "content": context, "similarity": 0.9, "metadata": {"source": "docs"}}]
+    monkeypatch.setattr(ChatService, "match_documents", staticmethod(lambda *args, **kwargs: rows))
+
+    async def consume():
+        async for _ in ChatService.chat_generator(question, "s-prefix", None, history=HISTORY):
+            pass
+
+    asyncio.run(consume())
+    return stub_openai.requests[-1]["messages"]
+
+
+def test_turns_share_the_system_and_history_prefix(stub_openai, logged, monkeypatch):
+    stub_openai.delay = 0
+    payloads = [_run_turn(stub_openai, monkeypatch, question, context) for question, context in TURNS]
+
+    prefix = 1 + len(HISTORY)
+    first, second = payloads
+    assert json.dumps(first[:prefix]).encode("utf-8") == json.dumps(second[:prefix]).encode("utf-8")
+    assert first[0]["role"] == "system"
+    assert first[1:prefix] == HISTORY
+
+    # Only the tail varies: this turn's context, then its question
+    for (question, context), messages in zip(TURNS, payloads):
+        assert messages[prefix:] == messages[-2:]
+        assert context in messages[-2]["content"]
+        assert messages[-1] == {"role": "user", "content": question}
@@ -0,0 +1,76 @@
+"""
+Small-talk classification (smalltalk.classify_small_talk): every phrase the old
+per-pattern greeting / thank-you matching accepted keeps its kind, the newer
+phrasings are recognised, and real questions are never answered with a canned reply.
+"""
+import pytest
+
+from src.modules.veda_chatbot.smalltalk import classify_small_talk, normalize_message
+
+# Phrases the previous service.py patterns matched (greetings and thanks only)
+LEGACY_PHRASES = {
+    "greeting": [
+        "hi", "Hello!", "hey", "hiya", "Howdy", "hola", "namaste", "hi \U0001f44b", "Hey!!!",
+        "good morning", "Good Afternoon.", "good evening", "good day", "goodnight", "Good Night!",
+        "what's up", "whats up?", "sup", "yo", "greetings", "hi there", "Hello there!", "hey there \U0001f44b",
+    ],
+    "thanks": [
+        "thanks", "Thank you", "thankyou", "ty", "thx", "thank u", "thanks a lot", "thank you so much!", "Thanks!!",
+    ],
+}
+
+NEW_PHRASES = {
+    "greeting": ["bonjour", "Hallo", "ciao", "olá", "vanakkam", "konnichiwa", "\U0001f44b", "hi veda", "hey team!"],
+    "thanks": ["ok thanks", "cheers!", "much appreciated", "gracias", "merci", "dhanyavaad", "thanks again \U0001f64f"],
+    "goodbye": ["bye", "Bye bye!", "goodbye", "see you later", "cya", "take care", "au revoir"],
+    "ack": ["ok", "Okay.", "k", "got it", "sounds good", "cool", "perfect!", "\U0001f44d"],
+    "emoji": ["\U0001f60a", "\U0001f525\U0001f525", "❤️"],
+}
+
+NOT_SMALL_TALK = [
+    "hi, what does LeadQ cost?", "How much is the professional plan?", "thanks but how do I export contacts?",
+    "Tell me about VocalQ", "hello world api example", "ok so how does enrichment work", "yoga",
+]
+
+FOLLOW_UP = [
+    {"role": "user", "content": "What does VocalQ do?"},
+    {"role": "assistant", "content": "VocalQ calls your leads for you. Would you like to see how to set it up?"},
+]
+
+
+def _cases(phrases):
+    return [(phrase, kind) for kind, group in phrases.items() for phrase in group]
+
+
+def classify(message, history=None):
+    return classify_small_talk(normalize_message(message), history)
+
+
+@pytest.mark.parametrize("phrase,kind", _cases(LEGACY_PHRASES))
+def test_legacy_phrases_keep_their_kind(phrase, kind):
+    assert classify(phrase) == kind
+
+
+@pytest.mark.parametrize("phrase,kind", _cases(NEW_PHRASES))
+def test_new_phrases(phrase, kind):
+    assert classify(phrase) == kind
+
+
+@pytest.mark.parametrize("phrase", NOT_SMALL_TALK)
+def test_questions_are_not_small_talk(phrase):
+    assert classify(phrase) is None
+
+
+@pytest.mark.parametrize("phrase", ["sure", "ok", "alright", "k", "sounds good"])
+def test_ack_answering_the_assistant_goes_to_the_answer_path(phrase):
+    assert classify(phrase) == "ack"
+    assert classify(phrase, FOLLOW_UP) is None
+
+
+@pytest.mark.parametrize("phrase,kind", [("thanks!", "thanks"), ("bye", "goodbye"), ("hi", "greeting")])
+def test_history_only_affects_acks(phrase, kind):
+    assert classify(phrase, FOLLOW_UP) == kind
+
+
+def test_long_messages_are_not_small_talk():
+    assert classify("thanks " * 20) is None
@@ -3,6 +3,15 @@ Video Background Removal Script
 Carefully removes background while preserving all video content.
 Uses rembg with careful tuning to preserve the character.
 Outputs PNG frames that can be used with CSS or reassembled.
+
+Pipeline mode (--pipeline) decodes in a reader thread, removes backgrounds in a
+process pool (one rembg session per worker) and pipes ordered RGBA frames
+straight into FFmpeg without PNG round trips.
+
+Every mode takes `--backend rembg|tuned` and `--threads N`. tuned swaps rembg's
+default session for the backend's rembg_tuned.TunedSession (explicit ONNX Runtime
+threads, batchable model copy); --threads sets intra-op threads per session
+(default: all cores, or each pipeline worker's share of them).
 """
 
 import cv2
@@ -12,9 +21,55 @@ import subprocess
 import tempfile
 import shutil
 from PIL import Image
+import onnxruntime as ort
 from rembg import remove, new_session
 from tqdm import tqdm
 import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Conservative matting settings shared by every mode
+REMOVE_KWARGS = dict(
+    alpha_matting=True,
+    alpha_matting_foreground_threshold=270,  # Very high - keep almost everything as foreground
+    alpha_matting_background_threshold=5,    # Very low - only remove obvious background
+    alpha_matting_erode_size=3,              # Minimal erosion
+)
+
+def _use_backend_scripts():
+    """The temporal / tuned helpers live with the backend scripts; only those options need that tree."""
+    scripts = str(Path(__file__).resolve().parents[2] / "backend" / "scripts")
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+
+
+def temporal_masker(session):
+    """TemporalMasker over this script's matting settings."""
+    _use_backend_scripts()
+    from temporal_mask import TemporalMasker, rembg_alpha
+    return TemporalMasker(rembg_alpha(session, **REMOVE_KWARGS), smoothing=0.3)
+
+
+def make_session(model_name: str = "u2net", backend: str = "rembg", threads: int = None):
+    """
+    rembg session for `model_name`. backend="tuned" loads rembg_tuned.TunedSession
+    (same predict interface, so remove() and alpha matting work unchanged).
+    `threads` caps ONNX Runtime intra-op threads; None lets the backend decide.
+    """
+    if backend == "tuned":
+        _use_backend_scripts()
+        from rembg_tuned import TunedSession
+        # Spin-waiting only helps a session that has the cores to itself
+        return TunedSession(model_name, threads=threads, spin=threads is None)
+    if threads is None:
+        return new_session(model_name)
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = threads
+    sess_opts.inter_op_num_threads = 1
+    return new_session(model_name, sess_opts=sess_opts)
 
 def check_ffmpeg():
     """Check if FFmpeg is available"""
@@ -24,10 +79,30 @@ def check_ffmpeg():
     except FileNotFoundError:
         return False
 
-def process_video_preserve_content(input_path: str, output_path: str):
+def restore_edges(result_np: np.ndarray) -> np.ndarray:
+    """
+    Post-process: ensure we haven't lost any significant content by
+    restoring semi-transparent areas next to the kept subject.
+    """
+    if result_np.shape[2] == 4:
+        alpha = result_np[:, :, 3]
+
+        # Dilate the alpha slightly to catch any missed edges
+        kernel = np.ones((3, 3), np.uint8)
+        alpha_dilated = cv2.dilate(alpha, kernel, iterations=1)
+
+        # Blend: where alpha was removed but dilated says keep, restore partially
+        restore_mask = (alpha < 128) & (alpha_dilated > 50)
+        result_np[restore_mask, 3] = 180  # Partial transparency for edge areas
+    return result_np
+
+
+def process_video_preserve_content(input_path: str, output_path: str, temporal: bool = False, backend: str = "rembg", threads: int = None):
     """
     Remove background from video while carefully preserving all character content.
     Uses conservative settings to avoid removing parts of the character.
+    With temporal=True, masks are reused across near-identical frames and only
+    keyframes / changed regions go through rembg.
     """
     
     print(f"Processing video: {input_path}")
@@ -53,11 +128,14 @@ def process_video_preserve_content(input_path: str, output_path: str):
     
     # Create rembg session - using u2net for general objects
     # This model is better for preserving content than human-specific ones
-    session = new_session("u2net")
+    session = make_session("u2net", backend, threads)
     
     print("Extracting and processing frames...")
     print("This may take a few minutes...")
     
+    masker = temporal_masker(session) if temporal else None
+    started = time.perf_counter()
+
     frame_idx = 0
     pbar = tqdm(total=frame_count, desc="Processing frames")
     
@@ -74,33 +152,13 @@ def process_video_preserve_content(input_path: str, output_path: str):
         # Higher foreground threshold = keep MORE as foreground (character)
         # Lower background threshold = remove LESS as background
         # Smaller erode = less edge erosion (keep more detail)
-        result = remove(
-            pil_image,
-            session=session,
-            alpha_matting=True,
-            alpha_matting_foreground_threshold=270,  # Very high - keep almost everything as foreground
-            alpha_matting_background_threshold=5,    # Very low - only remove obvious background
-            alpha_matting_erode_size=3,              # Minimal erosion
-        )
-        
-        # Convert back to numpy array (RGBA)
-        result_np = np.array(result)
-        
-        # Post-process: Ensure we haven't lost any significant content
-        # by comparing with original and restoring semi-transparent areas
-        original_np = np.array(pil_image)
-        
-        # Get the alpha channel
-        if result_np.shape[2] == 4:
-            alpha = result_np[:, :, 3]
-            
-            # Dilate the alpha slightly to catch any missed edges
-            kernel = np.ones((3, 3), np.uint8)
-            alpha_dilated = cv2.dilate(alpha, kernel, iterations=1)
-            
-            # Blend: where alpha was removed but dilated says keep, restore partially
-            restore_mask = (alpha < 128) & (alpha_dilated > 50)
-            result_np[restore_mask, 3] = 180  # Partial transparency for edge areas
+        if masker:
+            result_np = restore_edges(np.dstack([frame_rgb, masker.process(frame_rgb)]))
+        else:
+            result = remove(pil_image, session=session, **REMOVE_KWARGS)
+
+            # Convert back to numpy array (RGBA) and restore thin edges
+            result_np = restore_edges(np.array(result))
         
         # Save as PNG with alpha
         output_frame_path = frames_dir / f"frame_{frame_idx:06d}.png"
@@ -115,6 +173,8 @@ def process_video_preserve_content(input_path: str, output_path: str):
     cap.release()
     
     print(f"Processed {frame_idx} frames")
+    if masker:
+        print(masker.report(time.perf_counter() - started))
     
     # Check if FFmpeg is available
     has_ffmpeg = check_ffmpeg()
@@ -183,7 +243,210 @@ def process_video_preserve_content(input_path: str, output_path: str):
     return output_path
 
 
-def quick_test(input_path: str, output_dir: str):
+# --- Pipeline mode ---
+
+_worker_session = None
+
+
+def _available_cores() -> int:
+    """CPUs this process may run on (respects container CPU sets, unlike os.cpu_count())."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _init_worker(model_name: str, threads: int, backend: str = "rembg"):
+    """
+    Process pool initializer: each worker owns its own rembg session, limited to
+    its share of the cores (a default session would size its pool to all of them).
+    """
+    global _worker_session
+    _worker_session = make_session(model_name, backend, threads)
+
+
+def _remove_batch(batch):
+    """Remove backgrounds from a batch of (index, RGB frame) pairs inside a worker."""
+    results = []
+    for idx, frame_rgb in batch:
+        result = remove(frame_rgb, session=_worker_session, **REMOVE_KWARGS)
+        results.append((idx, restore_edges(np.ascontiguousarray(result))))
+    return results
+
+
+def _read_frames(cap, out_queue: queue.Queue, batch_size: int, max_frames: int = None):
+    """Reader thread: decode frames with OpenCV and hand them over in batches."""
+    batch = []
+    idx = 0
+    while max_frames is None or idx < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        batch.append((idx, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        idx += 1
+        if len(batch) >= batch_size:
+            out_queue.put(batch)
+            batch = []
+    if batch:
+        out_queue.put(batch)
+    out_queue.put(None)
+
+
+def _open_encoder(output_path: str, width: int, height: int, fps: float):
+    """FFmpeg process reading raw RGBA frames from stdin and writing VP9 with alpha."""
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgba",
+        "-s", f"{width}x{height}",
+        "-framerate", str(fps),
+        "-i", "-",
+        "-c:v", "libvpx-vp9",
+        "-pix_fmt", "yuva420p",
+        "-b:v", "3M",
+        "-auto-alt-ref", "0",
+        "-an",
+        "-quality", "good",
+        "-cpu-used", "2",
+        output_path,
+    ]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def run_pipeline(cap, sink, workers: int = None, batch_size: int = 4, model_name: str = "u2net", max_frames: int = None,
+                 backend: str = "rembg", threads: int = None) -> int:
+    """
+    Fan frames from `cap` out to a process pool and pass the results to `sink`
+    in original frame order. Returns the number of frames written.
+    """
+    cores = _available_cores()
+    workers = workers or max(1, cores - 1)
+    threads = threads or max(1, cores // workers)
+    frames_queue: queue.Queue = queue.Queue(maxsize=workers * 2)
+    reader = threading.Thread(target=_read_frames, args=(cap, frames_queue, batch_size, max_frames), daemon=True)
+    reader.start()
+
+    pending_results = {}
+    next_idx = 0
+    in_flight = set()
+    reading = True
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name, threads, backend)) as pool:
+        while reading or in_flight:
+            # Keep every worker busy, bounded so decoded frames don't pile up in memory
+            while reading and len(in_flight) < workers * 2:
+                batch = frames_queue.get()
+                if batch is None:
+                    reading = False
+                    break
+                in_flight.add(pool.submit(_remove_batch, batch))
+
+            if not in_flight:
+                continue
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for idx, rgba in future.result():
+                    pending_results[idx] = rgba
+
+            # Reorder: emit frames as soon as the next index is available
+            while next_idx in pending_results:
+                sink(pending_results.pop(next_idx))
+                next_idx += 1
+
+    reader.join()
+    return next_idx
+
+
+def process_video_pipeline(input_path: str, output_path: str, workers: int = None, batch_size: int = 4, backend: str = "rembg", threads: int = None):
+    """Multiprocess variant of process_video_preserve_content with direct FFmpeg encoding."""
+    if not check_ffmpeg():
+        raise RuntimeError("Pipeline mode requires FFmpeg on PATH")
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {input_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    print(f"Pipeline: {width}x{height}, {fps} fps, {frame_count} frames, workers={workers or 'auto'}, batch={batch_size}")
+
+    encoder = _open_encoder(output_path, width, height, fps)
+    pbar = tqdm(total=frame_count, desc="Processing frames")
+
+    def _write(rgba):
+        encoder.stdin.write(rgba.tobytes())
+        pbar.update(1)
+
+    start = time.perf_counter()
+    try:
+        written = run_pipeline(cap, _write, workers=workers, batch_size=batch_size, backend=backend, threads=threads)
+    finally:
+        cap.release()
+        pbar.close()
+        encoder.stdin.close()
+        stderr = encoder.stderr.read().decode(errors="ignore")
+        encoder.wait()
+
+    if encoder.returncode != 0:
+        raise RuntimeError(f"FFmpeg error: {stderr}")
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ {written} frames in {elapsed:.1f}s ({written / elapsed:.2f} fps) -> {output_path}")
+    return output_path
+
+
+def _synthetic_clip(path: str, frames: int, size: int, fps: int = 24):
+    """Write a small synthetic clip: a moving disc over a checkerboard background."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (size, size))
+    tile = 16
+    yy, xx = np.mgrid[0:size, 0:size]
+    checker = (((yy // tile) + (xx // tile)) % 2 * 60 + 150).astype(np.uint8)
+    for i in range(frames):
+        frame = np.dstack([checker] * 3).copy()
+        cx = int(size * (0.3 + 0.4 * i / max(1, frames - 1)))
+        cv2.circle(frame, (cx, size // 2), size // 5, (230, 200, 40), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def benchmark(frames: int = 48, size: int = 320, workers: int = None, batch_size: int = 4, backend: str = "rembg", threads: int = None):
+    """Frames-per-second comparison of sequential vs pipeline mode on a synthetic clip."""
+    temp_dir = Path(tempfile.mkdtemp())
+    clip = str(temp_dir / "synthetic.mp4")
+    _synthetic_clip(clip, frames, size)
+
+    try:
+        # Sequential baseline (same settings, no PNG/FFmpeg I/O so only compute is compared)
+        cap = cv2.VideoCapture(clip)
+        session = make_session("u2net", backend, threads)
+        start = time.perf_counter()
+        count = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            restore_edges(np.array(remove(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), session=session, **REMOVE_KWARGS)))
+            count += 1
+        cap.release()
+        sequential_fps = count / (time.perf_counter() - start)
+
+        # Pipeline (pool start-up and model loading included)
+        cap = cv2.VideoCapture(clip)
+        start = time.perf_counter()
+        written = run_pipeline(cap, lambda rgba: None, workers=workers, batch_size=batch_size, backend=backend, threads=threads)
+        cap.release()
+        pipeline_fps = written / (time.perf_counter() - start)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"Synthetic clip: {frames} frames @ {size}x{size} ({backend} backend)")
+    print(f"  sequential : {sequential_fps:6.2f} fps")
+    print(f"  pipeline   : {pipeline_fps:6.2f} fps  (workers={workers or 'auto'}, batch={batch_size}, x{pipeline_fps / sequential_fps:.2f})")
+
+
+def quick_test(input_path: str, output_dir: str, backend: str = "rembg", threads: int = None):
     """
     Process just a few frames to test quality before full processing.
     """
@@ -198,7 +461,7 @@ def quick_test(input_path: str, output_dir: str):
     # Get 5 evenly spaced frames
     test_frames = [0, frame_count//4, frame_count//2, 3*frame_count//4, frame_count-1]
     
-    session = new_session("u2net")
+    session = make_session("u2net", backend, threads)
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
     
@@ -212,14 +475,7 @@ def quick_test(input_path: str, output_dir: str):
         pil_image = Image.fromarray(frame_rgb)
         
         # Process with conservative settings
-        result = remove(
-            pil_image,
-            session=session,
-            alpha_matting=True,
-            alpha_matting_foreground_threshold=270,
-            alpha_matting_background_threshold=5,
-            alpha_matting_erode_size=3,
-        )
+        result = remove(pil_image, session=session, **REMOVE_KWARGS)
         
         # Save both original and processed for comparison
         pil_image.save(output_path / f"original_{idx}.png")
@@ -232,8 +488,28 @@ def quick_test(input_path: str, output_dir: str):
 
 
 if __name__ == "__main__":
-    import sys
-    
+    # --temporal can be combined with the default / explicit-path modes
+    use_temporal = "--temporal" in sys.argv
+    if use_temporal:
+        sys.argv.remove("--temporal")
+
+    # --backend rembg|tuned and --threads N apply to every mode
+    def _pop_option(name, default=None):
+        if name not in sys.argv:
+            return default
+        i = sys.argv.index(name)
+        if i + 1 >= len(sys.argv):
+            raise SystemExit(f"{name} needs a value")
+        value = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+        return value
+
+    backend = _pop_option("--backend", "rembg")
+    if backend not in ("rembg", "tuned"):
+        raise SystemExit("--backend must be rembg or tuned")
+    threads = _pop_option("--threads")
+    threads = int(threads) if threads else None
+
     # Default paths
     input_video = r"e:\LeadQ chatbot\LeadQ-Chatbot\frontend\public\chatbot icon.mp4"
     output_video = r"e:\LeadQ chatbot\LeadQ-Chatbot\frontend\src\assets\chatbot-icon-transparent.webm"
@@ -242,12 +518,25 @@ if __name__ == "__main__":
         if sys.argv[1] == "--test":
             # Quick test mode
             test_output = r"e:\LeadQ chatbot\LeadQ-Chatbot\frontend\temp_test_frames"
-            quick_test(input_video, test_output)
+            quick_test(input_video, test_output, backend=backend, threads=threads)
+        elif sys.argv[1] == "--pipeline":
+            # Multiprocess mode: --pipeline [input] [output] [workers]
+            if len(sys.argv) > 2:
+                input_video = sys.argv[2]
+            if len(sys.argv) > 3:
+                output_video = sys.argv[3]
+            pipeline_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+            process_video_pipeline(input_video, output_video, workers=pipeline_workers, backend=backend, threads=threads)
+        elif sys.argv[1] == "--benchmark":
+            # Synthetic FPS benchmark: --benchmark [frames] [workers]
+            bench_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 48
+            bench_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+            benchmark(frames=bench_frames, workers=bench_workers, backend=backend, threads=threads)
         else:
             input_video = sys.argv[1]
             if len(sys.argv) > 2:
                 output_video = sys.argv[2]
-            process_video_preserve_content(input_video, output_video)
+            process_video_preserve_content(input_video, output_video, temporal=use_temporal, backend=backend, threads=threads)
     else:
         # Full processing
-        process_video_preserve_content(input_video, output_video)
+        process_video_preserve_content(input_video, output_video, temporal=use_temporal, backend=backend, threads=threads)
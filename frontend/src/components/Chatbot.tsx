@@ -7,6 +7,7 @@ import chatbotIconTransparent from '../assets/chatbot-icon-transparent.webm';
 import chatbotIconOriginal from '../assets/chatbot-icon.webm';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
+import { chatService } from '../modules/chatbot/service-api';
 
 interface Message {
     id: string;
@@ -372,30 +373,29 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialOpen = false }) => {
         setIsTyping(true);
 
         try {
-            const response = await fetch('http://127.0.0.1:5002/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: messageText,
-                    sessionId: sessionId,
-                    regenerate: regenerate
-                }),
-            });
-
-            const data = await response.json();
-
-            if (data.sessionId) {
-                setSessionId(data.sessionId);
-                localStorage.setItem('chatSessionId', data.sessionId);
-            }
+            // Shared session transport (WebSocket with HTTP stream fallback)
+            let content = "";
+            let recommendations: string[] = [];
+            let superseded = false;
+            await chatService.sendMessage(messageText, sessionId, (data) => {
+                if (data.type === "content") {
+                    content += data.chunk;
+                } else if (data.type === "recommendations") {
+                    recommendations = data.data;
+                } else if (data.type === "meta" && data.sessionId) {
+                    setSessionId(data.sessionId);
+                    localStorage.setItem('chatSessionId', data.sessionId);
+                } else if (data.type === "cancelled") {
+                    superseded = true;
+                }
+            }, regenerate);
+            if (superseded) return;
 
             const botMsg: Message = {
                 id: (Date.now() + 1).toString(),
                 role: 'assistant',
-                content: data.response || "I'm having trouble connecting right now. Please try again later.",
-                recommendations: data.recommendations || []
+                content: content || "I'm having trouble connecting right now. Please try again later.",
+                recommendations
             };
             setMessages(prev => [...prev, botMsg]);
         } catch (error) {
@@ -403,7 +403,7 @@ const Chatbot: React.FC<ChatbotProps> = ({ initialOpen = false }) => {
             const errorMsg: Message = {
                 id: (Date.now() + 1).toString(),
                 role: 'assistant',
-                content: "I'm sorry, I can't connect to the server (port 5002). Please check if the backend is running and CORS is configured."
+                content: "I'm sorry, I can't connect to the server. Please check if the backend is running and CORS is configured."
             };
             setMessages(prev => [...prev, errorMsg]);
         } finally {
@@ -150,6 +150,9 @@ export const useChat = (initialOpen = false) => {
         try {
             let accumulatedContent = "";
             let botMessageAdded = false;
+            let superseded = false;
+            // Recommendations can arrive before the first content chunk
+            let pendingRecommendations: string[] = [];
 
             // Prepare history for backend (last 5 messages)
             const chatHistoryPayload = messages.slice(-5).map((m: Message) => ({
@@ -167,7 +170,7 @@ export const useChat = (initialOpen = false) => {
                             id: botMsgId,
                             role: 'assistant',
                             content: accumulatedContent,
-                            recommendations: []
+                            recommendations: pendingRecommendations
                         }]);
                     } else {
                         setIsTyping(false);
@@ -176,16 +179,20 @@ export const useChat = (initialOpen = false) => {
                         ));
                     }
                 } else if (data.type === "recommendations") {
+                    pendingRecommendations = data.data;
                     setMessages((prev: Message[]) => prev.map((msg: Message) =>
                         msg.id === botMsgId ? { ...msg, recommendations: data.data } : msg
                     ));
                 } else if (data.type === "meta" && data.sessionId) {
                     setSessionId(data.sessionId);
                     localStorage.setItem('chatSessionId', data.sessionId);
+                } else if (data.type === "cancelled") {
+                    // A newer message superseded this turn on the server
+                    superseded = true;
                 }
             }, regenerate, chatHistoryPayload);
 
-            if (!botMessageAdded && !regenerate) {
+            if (!botMessageAdded && !regenerate && !superseded) {
                 setIsTyping(false);
                 setMessages((prev: Message[]) => [...prev, { id: botMsgId, role: 'assistant', content: "I'm having trouble retrieving an answer right now." }]);
             }
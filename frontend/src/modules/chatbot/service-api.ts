@@ -1,7 +1,105 @@
 import { API_BASE_URL } from '../../config/apiConfig.js';
 
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, 'ws');
+
+type FrameHandler = (data: any) => void;
+
+/**
+ * One WebSocket per chat session; turns are multiplexed over it.
+ * Sending a new message cancels the previous turn on the server.
+ */
+class ChatSocket {
+    private socket: WebSocket | null = null;
+    private opening: Promise<WebSocket> | null = null;
+    private sessionId: string | null = null;
+    private turn = 0;
+    private handlers = new Map<number, { onChunk: FrameHandler; resolve: () => void; reject: (e: Error) => void }>();
+
+    private open(sessionId: string | null): Promise<WebSocket> {
+        if (this.socket && this.socket.readyState === WebSocket.OPEN && this.sessionId === sessionId) {
+            return Promise.resolve(this.socket);
+        }
+        if (this.opening && this.sessionId === sessionId) return this.opening;
+
+        this.close();
+        this.sessionId = sessionId;
+        const query = sessionId ? `?sessionId=${encodeURIComponent(sessionId)}` : '';
+
+        this.opening = new Promise((resolve, reject) => {
+            const socket = new WebSocket(`${WS_BASE_URL}/chat/ws${query}`);
+            socket.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'ready') {
+                    this.sessionId = data.sessionId;
+                    this.socket = socket;
+                    this.turn = 0;
+                    resolve(socket);
+                    return;
+                }
+                const handler = this.handlers.get(data.turn);
+                if (!handler) return;
+                handler.onChunk(data);
+                if (data.type === 'meta' || data.type === 'cancelled' || data.type === 'error') {
+                    this.handlers.delete(data.turn);
+                    handler.resolve();
+                }
+            };
+            socket.onerror = () => reject(new Error("WebSocket connection failed"));
+            socket.onclose = () => {
+                this.socket = null;
+                this.opening = null;
+                this.handlers.forEach(h => h.reject(new Error("WebSocket closed")));
+                this.handlers.clear();
+            };
+        });
+        return this.opening;
+    }
+
+    async send(message: string, sessionId: string | null, onChunk: FrameHandler, regenerate?: boolean, history?: any[]) {
+        const socket = await this.open(sessionId);
+        const turn = ++this.turn;
+        return new Promise<void>((resolve, reject) => {
+            this.handlers.set(turn, { onChunk, resolve, reject });
+            socket.send(JSON.stringify({ type: 'message', message, regenerate, history }));
+        });
+    }
+
+    cancel() {
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({ type: 'cancel' }));
+        }
+    }
+
+    close() {
+        if (this.socket) this.socket.close();
+        this.socket = null;
+        this.opening = null;
+    }
+}
+
+const chatSocket = typeof WebSocket !== 'undefined' ? new ChatSocket() : null;
+
 export const chatService = {
     async sendMessage(message: string, sessionId: string | null, onChunk: (data: any) => void, regenerate?: boolean, history?: any[]) {
+        if (chatSocket) {
+            let received = false;
+            try {
+                await chatSocket.send(message, sessionId, (data) => { received = true; onChunk(data); }, regenerate, history);
+                return;
+            } catch (e) {
+                // Only fall back if nothing was delivered, otherwise the turn would be duplicated
+                if (received) throw e;
+                console.warn("WebSocket unavailable, falling back to HTTP stream", e);
+            }
+        }
+        return chatService.sendMessageHttp(message, sessionId, onChunk, regenerate, history);
+    },
+
+    cancel() {
+        chatSocket?.cancel();
+    },
+
+    async sendMessageHttp(message: string, sessionId: string | null, onChunk: (data: any) => void, regenerate?: boolean, history?: any[]) {
         const response = await fetch(`${API_BASE_URL}/chat`, {
             method: 'POST',
             credentials: 'include',